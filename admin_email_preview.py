@@ -7,7 +7,8 @@ from typing import Dict, List, Optional
 
 import streamlit as st
 
-from app_core.email_notifications import preparar_resumen_bloques_entrenador
+from app_core import users_service
+from app_core.email_notifications import preparar_resumenes_bloques
 from app_core.firebase_client import get_db
 
 
@@ -30,36 +31,18 @@ def _tiene_rutinas_asignadas(correo: str) -> bool:
     return any(getattr(snap, "exists", True) for snap in snaps)
 
 
+@st.cache_data(ttl=180, show_spinner=False)
+def _resumenes_semana(fecha_referencia: date, correos: tuple[str, ...]) -> Dict[str, Dict]:
+    """Resúmenes de todos los entrenadores listados en una sola pasada (ver `preparar_resumenes_bloques`)."""
+    return preparar_resumenes_bloques(fecha_referencia, correos)
+
+
 @st.cache_data(ttl=300)
 def _listar_entrenadores() -> List[EntrenadorInfo]:
     """Obtiene entrenadores o administradores con rutinas asignadas."""
     resultados: List[EntrenadorInfo] = []
-    try:
-        db = get_db()
-        snaps = list(db.collection("usuarios").where("rol", "in", ["entrenador", "admin", "administrador"]).stream())
-    except Exception:
-        snaps = []
-        try:
-            db = get_db()
-            for rol in ("entrenador", "admin", "administrador"):
-                snaps.extend(db.collection("usuarios").where("rol", "==", rol).stream())
-        except Exception:
-            snaps = []
-
-    seen_ids: set[str] = set()
-    for snap in snaps:
-        snap_id = getattr(snap, "id", None)
-        if isinstance(snap_id, str):
-            if snap_id in seen_ids:
-                continue
-            seen_ids.add(snap_id)
-        try:
-            if not snap.exists:
-                continue
-        except Exception:
-            pass
-        data = snap.to_dict() or {}
-        correo = str(data.get("correo") or "").strip().lower()
+    for data in users_service.por_rol("entrenador", "admin", "administrador"):
+        correo = data.get("_correo_norm")
         if not correo:
             continue
         if not _tiene_rutinas_asignadas(correo):
@@ -175,16 +158,14 @@ def ver_previsualizacion_correos() -> None:
     st.divider()
     st.subheader(f"Vista previa para {entrenador_sel.nombre}")
     try:
-        contenido = preparar_resumen_bloques_entrenador(
-            entrenador_sel.correo,
-            fecha_referencia=fecha_referencia,
-        )
-    except ValueError as exc:
-        st.warning(str(exc))
-        return
+        resumenes = _resumenes_semana(fecha_referencia, tuple(e.correo for e in entrenadores))
     except Exception as exc:
         st.error(f"No se pudo generar la previsualización: {exc}")
         return
+    contenido = resumenes.get(entrenador_sel.correo) or {}
+    if not contenido or "error" in contenido:
+        st.warning(contenido.get("error") or "No hay resumen para este entrenador.")
+        return
 
     st.write(f"**Destinatario:** {entrenador_sel.nombre} `<{entrenador_sel.correo}>`")
     st.write(f"**Asunto:** {contenido.get('subject', '(sin asunto)')}")
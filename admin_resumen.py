@@ -10,12 +10,14 @@ import streamlit as st
 import firebase_admin
 from firebase_admin import credentials, firestore
 
+from app_core import users_service
+from app_core.data_access import registrar_ultima_rutina, ultimas_rutinas
+from app_core.firebase_client import get_db
 from app_core.utils import (
     set_usuario_activo,
     empresa_de_usuario,
     usuario_activo,
     EMPRESA_DESCONOCIDA,
-    _invalidate_usuario_cache,
 )
 
 # ========== Firebase: inicializar solo una vez ==========
@@ -24,7 +26,7 @@ if not firebase_admin._apps:
     cred = credentials.Certificate(cred_dict)
     firebase_admin.initialize_app(cred)
 
-db = firestore.client()
+db = get_db()
 
 
 # ========== Helpers generales ==========
@@ -100,7 +102,8 @@ def _set_empresa_usuario(correo: str, empresa: str) -> bool:
             }
 
         db.collection("usuarios").document(doc_id).set(payload, merge=True)
-        _invalidate_usuario_cache()
+        # Vacío equivale a campo ausente para `empresa_desde_datos`.
+        users_service.registrar_escritura(doc_id, payload if empresa_clean else {"empresa": "", "empresa_id": ""})
         st.cache_data.clear()
         return True
     except Exception as exc:
@@ -109,64 +112,40 @@ def _set_empresa_usuario(correo: str, empresa: str) -> bool:
 
 
 # ========== Catálogos / mapas ==========
-@st.cache_data(ttl=300)
 def _mapear_entrenadores() -> Dict[str, str]:
-    """{correo_entrenador: nombre_entrenador} desde colección 'usuarios'."""
+    """{correo_entrenador: nombre_entrenador} desde el directorio de usuarios."""
     m: Dict[str, str] = {}
-    try:
-        docs = db.collection("usuarios").where("rol", "==", "entrenador").stream()
-        for doc in docs:
-            d = doc.to_dict() or {}
-            correo = (d.get("correo") or "").strip().lower()
-            nombre = (d.get("nombre") or correo).strip()
-            if correo:
-                m[correo] = nombre
-    except Exception:
-        pass
+    for d in users_service.por_rol("entrenador"):
+        correo = d.get("_correo_norm")
+        if correo:
+            m[correo] = (d.get("nombre") or correo).strip()
     return m
 
-@st.cache_data(ttl=180)
+
+def _con_correo_normalizado(usuarios: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Copias: los payloads del directorio son compartidos entre sesiones.
+    return [{**u, "correo": u.get("_correo_norm", "")} for u in usuarios]
+
+
 def _cargar_usuarios_deportistas() -> List[Dict[str, Any]]:
     """Lista de usuarios con rol 'deportista'."""
-    res: List[Dict[str, Any]] = []
-    try:
-        docs = db.collection("usuarios").where("rol", "==", "deportista").stream()
-        for doc in docs:
-            d = doc.to_dict() or {}
-            d["_id"] = doc.id
-            # Normaliza correo
-            d["correo"] = (d.get("correo") or "").strip().lower()
-            res.append(d)
-    except Exception:
-        pass
-    return res
+    return _con_correo_normalizado(users_service.por_rol("deportista"))
 
 
-@st.cache_data(ttl=120)
 def _cargar_todos_usuarios() -> List[Dict[str, Any]]:
-    usuarios: List[Dict[str, Any]] = []
-    try:
-        for snap in db.collection("usuarios").stream():
-            if not snap.exists:
-                continue
-            data = snap.to_dict() or {}
-            data["_id"] = snap.id
-            data["correo"] = (data.get("correo") or "").strip().lower()
-            usuarios.append(data)
-    except Exception:
-        pass
-    return usuarios
+    return _con_correo_normalizado(users_service.list_users())
 
 
 # ========== Buscar última rutina SIN índices compuestos ==========
 def _pick_latest(docs: List[Any]) -> Optional[Dict[str, Any]]:
-    """Elige el doc con fecha más reciente (en memoria)."""
+    """Elige el doc con fecha más reciente (en memoria); deja su ID en `_id`."""
     mejor = None
     mejor_f = None
     for snap in docs:
         d = snap.to_dict() or {}
         f = _parse_fecha_generic(d)
         if f and (mejor_f is None or f > mejor_f):
+            d["_id"] = snap.id
             mejor, mejor_f = d, f
     return mejor
 
@@ -188,6 +167,8 @@ def _buscar_ultima_rutina_por_correo(correo_cliente: str, max_docs: int = 150) -
         except Exception:
             snaps = []
         cand = _pick_latest(snaps)
+        if cand and col != "rutinas_semanales":
+            cand.pop("_id", None)  # solo interesa el ID de la semana en `rutinas_semanales`
         if cand:
             f = _parse_fecha_generic(cand) or datetime.min
             if mejor is None:
@@ -221,6 +202,7 @@ def _buscar_ultima_rutina_por_prefijo_id(correo_cliente: str) -> Optional[Dict[s
         return None
 
     d = docs[0].to_dict() or {}
+    d["_id"] = docs[0].id
     # Si no trae fecha, inferir desde el ID
     if _parse_fecha_generic(d) is None:
         try:
@@ -231,6 +213,15 @@ def _buscar_ultima_rutina_por_prefijo_id(correo_cliente: str) -> Optional[Dict[s
             pass
     return d
 
+@st.cache_data(ttl=120)
+def _cargar_ultimas_rutinas() -> Dict[str, Dict[str, Any]]:
+    """Resumen `ultima_rutina` de todos los clientes con una sola consulta."""
+    try:
+        return ultimas_rutinas()
+    except Exception:
+        return {}
+
+
 def _buscar_ultima_rutina(correo_cliente: str) -> Optional[Dict[str, Any]]:
     """
     Estrategia combinada:
@@ -243,6 +234,31 @@ def _buscar_ultima_rutina(correo_cliente: str) -> Optional[Dict[str, Any]]:
     return _buscar_ultima_rutina_por_prefijo_id(correo_cliente)
 
 
+def _ultima_rutina_con_respaldo(
+    correo_cliente: str,
+    ultimas: Dict[str, Dict[str, Any]],
+) -> Optional[Dict[str, Any]]:
+    """Usa el resumen `ultima_rutina`; si el cliente aún no lo tiene, busca y lo deja creado."""
+    resumen = ultimas.get(correo_cliente)
+    if resumen:
+        return resumen
+    rutina = _buscar_ultima_rutina(correo_cliente)
+    if rutina and rutina.get("fecha_lunes"):
+        datos = dict(rutina)
+        datos["correo"] = datos.get("correo") or correo_cliente
+        # Sin ID (doc de la colección antigua `rutinas`): el de la semana equivalente.
+        doc_id = datos.pop("_id", "") or (
+            f"{_normalizar_id_correo(correo_cliente)}_{str(datos['fecha_lunes'])[:10].replace('-', '_')}"
+        )
+        try:
+            registrar_ultima_rutina({doc_id: datos})
+            # El próximo render ya lee el resumen nuevo en vez de repetir la búsqueda.
+            _cargar_ultimas_rutinas.clear()
+        except Exception:
+            pass
+    return rutina
+
+
 # ========== Vista principal ==========
 def ver_resumen_entrenadores():
     _ensure_session_defaults()
@@ -428,6 +444,7 @@ def ver_resumen_entrenadores():
     st.caption("Agrupa clientes por entrenador (correo en la rutina) y muestra su última semana planificada.")
     ver_diag = st.checkbox("🔎 Ver diagnóstico de búsquedas", value=False)
     usuarios = _cargar_usuarios_deportistas()
+    ultimas = _cargar_ultimas_rutinas()
 
     filas: List[Dict[str, Any]] = []   # clientes con rutina
     sin_rutina: List[Dict[str, str]] = []  # clientes sin rutina encontrada
@@ -446,7 +463,7 @@ def ver_resumen_entrenadores():
                     st.write(f"• Debug: {nombre_cliente} ({correo_cliente}) omitido por estar inactivo.")
                 continue
 
-            rutina = _buscar_ultima_rutina(correo_cliente)
+            rutina = _ultima_rutina_con_respaldo(correo_cliente, ultimas)
             if not rutina:
                 sin_rutina.append({"nombre": nombre_cliente, "correo": correo_cliente})
                 if ver_diag:
@@ -11,6 +11,8 @@ from openai import OpenAI
 
 import firebase_admin
 from firebase_admin import credentials, firestore
+from app_core import historial_ejercicios
+from app_core.firebase_client import get_db as _get_db_compartido
 from app_core.utils_rm import calcular_rm_teorico, calcular_peso_por_porcentaje
 
 # ==============================
@@ -85,13 +87,174 @@ def get_db() -> firestore.Client:
     if not firebase_admin._apps:
         firebase_admin.initialize_app()   # O con credentials.Certificate(...)
 
-    _db = firestore.client()
+    _db = _get_db_compartido()
     return _db
 
 
 # ============================================================
 # 🧩 Obtener historial real según tu estructura
 # ============================================================
+SEMANAS_ATRAS_SUGERENCIA = 2  # el agente revisa solo las 2 semanas previas
+
+
+def _norm(txt: str) -> str:
+    txt = (txt or "").strip().lower()
+    txt = unicodedata.normalize("NFD", txt).encode("ascii", "ignore").decode("utf-8")
+    return txt
+
+
+def _contenedores_de(data: Dict[str, Any]) -> List[list]:
+    """
+    Extrae ejercicios desde varias formas posibles:
+    1) data["rutina"] = lista de días -> lista de ejercicios (dicts)
+    2) data["ejercicios"] = lista de ejercicios (dicts)
+    3) cualquier campo lista que contenga dicts con clave "ejercicio"
+    4) sub-mapas o el propio documento con clave "ejercicio"
+    Cada lista de ejercicios aparece una sola vez (la primera forma que la encuentra).
+    """
+    contenedores: List[list] = []
+    vistas: set = set()
+
+    def _agregar(cont: list) -> None:
+        contenedores.append(cont)
+        vistas.update(id(dia) for dia in cont if isinstance(dia, list))
+
+    def _tiene_ejercicios(v: Any) -> bool:
+        return isinstance(v, list) and id(v) not in vistas and any(isinstance(x, dict) and "ejercicio" in x for x in v)
+
+    rutina = data.get("rutina")
+    if isinstance(rutina, list):
+        _agregar(rutina)
+    elif isinstance(rutina, dict):
+        # rutina como mapa de días -> lista de ejercicios
+        _agregar(list(rutina.values()))
+
+    ejercicios_flat = data.get("ejercicios")
+    if isinstance(ejercicios_flat, list):
+        _agregar([ejercicios_flat])
+
+    for v in data.values():
+        if _tiene_ejercicios(v):
+            _agregar([v])
+        if isinstance(v, dict):
+            if "ejercicio" in v:
+                contenedores.append([[v]])
+            # dict de días u otras claves que contengan listas de ejercicios
+            for sub in v.values():
+                if _tiene_ejercicios(sub):
+                    _agregar([sub])
+
+    if "ejercicio" in data:
+        contenedores.append([[data]])
+    return contenedores
+
+
+class HistorialEjercicios:
+    """Índice `ejercicio normalizado -> entradas` armado una sola vez por documento."""
+
+    def __init__(
+        self,
+        docs_por_fecha: Dict[str, Dict[str, Any]],
+        reportes: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+    ):
+        self.fechas = sorted(docs_por_fecha)
+        # Serie de reportes (`historial_ejercicios`) de los ejercicios pedidos al cargar.
+        self._reportes = {_norm(nombre): regs for nombre, regs in (reportes or {}).items()}
+        self._por_ejercicio: Dict[str, List[Dict[str, Any]]] = {}
+        for fecha_str in self.fechas:
+            for cont in _contenedores_de(docs_por_fecha[fecha_str] or {}):
+                for dia_index, ejercicios_dia in enumerate(cont):
+                    if not isinstance(ejercicios_dia, list):
+                        continue
+                    for ej in ejercicios_dia:
+                        if not isinstance(ej, dict):
+                            continue
+                        self._por_ejercicio.setdefault(_norm(str(ej.get("ejercicio", ""))), []).append({
+                            "fecha": fecha_str,
+                            "dia": dia_index + 1,
+                            "bloque": ej.get("bloque"),
+                            "circuito": ej.get("circuito"),
+                            "peso": ej.get("peso"),
+                            "reps_min": ej.get("reps_min"),
+                            "reps_max": ej.get("reps_max"),
+                            "rir": ej.get("rir"),
+                        })
+
+    def de(self, nombre_ejercicio: str) -> List[Dict[str, Any]]:
+        """Entradas del ejercicio ordenadas por fecha (copia: se puede modificar)."""
+        return [dict(item) for item in self._por_ejercicio.get(_norm(nombre_ejercicio), [])]
+
+    def para(self, nombres_ejercicio: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        return {nombre: self.de(nombre) for nombre in nombres_ejercicio}
+
+    def reportes(self, nombre_ejercicio: str) -> List[Dict[str, Any]]:
+        """Reportes del atleta para el ejercicio (solo si se pidió al cargar)."""
+        return list(self._reportes.get(_norm(nombre_ejercicio), []))
+
+
+def _fechas_historial(fecha_semana_actual: str, semanas_atras: int, incluir_semana_actual: bool) -> List[str]:
+    fecha_base = datetime.strptime(fecha_semana_actual, "%Y_%m_%d").date()
+    start = 0 if incluir_semana_actual else 1
+    return [
+        (fecha_base - timedelta(weeks=i)).strftime("%Y_%m_%d")
+        for i in range(start, start + semanas_atras)
+    ]
+
+
+def cargar_historial_cliente(
+    correo_cliente: str,
+    fecha_semana_actual: str,
+    semanas_atras: int = 4,
+    incluir_semana_actual: bool = False,
+    nombres_ejercicio: Optional[List[str]] = None,
+) -> HistorialEjercicios:
+    """
+    Lee las semanas del historial con un único `get_all` y las indexa por ejercicio.
+    - Documentos tipo: correo_formateado_YYYY_MM_DD
+    Busca hacia atrás hasta `semanas_atras` semanas. Por defecto NO incluye la semana actual.
+    Con `nombres_ejercicio`, el mismo `get_all` trae su serie de reportes (`historial_ejercicios`).
+    """
+    db = get_db()
+    correo_formateado = correo_cliente.replace("@", "_").replace(".", "_")
+    col = db.collection("rutinas_semanales")
+    fechas = _fechas_historial(fecha_semana_actual, semanas_atras, incluir_semana_actual)
+    fecha_por_id = {f"{correo_formateado}_{fecha_str}": fecha_str for fecha_str in fechas}
+    refs = [col.document(doc_id) for doc_id in fecha_por_id]
+    refs_reportes = historial_ejercicios.referencias(correo_cliente, nombres_ejercicio or [])
+    nombres_por_id: Dict[str, List[str]] = {}
+    for nombre, ref in refs_reportes.items():
+        nombres_por_id.setdefault(ref.id, []).append(nombre)
+    refs.extend({ref.id: ref for ref in refs_reportes.values()}.values())
+
+    docs: Dict[str, Dict[str, Any]] = {}
+    reportes: Dict[str, List[Dict[str, Any]]] = {}
+    if refs:
+        for snap in db.get_all(refs):
+            if not snap.exists:
+                continue
+            if snap.id in fecha_por_id:
+                docs[fecha_por_id[snap.id]] = snap.to_dict() or {}
+            else:
+                registros = historial_ejercicios.registros_de(snap.to_dict())
+                for nombre in nombres_por_id.get(snap.id, ()):
+                    reportes[nombre] = registros
+    return HistorialEjercicios(docs, reportes)
+
+
+def get_historial_ejercicios_firestore(
+    correo_cliente: str,
+    nombres_ejercicio: List[str],
+    fecha_semana_actual: str,
+    semanas_atras: int = 4,
+    incluir_semana_actual: bool = False,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Historial de varios ejercicios a la vez (una sola lectura en lote)."""
+    historial = cargar_historial_cliente(
+        correo_cliente, fecha_semana_actual, semanas_atras, incluir_semana_actual
+    )
+    return historial.para(nombres_ejercicio)
+
+
 def get_historial_ejercicio_firestore(
     correo_cliente: str,
     nombre_ejercicio: str,
@@ -106,98 +269,16 @@ def get_historial_ejercicio_firestore(
     - Documentos tipo: correo_formateado_YYYY_MM_DD
     - Campo: rutina = [ [ej1, ej2...], [ej1, ej2...], ... ]
     Busca hacia atrás hasta `semanas_atras` semanas. Por defecto NO incluye la semana actual.
+    Para varios ejercicios del mismo cliente, usar `cargar_historial_cliente` una vez.
     """
-
-    db = get_db()
-    historial: List[Dict[str, Any]] = []
-
-    def _norm(txt: str) -> str:
-        txt = (txt or "").strip().lower()
-        txt = unicodedata.normalize("NFD", txt).encode("ascii", "ignore").decode("utf-8")
-        return txt
-
-    nombre_norm = _norm(nombre_ejercicio)
-
-    # Formatear correo para IDs
-    correo_formateado = correo_cliente.replace("@", "_").replace(".", "_")
-
-    # Convertir fecha actual (YYYY_MM_DD)
-    fecha_base = datetime.strptime(fecha_semana_actual, "%Y_%m_%d").date()
-
-    start = 0 if incluir_semana_actual else 1
     if debug:
         print(f"[debug] buscando ejercicio='{nombre_ejercicio}' correo='{correo_cliente}' fecha_base='{fecha_semana_actual}' semanas_atras={semanas_atras} incluir_actual={incluir_semana_actual}")
-    docs_revisados = []
-    for i in range(start, start + semanas_atras):
-        fecha_semana = fecha_base - timedelta(weeks=i)
-        fecha_str = fecha_semana.strftime("%Y_%m_%d")
-
-        doc_id = f"{correo_formateado}_{fecha_str}"
-        doc = db.collection("rutinas_semanales").document(doc_id).get()
-        docs_revisados.append(doc_id)
-
-        if not doc.exists:
-            continue
-
-        data = doc.to_dict() or {}
-
-        # Extrae ejercicios desde varias formas posibles:
-        # 1) data["rutina"] = lista de días -> lista de ejercicios (dicts)
-        # 2) data["ejercicios"] = lista de ejercicios (dicts)
-        # 3) cualquier campo lista que contenga dicts con clave "ejercicio"
-        # 4) sub-mapas o el propio documento con clave "ejercicio"
-        contenedores: list = []
-        rutina = data.get("rutina")
-        if isinstance(rutina, list):
-            contenedores.append(rutina)
-        elif isinstance(rutina, dict):
-            # rutina como mapa de días -> lista de ejercicios
-            contenedores.append(list(rutina.values()))
-
-        ejercicios_flat = data.get("ejercicios")
-        if isinstance(ejercicios_flat, list):
-            contenedores.append([ejercicios_flat])
-
-        for v in data.values():
-            if isinstance(v, list) and any(isinstance(x, dict) and "ejercicio" in x for x in v):
-                contenedores.append([v])
-            if isinstance(v, dict):
-                if "ejercicio" in v:
-                    contenedores.append([[v]])
-                # dict de días u otras claves que contengan listas de ejercicios
-                for sub in v.values():
-                    if isinstance(sub, list) and any(isinstance(x, dict) and "ejercicio" in x for x in sub):
-                        contenedores.append([sub])
-
-        if "ejercicio" in data:
-            contenedores.append([[data]])
-
-        if not contenedores:
-            continue
-
-        for cont in contenedores:
-            for dia_index, ejercicios_dia in enumerate(cont):
-                if not isinstance(ejercicios_dia, list):
-                    continue
-                for ej in ejercicios_dia:
-                    if not isinstance(ej, dict):
-                        continue
-                    if _norm(str(ej.get("ejercicio", ""))) == nombre_norm:
-
-                        historial.append({
-                            "fecha": fecha_str,
-                            "dia": dia_index + 1,
-                            "bloque": ej.get("bloque"),
-                            "circuito": ej.get("circuito"),
-                            "peso": ej.get("peso"),
-                            "reps_min": ej.get("reps_min"),
-                            "reps_max": ej.get("reps_max"),
-                            "rir": ej.get("rir"),
-                        })
-
-    historial.sort(key=lambda x: x["fecha"])
+    indice = cargar_historial_cliente(
+        correo_cliente, fecha_semana_actual, semanas_atras, incluir_semana_actual
+    )
+    historial = indice.de(nombre_ejercicio)
     if debug:
-        print(f"[debug] documentos revisados: {docs_revisados}")
+        print(f"[debug] semanas encontradas: {indice.fechas}")
         print(f"[debug] coincidencias encontradas: {len(historial)}")
         if historial:
             print(f"[debug] ejemplo: {historial[-1]}")
@@ -212,19 +293,29 @@ def agente_sugerencia_rutina(
     nombre_ejercicio: str,
     fecha_semana_actual: str,
     porcentaje_objetivo: Optional[float] = None,
+    historial_cliente: Optional[HistorialEjercicios] = None,
 ) -> Dict[str, Any]:
+    """
+    `historial_cliente` (de `cargar_historial_cliente(..., SEMANAS_ATRAS_SUGERENCIA)`)
+    permite sugerir varios ejercicios del mismo cliente con una sola lectura.
+    """
 
     PORCENTAJE_OBJETIVO = 80.0  # valor por defecto si no viene de la UI
-    SEMANAS_ATRAS = 2  # revisar solo las 2 semanas previas
-
-    historial = get_historial_ejercicio_firestore(
-        correo_cliente,
-        nombre_ejercicio,
-        fecha_semana_actual,
-        semanas_atras=SEMANAS_ATRAS,
-        incluir_semana_actual=False,
-        debug=False,
-    )
+    SEMANAS_ATRAS = SEMANAS_ATRAS_SUGERENCIA
+
+    if historial_cliente is None:
+        historial_cliente = cargar_historial_cliente(
+            correo_cliente,
+            fecha_semana_actual,
+            semanas_atras=SEMANAS_ATRAS,
+            incluir_semana_actual=False,
+            nombres_ejercicio=[nombre_ejercicio],
+        )
+    historial = historial_cliente.de(nombre_ejercicio)
+    # Reportes anteriores a la semana que se planifica (peso alcanzado, reps, RIR, 1RM estimado).
+    fecha_actual_iso = fecha_semana_actual.replace("_", "-")
+    reportes = [r for r in historial_cliente.reportes(nombre_ejercicio) if str(r.get("fecha", "")) < fecha_actual_iso]
+    mejor_reporte = historial_ejercicios.mejor_registro(reportes)
 
     def _to_float(value) -> Optional[float]:
         try:
@@ -271,6 +362,10 @@ def agente_sugerencia_rutina(
     if ultimo_peso is not None and ultimo_reps is not None:
         rm_teorico = calcular_rm_teorico(ultimo_peso, ultimo_reps, ultimo_rir)
         peso_objetivo = calcular_peso_por_porcentaje(rm_teorico, porcentaje_final)
+    elif mejor_reporte is not None:
+        # Sin pesos planificados recientes: el mejor 1RM estimado de los reportes.
+        rm_teorico = mejor_reporte["rm_estimado"]
+        peso_objetivo = calcular_peso_por_porcentaje(rm_teorico, porcentaje_final)
 
     system_msg = """
 Eres un experto coach de fuerza.
@@ -304,6 +399,8 @@ RM teórico estimado (si existe): {rm_teorico}
 Porcentaje solicitado: {porcentaje_objetivo} | Usando: {porcentaje_final}%
 Peso objetivo para {porcentaje_final}% del RM (si existe): {peso_objetivo}
 Mayor peso encontrado (últimas {SEMANAS_ATRAS} semanas previas): {ultimo_peso} (fecha: {ultimo_fecha}, reps: {ultimo_reps}, RIR: {ultimo_rir})
+Últimos reportes del atleta (peso alcanzado en kg, reps, RIR, 1RM estimado): {json.dumps(reportes[-6:], ensure_ascii=False)}
+Mejor 1RM estimado en reportes (si existe): {mejor_reporte}
 
 Genera la recomendación.
 """
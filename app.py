@@ -19,6 +19,12 @@ for extra in EXTRA_PATHS:
 # 1) SIEMPRE PRIMERO
 st.set_page_config(page_title="Aplicación Asesorías", layout="wide")
 
+from app_core import mapa_documentos, metricas_firestore
+
+# Contadores de Firestore y mapa de documentos leídos: ambos viven lo que dura el run
+metricas_firestore.iniciar_run()
+mapa_documentos.iniciar_run()
+
 def _goto(menu_label: str):
     st.session_state["_menu_target"] = menu_label
     st.rerun()
@@ -260,6 +266,39 @@ def _render_navigation(opciones_menu: list[str], menu_actual: str) -> None:
         finally:
             st.markdown("</div>", unsafe_allow_html=True)
 
+def _render_panel_firestore() -> None:
+    """Panel admin: lecturas/escrituras de Firestore del run actual y acumuladas en el proceso."""
+    run = metricas_firestore.resumen_run()
+    total = run.get("__total__") or {}
+    with st.expander("📊 Consumo de Firestore (admin)", expanded=False):
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Lecturas (run)", int(total.get("lecturas", 0)))
+        c2.metric("Escrituras (run)", int(total.get("escrituras", 0)))
+        c3.metric("Consultas (run)", int(total.get("consultas", 0)))
+        c4.metric("Latencia (ms)", f"{total.get('ms', 0):.0f}")
+        for titulo, totales in (
+            ("este run", run),
+            ("proceso, todas las sesiones", metricas_firestore.resumen_proceso()),
+        ):
+            st.markdown(f"**Top por lecturas · {titulo}**")
+            filas = [
+                {
+                    "Llamada": f["sitio"],
+                    "Lecturas": int(f["lecturas"]),
+                    "Escrituras": int(f["escrituras"]),
+                    "Consultas": int(f["consultas"]),
+                    "Reutilizadas": int(f.get("reutilizadas", 0)),
+                    "Llamadas": int(f["llamadas"]),
+                    "ms": round(f["ms"], 1),
+                }
+                for f in metricas_firestore.top_sitios(totales)
+            ]
+            if filas:
+                st.dataframe(filas, use_container_width=True, hide_index=True)
+            else:
+                st.caption("Sin operaciones registradas.")
+
+
 def _limpiar_estado_por_menu(menu_label: str | None) -> None:
     if not menu_label:
         return
@@ -271,12 +310,14 @@ def _limpiar_estado_por_menu(menu_label: str | None) -> None:
 
 # 2) Soft login (usa el módulo que ya probaste)
 from soft_login_full import soft_login_barrier, soft_logout
+from app_core import email_queue
+from app_core.firebase_client import get_db
 from inicio import inicio_deportista, SEGUIMIENTO_LABEL
 from app_core.theme import inject_theme
 # 3) Imports del resto de la app
 import json
 import firebase_admin
-from firebase_admin import credentials, firestore, initialize_app
+from firebase_admin import credentials, initialize_app
 from seguimiento_entrenamiento import app as seguimiento_app  # NUEVO
 from seccion_ejercicios import base_ejercicios
 from vista_rutinas import ver_rutinas
@@ -298,7 +339,8 @@ if not firebase_admin._apps:
     cred_dict = json.loads(st.secrets["FIREBASE_CREDENTIALS"])
     cred = credentials.Certificate(cred_dict)
     initialize_app(cred)
-db = firestore.client()
+db = get_db()
+email_queue.iniciar_worker()
 
 # 6) Barrera de Soft Login (persistente con cookie)
 #    Cambia required_roles si quieres restringir el ingreso a ciertos roles globalmente.
@@ -521,3 +563,7 @@ elif opcion == "Previsualizar Correos":
         ver_previsualizacion_correos()
     else:
         st.warning("Solo disponible para administradores.")
+
+# 11) Panel de consumo de Firestore (solo admin)
+if is_admin:
+    _render_panel_firestore()
@@ -0,0 +1,61 @@
+"""Escrituras agrupadas en `WriteBatch` respetando el límite de Firestore (500 por batch)."""
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+MAX_ESCRITURAS_POR_BATCH = 500
+
+
+class BatchWriter:
+    """Acumula set/update/delete y los confirma en lotes de hasta `limite` escrituras.
+
+    Cada lote es atómico; si hay más de `limite` operaciones se confirman en orden,
+    un lote por round trip. Uso típico:
+
+        writer = BatchWriter(db)
+        writer.set(ref, data, merge=True)
+        writer.commit()
+    """
+
+    def __init__(self, db, limite: int = MAX_ESCRITURAS_POR_BATCH):
+        self._db = db
+        self._limite = max(1, min(int(limite), MAX_ESCRITURAS_POR_BATCH))
+        self._ops: List[tuple] = []
+        self.escrituras_confirmadas = 0
+        self.batches_confirmados = 0
+
+    def __len__(self) -> int:
+        return len(self._ops)
+
+    def set(self, ref, data: Dict[str, Any], merge: bool = False) -> None:
+        self._ops.append(("set", ref, data, merge))
+
+    def update(self, ref, data: Dict[str, Any]) -> None:
+        self._ops.append(("update", ref, data, None))
+
+    def delete(self, ref) -> None:
+        self._ops.append(("delete", ref, None, None))
+
+    def commit(self) -> int:
+        """Confirma todo lo pendiente. Devuelve la cantidad de escrituras confirmadas.
+
+        Si un lote falla se propaga la excepción; los lotes previos ya quedaron
+        confirmados y las operaciones no confirmadas siguen pendientes.
+        """
+        confirmadas = 0
+        while self._ops:
+            lote = self._ops[: self._limite]
+            batch = self._db.batch()
+            for tipo, ref, data, merge in lote:
+                if tipo == "set":
+                    batch.set(ref, data, merge=bool(merge))
+                elif tipo == "update":
+                    batch.update(ref, data)
+                else:
+                    batch.delete(ref)
+            batch.commit()
+            del self._ops[: len(lote)]
+            confirmadas += len(lote)
+            self.escrituras_confirmadas += len(lote)
+            self.batches_confirmados += 1
+        return confirmadas
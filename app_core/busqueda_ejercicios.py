@@ -0,0 +1,318 @@
+"""Índice de búsqueda para el autocompletado de ejercicios.
+
+`IndiceBusqueda` normaliza cada texto (minúsculas, sin tildes, `_`/signos como
+espacio) y arma un índice invertido de trigramas más la lista ordenada de
+tokens para búsquedas por prefijo. `buscar()` ordena por:
+
+0. nombre idéntico a la consulta,
+1. nombre que empieza con la consulta,
+2. todos los tokens de la consulta son prefijo de algún token del texto
+   (en cualquier orden),
+3. la consulta aparece como subcadena,
+4. parecido por distancia de edición (errores de tipeo), solo si lo anterior
+   no encontró nada. Los tokens con dígitos no admiten errores: "0042" y
+   "0043" son ejercicios distintos, no un error de tipeo.
+
+Los índices son inmutables y se memorizan por versión del catálogo
+(`catalogo_service.version()`), así que se comparten entre sesiones. Los
+ejercicios que una sesión agrega localmente (antes de que cambie la versión)
+van en un índice chico aparte que `IndiceConAgregados` combina con el base.
+"""
+from __future__ import annotations
+
+import heapq
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import OrderedDict
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from app_core import catalogo_service
+
+MAX_INDICES = 32
+LIMITE_AUTOCOMPLETADO = 50
+
+_NO_ALFANUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalizar(texto: str) -> str:
+    texto = unicodedata.normalize("NFD", str(texto or "").lower())
+    texto = texto.encode("ascii", "ignore").decode("ascii")
+    return _NO_ALFANUM.sub(" ", texto).strip()
+
+
+def _trigramas(texto: str) -> set:
+    return {texto[i : i + 3] for i in range(len(texto) - 2)}
+
+
+def _tolerancia(token: str) -> int:
+    if len(token) <= 3 or any(c.isdigit() for c in token):
+        return 0
+    return 1 if len(token) <= 6 else 2
+
+
+def _distancia(a: str, b: str, tope: int) -> int:
+    """Levenshtein acotado: devuelve `tope + 1` apenas se supera `tope`."""
+    if abs(len(a) - len(b)) > tope:
+        return tope + 1
+    previa = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        actual = [i]
+        minimo = i
+        for j, cb in enumerate(b, 1):
+            valor = min(previa[j] + 1, actual[j - 1] + 1, previa[j - 1] + (ca != cb))
+            actual.append(valor)
+            minimo = min(minimo, valor)
+        if minimo > tope:
+            return tope + 1
+        previa = actual
+    return previa[-1]
+
+
+def _distancia_token(consulta: str, token: str, tope: int) -> int:
+    # Mientras se escribe, la consulta suele ser un prefijo (con errores) del token.
+    n = len(consulta)
+    return min(_distancia(consulta, t, tope) for t in {token, token[: n + 1], token[:n], token[: max(n - 1, 1)]})
+
+
+class IndiceBusqueda:
+    """Índice inmutable sobre `(clave, nombre, texto_extra)`; `buscar` devuelve claves."""
+
+    def __init__(self, entradas: Iterable[Tuple[str, str, str]]) -> None:
+        self._claves: List[str] = []
+        self._nombres: List[str] = []
+        self._textos: List[str] = []
+        self._por_trigrama: Dict[str, set] = {}
+        self._por_token: Dict[str, set] = {}
+        vistos: set = set()
+        origen: set = set()
+
+        for clave, nombre, extra in entradas:
+            origen.add(clave)
+            if clave in vistos:
+                continue
+            norm = normalizar(f"{nombre} {extra or ''}")
+            if not norm:
+                continue
+            vistos.add(clave)
+            pos = len(self._claves)
+            self._claves.append(clave)
+            self._nombres.append(normalizar(nombre))
+            self._textos.append(norm)
+            for tri in _trigramas(f" {norm} "):
+                self._por_trigrama.setdefault(tri, set()).add(pos)
+            for tok in norm.split():
+                self._por_token.setdefault(tok, set()).add(pos)
+        # Todas las claves recibidas (también las que no tienen texto buscable).
+        self.origen = frozenset(origen)
+
+        # Orden alfabético precalculado: desempata sin construir claves por resultado.
+        por_nombre = sorted(range(len(self._claves)), key=lambda pos: (self._nombres[pos], self._claves[pos]))
+        self._orden = [0] * len(por_nombre)
+        for rango, pos in enumerate(por_nombre):
+            self._orden[pos] = rango
+        self._nombres_ordenados = [self._nombres[pos] for pos in por_nombre]
+        self._pos_ordenadas = por_nombre
+
+        # Vocabulario: ordenado para prefijos y con trigramas propios para errores de tipeo.
+        self._vocabulario = sorted(self._por_token)
+        self._vocab_por_trigrama: Dict[str, set] = {}
+        for tok in self._vocabulario:
+            for tri in _trigramas(f" {tok} "):
+                self._vocab_por_trigrama.setdefault(tri, set()).add(tok)
+
+    def __len__(self) -> int:
+        return len(self._claves)
+
+    # ---------- candidatos ----------
+    def _tokens_con_prefijo(self, prefijo: str) -> List[str]:
+        inicio = bisect_left(self._vocabulario, prefijo)
+        fin = bisect_left(self._vocabulario, prefijo + "\x7f", inicio)
+        return self._vocabulario[inicio:fin]
+
+    def _con_prefijo(self, prefijo: str) -> set:
+        resultado: set = set()
+        for tok in self._tokens_con_prefijo(prefijo):
+            resultado |= self._por_token[tok]
+        return resultado
+
+    def _con_subcadena(self, consulta: str) -> set:
+        trigramas = _trigramas(consulta)
+        if not trigramas:
+            return set()
+        listas = sorted((self._por_trigrama.get(t, set()) for t in trigramas), key=len)
+        candidatos = set(listas[0])
+        for lista in listas[1:]:
+            if not candidatos:
+                break
+            candidatos &= lista
+        return {pos for pos in candidatos if consulta in self._textos[pos]}
+
+    def _parecidos_token(self, consulta: str) -> Dict[int, int]:
+        """`pos -> distancia` de las entradas con algún token parecido a `consulta`."""
+        tope = _tolerancia(consulta)
+        distancias: Dict[str, int] = {tok: 0 for tok in self._tokens_con_prefijo(consulta)}
+        if tope:
+            candidatos: set = set()
+            for tri in _trigramas(f" {consulta} "):
+                candidatos |= self._vocab_por_trigrama.get(tri, set())
+            for tok in candidatos - distancias.keys():
+                d = _distancia_token(consulta, tok, tope)
+                if d <= tope:
+                    distancias[tok] = d
+        por_pos: Dict[int, int] = {}
+        for tok, d in distancias.items():
+            for pos in self._por_token[tok]:
+                if d < por_pos.get(pos, tope + 1):
+                    por_pos[pos] = d
+        return por_pos
+
+    def _parecidos(self, consulta: str, excluir: set) -> Dict[int, int]:
+        acumulado: Optional[Dict[int, int]] = None
+        for tok in consulta.split():
+            por_pos = self._parecidos_token(tok)
+            if acumulado is None:
+                acumulado = por_pos
+            else:
+                acumulado = {pos: d + por_pos[pos] for pos, d in acumulado.items() if pos in por_pos}
+            if not acumulado:
+                return {}
+        return {pos: d for pos, d in (acumulado or {}).items() if pos not in excluir and d > 0}
+
+    # ---------- consulta ----------
+    def _nombre_con_prefijo(self, prefijo: str) -> List[int]:
+        inicio = bisect_left(self._nombres_ordenados, prefijo)
+        fin = bisect_left(self._nombres_ordenados, prefijo + "\x7f", inicio)
+        return self._pos_ordenadas[inicio:fin]
+
+    def _niveles(self, q: str) -> List[List[int]]:
+        """Posiciones de los niveles 0-1, 2 y 3, cada lista ya en su orden final."""
+        tokens = q.split()
+
+        # Niveles 0 y 1: ya salen en orden alfabético, con el nombre idéntico primero.
+        por_nombre = self._nombre_con_prefijo(q)
+        vistos = set(por_nombre)
+
+        por_tokens = self._con_prefijo(tokens[0])
+        for tok in tokens[1:]:
+            if not por_tokens:
+                break
+            por_tokens &= self._con_prefijo(tok)
+        por_tokens -= vistos
+        vistos |= por_tokens
+
+        por_subcadena: set = set()
+        if len(q) >= 3:
+            por_subcadena = self._con_subcadena(q) - vistos
+        return [
+            por_nombre,
+            sorted(por_tokens, key=self._orden.__getitem__),
+            sorted(por_subcadena, key=lambda pos: (self._textos[pos].find(q), self._orden[pos])),
+        ]
+
+    def _orden_en_nivel(self, nivel: int, q: str, pos: int) -> tuple:
+        # Misma clave que el orden de `_niveles`, comparable entre índices distintos.
+        if nivel == 2:
+            return (self._textos[pos].find(q), self._nombres[pos], self._claves[pos])
+        return (self._nombres[pos], self._claves[pos])
+
+    def buscar(self, consulta: str, limite: Optional[int] = None) -> List[str]:
+        q = normalizar(consulta)
+        if not q:
+            return []
+        resultado = [pos for nivel in self._niveles(q) for pos in nivel]
+        if not resultado and len(q) >= 3:
+            parecidos = self._parecidos(q, set())
+            resultado = sorted(parecidos, key=lambda pos: (parecidos[pos], self._orden[pos]))
+
+        if limite is not None:
+            resultado = resultado[:limite]
+        return [self._claves[pos] for pos in resultado]
+
+
+def _con_orden(indice: IndiceBusqueda, nivel: int, q: str, posiciones: List[int]):
+    for pos in posiciones:
+        yield indice._orden_en_nivel(nivel, q, pos), indice._claves[pos]
+
+
+class IndiceConAgregados:
+    """Índice base compartido más un índice chico con lo que la sesión agregó (o quitó).
+
+    `buscar` mezcla ambos nivel por nivel con el mismo orden que `IndiceBusqueda`.
+    """
+
+    def __init__(self, base: IndiceBusqueda, agregados: IndiceBusqueda, excluidas: frozenset = frozenset()) -> None:
+        self._indices = (base, agregados)
+        self._excluidas = excluidas
+
+    def __len__(self) -> int:
+        base, agregados = self._indices
+        return len(base) + len(agregados) - len(self._excluidas)
+
+    def buscar(self, consulta: str, limite: Optional[int] = None) -> List[str]:
+        q = normalizar(consulta)
+        if not q:
+            return []
+        niveles = [indice._niveles(q) for indice in self._indices]
+        mezcla = [
+            heapq.merge(*(_con_orden(indice, n, q, posiciones[n]) for indice, posiciones in zip(self._indices, niveles)))
+            for n in range(3)
+        ]
+        # Perezoso: con `limite` solo se arman las claves de orden de los primeros resultados.
+        en_orden = (clave for nivel in mezcla for _, clave in nivel if clave not in self._excluidas)
+        claves = list(en_orden if limite is None else islice(en_orden, limite))
+        if not claves and len(q) >= 3:
+            parecidos = []
+            for indice in self._indices:
+                for pos, d in indice._parecidos(q, set()).items():
+                    if indice._claves[pos] not in self._excluidas:
+                        parecidos.append(((d, indice._nombres[pos], indice._claves[pos]), indice._claves[pos]))
+            claves = [clave for _, clave in sorted(parecidos)]
+        return claves if limite is None else claves[:limite]
+
+
+_INDICES: "OrderedDict[tuple, IndiceBusqueda]" = OrderedDict()
+_LOCK = threading.Lock()
+
+
+def indice_para(clave: tuple, entradas: Callable[[], Iterable[Tuple[str, str, str]]]) -> IndiceBusqueda:
+    """Índice memorizado por `clave` y versión del catálogo (compartido por el proceso)."""
+    cache_key = (catalogo_service.version(),) + clave
+    with _LOCK:
+        indice = _INDICES.get(cache_key)
+        if indice is not None:
+            _INDICES.move_to_end(cache_key)
+            return indice
+    indice = IndiceBusqueda(entradas())
+    with _LOCK:
+        _INDICES[cache_key] = indice
+        while len(_INDICES) > MAX_INDICES:
+            _INDICES.popitem(last=False)
+    return indice
+
+
+Indice = Union[IndiceBusqueda, IndiceConAgregados]
+
+
+def _entradas_catalogo(ejercicios: Dict[str, Dict]) -> Iterable[Tuple[str, str, str]]:
+    return ((nombre, nombre, (data or {}).get("buscable_id") or "") for nombre, data in ejercicios.items())
+
+
+def indice_catalogo(ejercicios: Dict[str, Dict], ambito: tuple = ()) -> Indice:
+    """Índice sobre `nombre -> datos` (nombre + `buscable_id`).
+
+    `ambito` distingue vistas distintas del catálogo con la misma versión (por
+    ejemplo, lo visible para cada entrenador). El índice base se memoriza por
+    versión + ámbito; si `ejercicios` no coincide con él (ejercicios agregados en
+    la sesión, que se insertan al final del dict) se devuelve el base con un
+    índice chico de los agregados. El caso común no recorre el catálogo.
+    """
+    base = indice_para(("catalogo",) + tuple(ambito), lambda: _entradas_catalogo(ejercicios))
+    ultimo = next(reversed(ejercicios), None) if ejercicios else None
+    if len(ejercicios) == len(base.origen) and (ultimo is None or ultimo in base.origen):
+        return base
+    agregados = {nombre: data for nombre, data in ejercicios.items() if nombre not in base.origen}
+    excluidas = base.origen.difference(ejercicios)
+    return IndiceConAgregados(base, IndiceBusqueda(_entradas_catalogo(agregados)), excluidas)
@@ -0,0 +1,118 @@
+"""Snapshot compartido (por proceso) de la colección `ejercicios`.
+
+Las páginas leen de aquí en vez de recorrer la colección en cada sesión; el
+ciclo de vida del listener está en `app_core.snapshot_coleccion`.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+from app_core.data_access import (
+    EMPRESAS_CATALOGO_COMPARTIDO,
+    _empresas_de_creadores,
+    _guardar_ejercicio,
+    catalogo_ejercicios_visibles,
+)
+from app_core.snapshot_coleccion import SnapshotColeccion
+from app_core.utils import empresa_de_usuario, normalizar_correo
+
+_COLECCION = "ejercicios"
+
+
+class _CatalogoSnapshot(SnapshotColeccion):
+    def __init__(self) -> None:
+        super().__init__(_COLECCION)
+
+
+_SNAPSHOT = _CatalogoSnapshot()
+
+
+def version() -> int:
+    """Versión del snapshot; cambia con cada diff aplicado (útil como clave de cache)."""
+    _SNAPSHOT.asegurar()
+    return _SNAPSHOT.version
+
+
+def ejercicios_por_id() -> Dict[str, Dict[str, Any]]:
+    """`doc_id -> datos` de toda la colección. Solo lectura: no mutar el resultado."""
+    if not _SNAPSHOT.asegurar():
+        return {}
+    return _SNAPSHOT.docs()
+
+
+def ejercicios_por_nombre() -> Dict[str, Dict[str, Any]]:
+    """`nombre -> datos` (con `_doc_id`) de toda la colección. Solo lectura."""
+    if not _SNAPSHOT.asegurar():
+        return {}
+
+    def _construir(docs: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        resultado: Dict[str, Dict[str, Any]] = {}
+        for doc_id, data in docs.items():
+            _guardar_ejercicio(resultado, doc_id, data)
+        return resultado
+
+    return _SNAPSHOT.vista(("por_nombre",), _construir)
+
+
+def ejercicios_visibles(
+    correo_usuario: str,
+    es_admin: bool = False,
+    empresa: Optional[str] = None,
+    usuarios_cache: Dict[str, Dict[str, Any]] | None = None,
+) -> Dict[str, Dict[str, Any]]:
+    """Misma semántica que `data_access.catalogo_ejercicios_visibles`, pero en memoria."""
+    correo_usuario = normalizar_correo(correo_usuario)
+    if not _SNAPSHOT.asegurar():
+        return catalogo_ejercicios_visibles(correo_usuario, es_admin, empresa, usuarios_cache)
+
+    if es_admin:
+        return ejercicios_por_nombre()
+
+    if empresa is None and correo_usuario:
+        empresa = empresa_de_usuario(correo_usuario, usuarios_cache)
+    empresa = (empresa or "").strip().lower()
+
+    def _construir(docs: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        publicos: Dict[str, Dict[str, Any]] = {}
+        compartidos: Dict[str, Dict[str, Any]] = {}
+        personales: Dict[str, Dict[str, Any]] = {}
+        legados: list[tuple[str, Dict[str, Any], str]] = []
+        comparte = empresa in EMPRESAS_CATALOGO_COMPARTIDO
+
+        for doc_id, data in docs.items():
+            creador = normalizar_correo(data.get("entrenador"))
+            if correo_usuario and creador == correo_usuario:
+                _guardar_ejercicio(personales, doc_id, data)
+            elif data.get("publico"):
+                _guardar_ejercicio(publicos, doc_id, data)
+            elif comparte:
+                empresa_doc = (data.get("empresa_propietaria") or "").strip().lower()
+                if empresa_doc == empresa:
+                    _guardar_ejercicio(compartidos, doc_id, data)
+                elif not empresa_doc and creador:
+                    legados.append((doc_id, data, creador))
+
+        if legados:
+            empresas = _empresas_de_creadores((c for _, _, c in legados), usuarios_cache)
+            for doc_id, data, creador in legados:
+                if empresas.get(creador) == empresa:
+                    _guardar_ejercicio(compartidos, doc_id, data)
+
+        resultado: Dict[str, Dict[str, Any]] = {}
+        resultado.update(publicos)
+        resultado.update(compartidos)
+        resultado.update(personales)
+        return resultado
+
+    return _SNAPSHOT.vista(("visibles", correo_usuario, empresa), _construir)
+
+
+def registrar_escritura(doc_id: str, cambios: Dict[str, Any], merge: bool = True) -> None:
+    """Refleja al instante una escritura propia; el listener la confirma después."""
+    if doc_id:
+        _SNAPSHOT.aplicar_local(doc_id, cambios, merge=merge)
+
+
+def registrar_borrado(doc_id: str) -> None:
+    if doc_id:
+        _SNAPSHOT.eliminar_local(doc_id)
@@ -1,6 +1,7 @@
 from __future__ import annotations
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional
 from .firebase_client import get_db
+from .utils import EMPRESA_MOTION, correo_a_doc_id, empresa_de_usuario, empresa_desde_datos, normalizar_correo
 
 # NOTA: No se cambian nombres de colecciones ni campos.
 
@@ -23,6 +24,133 @@ def ejercicios_list(publico: Optional[bool] = None, entrenador: Optional[str] =
     return [d.to_dict() or {} for d in q.stream()]
 
 
+# Empresas cuyos entrenadores comparten entre sí los ejercicios privados.
+EMPRESAS_CATALOGO_COMPARTIDO = {EMPRESA_MOTION}
+
+
+def _nombre_ejercicio(data: Dict[str, Any]) -> str:
+    return (data.get("nombre") or "").strip()
+
+
+def _guardar_ejercicio(target: Dict[str, Dict[str, Any]], doc_id: str, data: Dict[str, Any]) -> None:
+    nombre = _nombre_ejercicio(data)
+    if not nombre:
+        return
+    enriched = dict(data)
+    enriched["_doc_id"] = doc_id
+    target[nombre] = enriched
+
+
+def _empresas_de_creadores(
+    correos: Iterable[str],
+    usuarios_cache: Dict[str, Dict[str, Any]] | None = None,
+) -> Dict[str, str]:
+    """Resuelve la empresa de varios creadores con un único `get_all` para los que falten en cache."""
+    db = get_db()
+    empresas: Dict[str, str] = {}
+    faltantes: Dict[str, str] = {}
+    for correo in correos:
+        correo_norm = normalizar_correo(correo)
+        if not correo_norm or correo_norm in empresas or correo_norm in faltantes:
+            continue
+        data = None
+        if usuarios_cache:
+            data = usuarios_cache.get(correo_norm) or usuarios_cache.get(correo_a_doc_id(correo_norm))
+        if data is not None:
+            empresas[correo_norm] = empresa_desde_datos(correo_norm, data)
+        else:
+            faltantes[correo_norm] = correo_a_doc_id(correo_norm)
+
+    if faltantes:
+        refs = [db.collection("usuarios").document(doc_id) for doc_id in faltantes.values()]
+        por_doc_id: Dict[str, Dict[str, Any]] = {}
+        try:
+            for snap in db.get_all(refs):
+                if snap.exists:
+                    por_doc_id[snap.id] = snap.to_dict() or {}
+        except Exception:
+            por_doc_id = {}
+        for correo_norm, doc_id in faltantes.items():
+            empresas[correo_norm] = empresa_desde_datos(correo_norm, por_doc_id.get(doc_id))
+    return empresas
+
+
+def catalogo_ejercicios_visibles(
+    correo_usuario: str,
+    es_admin: bool = False,
+    empresa: Optional[str] = None,
+    usuarios_cache: Dict[str, Dict[str, Any]] | None = None,
+) -> Dict[str, Dict[str, Any]]:
+    """Catálogo `nombre -> dict` visible para el usuario usando solo consultas indexadas.
+
+    - Admin: colección completa (ve todo el catálogo).
+    - Resto: `publico==True` + `entrenador==correo` y, si su empresa comparte catálogo,
+      `empresa_propietaria==empresa` más los docs legados con `empresa_propietaria==""`,
+      cuyos creadores se resuelven con un único `get_all` sobre `usuarios`.
+
+    Precedencia ante nombres repetidos: públicos < compartidos < personales.
+    Cada dict incluye `_doc_id`.
+    """
+    db = get_db()
+    col = db.collection("ejercicios")
+    correo_usuario = normalizar_correo(correo_usuario)
+
+    if es_admin:
+        todos: Dict[str, Dict[str, Any]] = {}
+        for doc in col.stream():
+            if doc.exists:
+                _guardar_ejercicio(todos, doc.id, doc.to_dict() or {})
+        return todos
+
+    publicos: Dict[str, Dict[str, Any]] = {}
+    compartidos: Dict[str, Dict[str, Any]] = {}
+    personales: Dict[str, Dict[str, Any]] = {}
+
+    for doc in col.where("publico", "==", True).stream():
+        if doc.exists:
+            _guardar_ejercicio(publicos, doc.id, doc.to_dict() or {})
+
+    if correo_usuario:
+        for doc in col.where("entrenador", "==", correo_usuario).stream():
+            if doc.exists:
+                _guardar_ejercicio(personales, doc.id, doc.to_dict() or {})
+
+    if empresa is None and correo_usuario:
+        empresa = empresa_de_usuario(correo_usuario, usuarios_cache)
+    empresa = (empresa or "").strip().lower()
+
+    if empresa in EMPRESAS_CATALOGO_COMPARTIDO:
+        for doc in col.where("empresa_propietaria", "==", empresa).stream():
+            if not doc.exists:
+                continue
+            data = doc.to_dict() or {}
+            if data.get("publico") or normalizar_correo(data.get("entrenador")) == correo_usuario:
+                continue
+            _guardar_ejercicio(compartidos, doc.id, data)
+
+        # Docs antiguos sin empresa_propietaria: se decide por la empresa del creador.
+        legados: List[tuple[str, Dict[str, Any], str]] = []
+        for doc in col.where("empresa_propietaria", "==", "").stream():
+            if not doc.exists:
+                continue
+            data = doc.to_dict() or {}
+            creador = normalizar_correo(data.get("entrenador"))
+            if data.get("publico") or not creador or creador == correo_usuario:
+                continue
+            legados.append((doc.id, data, creador))
+        if legados:
+            empresas = _empresas_de_creadores((c for _, _, c in legados), usuarios_cache)
+            for doc_id, data, creador in legados:
+                if empresas.get(creador) == empresa:
+                    _guardar_ejercicio(compartidos, doc_id, data)
+
+    ejercicios_por_nombre: Dict[str, Dict[str, Any]] = {}
+    ejercicios_por_nombre.update(publicos)
+    ejercicios_por_nombre.update(compartidos)
+    ejercicios_por_nombre.update(personales)
+    return ejercicios_por_nombre
+
+
 def rutina_semanal_por_id(doc_id: str) -> Optional[Dict[str, Any]]:
     db = get_db()
     doc = db.collection("rutinas_semanales").document(doc_id).get()
@@ -31,12 +159,225 @@ def rutina_semanal_por_id(doc_id: str) -> Optional[Dict[str, Any]]:
     return doc.to_dict() or {}
 
 
+# Campos livianos de `rutinas_semanales` suficientes para listar clientes y semanas.
+CAMPOS_INDICE_RUTINAS = ["correo", "cliente", "fecha_lunes", "entrenador", "bloque_rutina"]
+
+
+def indice_rutinas_semanales() -> List[Dict[str, Any]]:
+    """Proyección de `rutinas_semanales` sin el cuerpo `rutina` (cada entrada incluye `_id`).
+
+    El `_id` sigue el formato `<correo_norm>_<fecha_lunes_norm>`, por lo que cada entrada
+    queda identificada por `(correo, fecha_lunes)`.
+    """
+    db = get_db()
+    q = db.collection("rutinas_semanales").select(CAMPOS_INDICE_RUTINAS)
+    entradas: List[Dict[str, Any]] = []
+    for doc in q.stream():
+        if not doc.exists:
+            continue
+        data = doc.to_dict() or {}
+        data["_id"] = doc.id
+        entradas.append(data)
+    return entradas
+
+
+def rutinas_semanales_por_ids(doc_ids: Iterable[str], chunk: int = 100) -> List[Dict[str, Any]]:
+    """Lee documentos completos de `rutinas_semanales` con `get_all` (un round trip por lote)."""
+    db = get_db()
+    col = db.collection("rutinas_semanales")
+    ids = [i for i in dict.fromkeys(doc_ids) if i]
+    resultados: List[Dict[str, Any]] = []
+    for start in range(0, len(ids), chunk):
+        refs = [col.document(doc_id) for doc_id in ids[start:start + chunk]]
+        for snap in db.get_all(refs):
+            if snap.exists:
+                data = snap.to_dict() or {}
+                data["_id"] = snap.id
+                resultados.append(data)
+    return resultados
+
+
+def docs_de_cliente(
+    coleccion: str,
+    correo: str,
+    campos: Optional[List[str]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """`doc_id -> datos` de los docs de un cliente en `coleccion`, sin recorrerla entera.
+
+    Combina rangos sobre el ID (`<correo>_...` y `<correo_normalizado>_...`) con la
+    consulta `correo == ...`, para cubrir tanto IDs antiguos como docs con el campo.
+    Con `campos` se proyecta solo lo necesario.
+    """
+    from google.cloud.firestore_v1.field_path import FieldPath
+
+    correo_norm = normalizar_correo(correo)
+    if not correo_norm:
+        return {}
+    db = get_db()
+    col = db.collection(coleccion)
+    doc_id_field = FieldPath.document_id()
+    queries = []
+    for prefijo in dict.fromkeys([f"{correo_norm}_", f"{correo_a_doc_id(correo_norm)}_"]):
+        queries.append(col.order_by(doc_id_field).start_at([prefijo]).end_at([prefijo + "\uf8ff"]))
+    queries.append(col.where("correo", "==", correo_norm))
+
+    resultado: Dict[str, Dict[str, Any]] = {}
+    for q in queries:
+        if campos is not None:
+            q = q.select(campos)
+        for snap in q.stream():
+            if snap.exists and snap.id not in resultado:
+                resultado[snap.id] = snap.to_dict() or {}
+    return resultado
+
+
 def rutinas_de_correo(correo_norm: str) -> List[Dict[str, Any]]:
     db = get_db()
     docs = list(db.collection("rutinas_semanales").where("correo", "==", correo_norm).stream())
     return [d.to_dict() or {} for d in docs]
 
 
+CAMPOS_SEMANAS_BLOQUE = ["correo", "bloque_rutina", "fecha_lunes"]
+
+
+def _fecha_de_semana(doc_id: str, data: Dict[str, Any]) -> str:
+    fecha = str(data.get("fecha_lunes") or "").strip()
+    if fecha:
+        return fecha
+    partes = doc_id.rsplit("_", 3)
+    if len(partes) == 4 and all(p.isdigit() for p in partes[1:]):
+        return "-".join(partes[1:])
+    return ""
+
+
+def fechas_de_bloques(pares: Iterable[tuple], chunk: int = 30) -> Dict[tuple, List[str]]:
+    """`(correo, bloque_rutina) -> fechas_lunes ordenadas` para varios pares a la vez.
+
+    Una consulta `bloque_rutina in [...]` (proyectada a los campos mínimos) por
+    cada `chunk` bloques, en vez de una por cliente; Firestore admite hasta 30
+    valores por filtro `in`. Las claves del resultado son los pares recibidos.
+    """
+    por_clave: Dict[tuple, tuple] = {}
+    for correo, bloque in pares:
+        clave = (normalizar_correo(correo), str(bloque or "").strip())
+        if all(clave):
+            por_clave.setdefault(clave, (correo, bloque))
+    fechas: Dict[tuple, set] = {clave: set() for clave in por_clave}
+
+    def _agregar(snap) -> None:
+        data = snap.to_dict() or {}
+        clave = (normalizar_correo(data.get("correo", "")), str(data.get("bloque_rutina") or "").strip())
+        fecha = _fecha_de_semana(snap.id, data)
+        if clave in fechas and fecha:
+            fechas[clave].add(fecha)
+
+    col = get_db().collection("rutinas_semanales")
+    bloques = sorted({bloque for _, bloque in por_clave})
+    for start in range(0, len(bloques), chunk):
+        lote = bloques[start:start + chunk]
+        try:
+            for snap in col.where("bloque_rutina", "in", lote).select(CAMPOS_SEMANAS_BLOQUE).stream():
+                _agregar(snap)
+        except Exception:
+            # Sin soporte para `in`/proyección: una consulta por par de este lote.
+            for clave, (correo, bloque) in por_clave.items():
+                if clave[1] in lote:
+                    for snap in col.where("correo", "==", correo).where("bloque_rutina", "==", bloque).stream():
+                        _agregar(snap)
+    return {original: sorted(fechas[clave]) for clave, original in por_clave.items()}
+
+
+# Resumen por cliente de su semana más reciente: `ultima_rutina/<correo_doc_id>`.
+COLECCION_ULTIMA_RUTINA = "ultima_rutina"
+CAMPOS_ULTIMA_RUTINA = ["correo", "cliente", "entrenador", "bloque_rutina", "fecha_lunes"]
+
+
+def _resumen_ultima_rutina(doc_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    resumen = {campo: data.get(campo) or "" for campo in CAMPOS_ULTIMA_RUTINA}
+    resumen["correo"] = normalizar_correo(resumen["correo"])
+    resumen["entrenador"] = normalizar_correo(resumen["entrenador"])
+    resumen["fecha_lunes"] = str(resumen["fecha_lunes"])
+    resumen["rutina_id"] = doc_id
+    return resumen
+
+
+def registrar_ultima_rutina(semanas: Dict[str, Dict[str, Any]], writer=None) -> int:
+    """Avanza `ultima_rutina` de cada cliente con las semanas recién escritas.
+
+    `semanas` es `doc_id -> datos` de `rutinas_semanales`. Solo se sobrescribe el
+    resumen si la semana nueva es igual o posterior a la registrada (un único
+    `get_all` para comparar). Si se pasa un `BatchWriter`, las escrituras se suman a
+    su lote; si no, se confirman aquí. Devuelve cuántos resúmenes se actualizaron.
+    """
+    candidatos: Dict[str, Dict[str, Any]] = {}
+    for doc_id, data in semanas.items():
+        resumen = _resumen_ultima_rutina(doc_id, data or {})
+        if not resumen["correo"] or not resumen["fecha_lunes"]:
+            continue
+        actual = candidatos.get(resumen["correo"])
+        if actual is None or resumen["fecha_lunes"] >= actual["fecha_lunes"]:
+            candidatos[resumen["correo"]] = resumen
+    if not candidatos:
+        return 0
+
+    db = get_db()
+    col = db.collection(COLECCION_ULTIMA_RUTINA)
+    refs = {correo: col.document(correo_a_doc_id(correo)) for correo in candidatos}
+    registrados: Dict[str, str] = {}
+    for snap in db.get_all(list(refs.values())):
+        if snap.exists:
+            registrados[snap.id] = str((snap.to_dict() or {}).get("fecha_lunes") or "")
+
+    propio = writer is None
+    if propio:
+        from .batch_writer import BatchWriter
+
+        writer = BatchWriter(db)
+    actualizados = 0
+    for correo, resumen in candidatos.items():
+        ref = refs[correo]
+        if registrados.get(ref.id, "") > resumen["fecha_lunes"]:
+            continue
+        # merge: conserva marcas de otros módulos (p. ej. `metricas_completas`).
+        writer.set(ref, resumen, merge=True)
+        actualizados += 1
+    if propio:
+        writer.commit()
+    return actualizados
+
+
+def recalcular_ultima_rutina(correo: str) -> Optional[Dict[str, Any]]:
+    """Recalcula `ultima_rutina` de un cliente desde `rutinas_semanales` (p. ej. tras borrar semanas)."""
+    correo_norm = normalizar_correo(correo)
+    if not correo_norm:
+        return None
+    db = get_db()
+    q = db.collection("rutinas_semanales").where("correo", "==", correo_norm).select(CAMPOS_ULTIMA_RUTINA)
+    ultima: Optional[Dict[str, Any]] = None
+    for snap in q.stream():
+        resumen = _resumen_ultima_rutina(snap.id, snap.to_dict() or {})
+        if resumen["fecha_lunes"] and (ultima is None or resumen["fecha_lunes"] > ultima["fecha_lunes"]):
+            ultima = resumen
+    ref = db.collection(COLECCION_ULTIMA_RUTINA).document(correo_a_doc_id(correo_norm))
+    if ultima is None:
+        ref.delete()
+    else:
+        ref.set(ultima, merge=True)
+    return ultima
+
+
+def ultimas_rutinas() -> Dict[str, Dict[str, Any]]:
+    """`correo -> resumen` de `ultima_rutina` para todos los clientes (una sola consulta)."""
+    db = get_db()
+    resultado: Dict[str, Dict[str, Any]] = {}
+    for snap in db.collection(COLECCION_ULTIMA_RUTINA).stream():
+        data = snap.to_dict() or {}
+        correo = normalizar_correo(data.get("correo"))
+        if correo:
+            resultado[correo] = data
+    return resultado
+
+
 def catalogo_ejercicios() -> Dict[str, Any]:
     db = get_db()
     doc = db.collection("configuracion_app").document("catalogos_ejercicios").get()
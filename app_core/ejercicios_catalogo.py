@@ -2,8 +2,7 @@ from __future__ import annotations
 
 import streamlit as st
 
-from app_core.firebase_client import get_db
-from app_core.utils import empresa_de_usuario, EMPRESA_MOTION
+from app_core import catalogo_service
 
 ADMIN_ROLES = {"admin", "administrador", "owner"}
 
@@ -48,83 +47,16 @@ def _store(target: dict[str, dict], doc_id: str, data: dict, correo_prioritario:
             target[nombre] = enriched
 
 
-@st.cache_data(show_spinner=False)
-def cargar_ejercicios_filtrados(correo_usuario: str, rol: str) -> dict[str, dict]:
-    db = get_db()
+@st.cache_data(show_spinner=False, max_entries=16)
+def cargar_ejercicios_filtrados(correo_usuario: str, rol: str, version_catalogo: int = 0) -> dict[str, dict]:
     correo_usuario = (correo_usuario or "").strip().lower()
     rol = (rol or "").strip()
     ejercicios_por_nombre: dict[str, dict] = {}
 
     try:
-        if _es_admin(rol):
-            for doc in db.collection("ejercicios").stream():
-                if not doc.exists:
-                    continue
-                _store(ejercicios_por_nombre, doc.id, doc.to_dict() or {}, correo_usuario)
-            return ejercicios_por_nombre
-
-        empresa_usuario = empresa_de_usuario(correo_usuario) if correo_usuario else ""
-        publicos: dict[str, dict] = {}
-        personales: dict[str, dict] = {}
-        compartidos: dict[str, dict] = {}
-
-        if empresa_usuario == EMPRESA_MOTION:
-            empresa_cache: dict[str, str] = {}
-
-            def _empresa_de_creador(correo_creador: str) -> str:
-                correo_creador = (correo_creador or "").strip().lower()
-                if not correo_creador:
-                    return ""
-                if correo_creador not in empresa_cache:
-                    try:
-                        empresa_cache[correo_creador] = empresa_de_usuario(correo_creador)
-                    except Exception:
-                        empresa_cache[correo_creador] = ""
-                return empresa_cache[correo_creador]
-
-            for doc in db.collection("ejercicios").stream():
-                if not doc.exists:
-                    continue
-                data = doc.to_dict() or {}
-                if not data:
-                    continue
-                es_publico = bool(data.get("publico"))
-                creador = (data.get("entrenador") or "").strip().lower()
-
-                if es_publico:
-                    _store(publicos, doc.id, data, correo_usuario)
-                    continue
-
-                if creador and creador == correo_usuario:
-                    _store(personales, doc.id, data, correo_usuario)
-                    continue
-
-                empresa_doc = (data.get("empresa_propietaria") or "").strip().lower()
-                if not empresa_doc:
-                    empresa_doc = _empresa_de_creador(creador)
-
-                if empresa_doc == EMPRESA_MOTION:
-                    _store(compartidos, doc.id, data, correo_usuario)
-
-            ejercicios_por_nombre.update(publicos)
-            ejercicios_por_nombre.update(compartidos)
-            ejercicios_por_nombre.update(personales)
-        else:
-            for doc in db.collection("ejercicios").where("publico", "==", True).stream():
-                if not doc.exists:
-                    continue
-                _store(publicos, doc.id, doc.to_dict() or {}, correo_usuario)
-
-            if correo_usuario:
-                for doc in db.collection("ejercicios").where("entrenador", "==", correo_usuario).stream():
-                    if not doc.exists:
-                        continue
-                    data = doc.to_dict() or {}
-                    _store(personales, doc.id, data, correo_usuario)
-                    publicos.pop((data.get("nombre") or "").strip(), None)
-
-            ejercicios_por_nombre.update(publicos)
-            ejercicios_por_nombre.update(personales)
+        catalogo = catalogo_service.ejercicios_visibles(correo_usuario, es_admin=_es_admin(rol))
+        for data in catalogo.values():
+            _store(ejercicios_por_nombre, data.get("_doc_id", ""), data, correo_usuario)
     except Exception as e:
         st.error(f"Error cargando ejercicios: {e}")
 
@@ -134,4 +66,4 @@ def cargar_ejercicios_filtrados(correo_usuario: str, rol: str) -> dict[str, dict
 def obtener_ejercicios_disponibles() -> dict[str, dict]:
     correo_usuario = (st.session_state.get("correo") or "").strip().lower()
     rol = (st.session_state.get("rol") or "").strip()
-    return cargar_ejercicios_filtrados(correo_usuario, rol)
+    return cargar_ejercicios_filtrados(correo_usuario, rol, catalogo_service.version())
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+import atexit
 import logging
 import os
+import threading
+import time
 from dataclasses import dataclass
 from datetime import date, datetime, timedelta
 from email.mime.multipart import MIMEMultipart
@@ -35,6 +38,16 @@ from app_core.email_templates import (
 
 logger = logging.getLogger(__name__)
 
+SENDGRID_URL = "https://api.sendgrid.com/v3/mail/send"
+# Muchos servidores SMTP cortan la sesión tras unos minutos sin actividad.
+SMTP_MAX_OCIOSO_S = 120.0
+
+ROLES_RESUMEN = {"entrenador", "admin", "administrador"}
+# Cómo salió un correo de `_despachar`; "" si no salió.
+DESPACHO_ENCOLADO = "encolado"
+DESPACHO_ENVIADO = "enviado"
+CAMPOS_HISTORIAL_BLOQUE = ["correo", "cliente", "nombre", "entrenador", "bloque_rutina", "fecha_lunes", "objetivo"]
+
 
 @dataclass
 class EmailSettings:
@@ -180,41 +193,71 @@ def _emit_error(msg: str) -> None:
             pass
 
 
-def _send_email(
+@dataclass
+class ResultadoEnvio:
+    ok: bool
+    canal: str = ""
+    error: Optional[str] = None
+    latencia_ms: float = 0.0
+    reconexiones: int = 0
+
+
+def _enviar(
     to_email: str,
     subject: str,
     html_body: str,
     text_body: Optional[str] = None,
     to_name: Optional[str] = None,
-) -> bool:
+    notificar: bool = True,
+) -> ResultadoEnvio:
+    """Envía un mensaje por el transporte compartido; con `notificar` emite toasts."""
     settings = _load_settings()
     if not settings.enabled:
-        _emit_info("Notificaciones por correo deshabilitadas o sin credenciales.")
-        return False
-
-    if settings.api_key:
-        return _send_email_sendgrid(settings, to_email, subject, html_body, text_body, to_name)
+        msg = "Notificaciones por correo deshabilitadas o sin credenciales."
+        if notificar:
+            _emit_info(msg)
+        return ResultadoEnvio(ok=False, error=msg)
+
+    if not (settings.api_key or _smtp_configurado(settings)):
+        msg = "No hay configuración válida de correo (SendGrid o SMTP)."
+        if notificar:
+            _emit_warning(msg)
+        return ResultadoEnvio(ok=False, error=msg)
+
+    resultado = _TRANSPORTE.enviar(settings, to_email, subject, html_body, text_body, to_name)
+    if notificar:
+        if resultado.ok:
+            _emit_info(
+                f"Correo enviado a {to_email} con asunto '{subject}' ({resultado.latencia_ms:.0f} ms)."
+            )
+        else:
+            via = " vía SMTP" if resultado.canal == "smtp" else ""
+            _emit_error(f"No se pudo enviar el correo a {to_email}{via}: {resultado.error}")
+    return resultado
 
-    if settings.smtp_host and settings.smtp_user and settings.smtp_password and settings.smtp_port:
-        return _send_email_smtp(settings, to_email, subject, html_body, text_body, to_name)
 
-    _emit_warning("No hay configuración válida de correo (SendGrid o SMTP).")
-    return False
+def _send_email(
+    to_email: str,
+    subject: str,
+    html_body: str,
+    text_body: Optional[str] = None,
+    to_name: Optional[str] = None,
+) -> bool:
+    return _enviar(to_email, subject, html_body, text_body, to_name).ok
 
 
-def _send_email_smtp(
+def _construir_mime(
     settings: EmailSettings,
     to_email: str,
     subject: str,
     html_body: str,
     text_body: Optional[str],
     to_name: Optional[str],
-) -> bool:
+) -> MIMEMultipart:
     mensaje = MIMEMultipart("alternative")
     remitente_nombre = settings.from_name or settings.smtp_user
-    remitente_address = settings.from_email or settings.smtp_user
     mensaje["Subject"] = subject
-    mensaje["From"] = formataddr((remitente_nombre, remitente_address))
+    mensaje["From"] = formataddr((remitente_nombre, _remitente_smtp(settings)))
     mensaje["To"] = formataddr((to_name or "", to_email))
     if settings.reply_to:
         mensaje["Reply-To"] = settings.reply_to
@@ -223,34 +266,41 @@ def _send_email_smtp(
     html_part = MIMEText(html_body, "html", "utf-8")
     mensaje.attach(text_part)
     mensaje.attach(html_part)
+    return mensaje
+
+
+def _remitente_smtp(settings: EmailSettings) -> str:
+    return settings.from_email or settings.smtp_user
 
+
+def _abrir_smtp(settings: EmailSettings) -> smtplib.SMTP:
+    """Conexión SMTP autenticada (TCP + TLS + login)."""
+    if settings.use_ssl:
+        smtp = smtplib.SMTP_SSL(settings.smtp_host, settings.smtp_port, timeout=10)
+    else:
+        smtp = smtplib.SMTP(settings.smtp_host, settings.smtp_port, timeout=10)
     try:
-        if settings.use_ssl:
-            smtp = smtplib.SMTP_SSL(settings.smtp_host, settings.smtp_port, timeout=10)
-        else:
-            smtp = smtplib.SMTP(settings.smtp_host, settings.smtp_port, timeout=10)
-        with smtp:
-            if settings.use_starttls and not settings.use_ssl:
-                smtp.starttls()
-            smtp.login(settings.smtp_user, settings.smtp_password)
-            smtp.sendmail(remitente_address, [to_email], mensaje.as_string())
-        _emit_info(f"Correo enviado a {to_email} con asunto '{subject}'.")
-        return True
-    except Exception as exc:
-        _emit_error(f"No se pudo enviar el correo a {to_email} vía SMTP: {exc}")
-        return False
+        if settings.use_starttls and not settings.use_ssl:
+            smtp.starttls()
+        smtp.login(settings.smtp_user, settings.smtp_password)
+    except Exception:
+        try:
+            smtp.close()
+        except Exception:
+            pass
+        raise
+    return smtp
 
 
-def _send_email_sendgrid(
+def _payload_sendgrid(
     settings: EmailSettings,
     to_email: str,
     subject: str,
     html_body: str,
     text_body: Optional[str],
     to_name: Optional[str],
-) -> bool:
-
-    payload = {
+) -> Dict[str, Any]:
+    payload: Dict[str, Any] = {
         "personalizations": [
             {
                 "to": [{"email": to_email, **({"name": to_name} if to_name else {})}],
@@ -275,25 +325,234 @@ def _send_email_sendgrid(
 
     if settings.reply_to:
         payload["reply_to"] = {"email": settings.reply_to}
+    return payload
+
 
-    headers = {
+def _headers_sendgrid(settings: EmailSettings) -> Dict[str, str]:
+    return {
         "Authorization": f"Bearer {settings.api_key}",
         "Content-Type": "application/json",
     }
 
-    try:
-        response = requests.post(
-            "https://api.sendgrid.com/v3/mail/send",
-            headers=headers,
-            json=payload,
-            timeout=10,
+
+def _smtp_configurado(settings: EmailSettings) -> bool:
+    return bool(settings.smtp_host and settings.smtp_user and settings.smtp_password and settings.smtp_port)
+
+
+class _Transporte:
+    """Conexión de salida compartida por el proceso (SMTP autenticado o sesión HTTP).
+
+    Se abre en el primer envío y se reutiliza en los siguientes; si el servidor
+    la cerró (o lleva demasiado ociosa) se reabre y el mensaje se reintenta una
+    vez. Los envíos se serializan con un lock porque ni `smtplib.SMTP` ni
+    `requests.Session` son seguros entre hilos.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._smtp_clave: Optional[tuple] = None
+        self._smtp_ultimo_uso = 0.0
+        self._session: Optional[requests.Session] = None
+        self._session_clave: Optional[str] = None
+        self._stats = {"enviados": 0, "errores": 0, "reconexiones": 0, "latencia_total_ms": 0.0}
+
+    # ---------- SMTP ----------
+    def _cerrar_smtp(self) -> None:
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except Exception:
+                try:
+                    smtp.close()
+                except Exception:
+                    pass
+
+    def _smtp_listo(self, settings: EmailSettings) -> smtplib.SMTP:
+        clave = (
+            settings.smtp_host,
+            settings.smtp_port,
+            settings.smtp_user,
+            settings.smtp_password,
+            settings.use_ssl,
+            settings.use_starttls,
         )
-        response.raise_for_status()
-        _emit_info(f"Correo enviado a {to_email} con asunto '{subject}'.")
-        return True
-    except Exception as exc:
-        _emit_error(f"No se pudo enviar el correo a {to_email}: {exc}")
-        return False
+        ocioso = time.monotonic() - self._smtp_ultimo_uso
+        if self._smtp is not None and (self._smtp_clave != clave or ocioso > SMTP_MAX_OCIOSO_S):
+            self._cerrar_smtp()
+        if self._smtp is None:
+            self._smtp = _abrir_smtp(settings)
+            self._smtp_clave = clave
+        return self._smtp
+
+    def _enviar_smtp(self, settings: EmailSettings, to_email: str, mime: str) -> Tuple[Optional[str], int]:
+        reconexiones = 0
+        for intento in range(2):
+            try:
+                smtp = self._smtp_listo(settings)
+                smtp.sendmail(_remitente_smtp(settings), [to_email], mime)
+                self._smtp_ultimo_uso = time.monotonic()
+                return None, reconexiones
+            except smtplib.SMTPServerDisconnected as exc:
+                error = exc
+            except smtplib.SMTPException as exc:
+                # Rechazo del servidor (destinatario, login...): reconectar no ayuda.
+                if self._smtp is not None:
+                    self._smtp_ultimo_uso = time.monotonic()
+                return str(exc), reconexiones
+            except OSError as exc:
+                error = exc
+            self._cerrar_smtp()
+            if intento == 0:
+                reconexiones += 1
+        return str(error), reconexiones
+
+    # ---------- SendGrid ----------
+    def _session_lista(self, settings: EmailSettings) -> requests.Session:
+        if self._session is not None and self._session_clave != settings.api_key:
+            self._cerrar_session()
+        if self._session is None:
+            self._session = requests.Session()
+            self._session.headers.update(_headers_sendgrid(settings))
+            self._session_clave = settings.api_key
+        return self._session
+
+    def _cerrar_session(self) -> None:
+        session, self._session = self._session, None
+        if session is not None:
+            try:
+                session.close()
+            except Exception:
+                pass
+
+    def _enviar_sendgrid(self, settings: EmailSettings, payload: Dict[str, Any]) -> Tuple[Optional[str], int]:
+        reconexiones = 0
+        for intento in range(2):
+            try:
+                response = self._session_lista(settings).post(SENDGRID_URL, json=payload, timeout=10)
+                response.raise_for_status()
+                return None, reconexiones
+            except requests.ConnectionError as exc:
+                error = exc
+            except Exception as exc:
+                return str(exc), reconexiones
+            self._cerrar_session()
+            if intento == 0:
+                reconexiones += 1
+        return str(error), reconexiones
+
+    # ---------- API ----------
+    def enviar(
+        self,
+        settings: EmailSettings,
+        to_email: str,
+        subject: str,
+        html_body: str,
+        text_body: Optional[str],
+        to_name: Optional[str],
+    ) -> ResultadoEnvio:
+        if settings.api_key:
+            canal = "sendgrid"
+            contenido: Any = _payload_sendgrid(settings, to_email, subject, html_body, text_body, to_name)
+        else:
+            canal = "smtp"
+            contenido = _construir_mime(settings, to_email, subject, html_body, text_body, to_name).as_string()
+
+        with self._lock:
+            inicio = time.perf_counter()
+            if canal == "sendgrid":
+                error, reconexiones = self._enviar_sendgrid(settings, contenido)
+            else:
+                error, reconexiones = self._enviar_smtp(settings, to_email, contenido)
+            latencia_ms = (time.perf_counter() - inicio) * 1000
+            self._stats["enviados" if error is None else "errores"] += 1
+            self._stats["reconexiones"] += reconexiones
+            self._stats["latencia_total_ms"] += latencia_ms
+
+        logger.info(
+            "Correo %s a %s vía %s en %.0f ms (reconexiones=%s)",
+            "enviado" if error is None else "fallido",
+            to_email,
+            canal,
+            latencia_ms,
+            reconexiones,
+        )
+        return ResultadoEnvio(
+            ok=error is None,
+            canal=canal,
+            error=error,
+            latencia_ms=latencia_ms,
+            reconexiones=reconexiones,
+        )
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        total = stats["enviados"] + stats["errores"]
+        stats["latencia_media_ms"] = stats["latencia_total_ms"] / total if total else 0.0
+        return stats
+
+    def cerrar(self) -> None:
+        with self._lock:
+            self._cerrar_smtp()
+            self._cerrar_session()
+
+
+_TRANSPORTE = _Transporte()
+atexit.register(_TRANSPORTE.cerrar)
+
+
+def estadisticas_transporte() -> Dict[str, Any]:
+    """Envíos, errores, reconexiones y latencia media del transporte de este proceso."""
+    return _TRANSPORTE.estadisticas()
+
+
+def _despachar(
+    to_email: str,
+    subject: str,
+    html_body: str,
+    text_body: Optional[str] = None,
+    to_name: Optional[str] = None,
+    tipo: str = "",
+) -> str:
+    """Encola el correo para el worker; si la cola no está disponible, lo envía en línea.
+
+    Devuelve `DESPACHO_ENCOLADO`, `DESPACHO_ENVIADO` o "" si no salió.
+    """
+    settings = _load_settings()
+    if not settings.enabled:
+        _emit_info("Notificaciones por correo deshabilitadas o sin credenciales.")
+        return ""
+
+    from app_core.email_queue import encolar_correo
+
+    if encolar_correo(to_email, subject, html_body, text_body, to_name, tipo=tipo):
+        _emit_info(f"Correo a {to_email} encolado con asunto '{subject}'.")
+        return DESPACHO_ENCOLADO
+    if _send_email(to_email, subject, html_body, text_body, to_name):
+        return DESPACHO_ENVIADO
+    return ""
+
+
+def entregar_lote(mensajes: List[Dict[str, Any]]) -> List[ResultadoEnvio]:
+    """Envía varios mensajes por el transporte compartido, sin emitir toasts.
+
+    Cada mensaje es un dict con `to_email`, `subject`, `html_body` y opcionalmente
+    `text_body`/`to_name`. Devuelve un `ResultadoEnvio` por mensaje, en orden.
+    Pensado para el worker de la cola de correo.
+    """
+    return [
+        _enviar(
+            msg["to_email"],
+            msg["subject"],
+            msg["html_body"],
+            msg.get("text_body"),
+            msg.get("to_name"),
+            notificar=False,
+        )
+        for msg in mensajes
+    ]
 
 
 def _strip_html(html: str) -> str:
@@ -471,12 +730,15 @@ def enviar_correo_bienvenida(
         instrucciones_extra=instrucciones_extra,
     )
 
-    return _send_email(
-        to_email=correo_norm,
-        subject=contenido.subject,
-        html_body=contenido.html_body,
-        text_body=contenido.text_body,
-        to_name=nombre or None,
+    return bool(
+        _despachar(
+            to_email=correo_norm,
+            subject=contenido.subject,
+            html_body=contenido.html_body,
+            text_body=contenido.text_body,
+            to_name=nombre or None,
+            tipo="bienvenida",
+        )
     )
 
 
@@ -489,23 +751,23 @@ def preparar_resumen_bloques_entrenador(
         raise ValueError("correo_entrenador es obligatorio.")
 
     fecha_base = fecha_referencia or date.today()
-    lunes_actual = _lunes_de(fecha_base)
-    domingo_actual = lunes_actual + timedelta(days=6)
-    lunes_siguiente = lunes_actual + timedelta(days=7)
 
     db = get_db()
 
     rol_destino = ""
+    # El mismo doc de `usuarios` da el rol y el nombre: no se relee para el saludo.
+    nombre_destino: Optional[str] = None
     try:
         snaps_usuario = db.collection("usuarios").where("correo", "==", correo_norm).limit(1).stream()
         for snap in snaps_usuario:
             data_usuario = snap.to_dict() or {}
             rol_destino = str(data_usuario.get("rol") or "").strip().lower()
+            nombre_destino = str(data_usuario.get("nombre") or "").strip()
             break
     except Exception:
         rol_destino = ""
 
-    if rol_destino and rol_destino not in {"entrenador", "admin", "administrador"}:
+    if rol_destino and rol_destino not in ROLES_RESUMEN:
         raise ValueError("Solo se generan resúmenes para entrenadores o administradores.")
 
     col = db.collection("rutinas_semanales")
@@ -535,6 +797,20 @@ def preparar_resumen_bloques_entrenador(
     if not docs:
         raise ValueError("El entrenador no tiene rutinas registradas.")
 
+    return _armar_resumen_bloques(correo_norm, docs, fecha_base, nombre_destino=nombre_destino)
+
+
+def _armar_resumen_bloques(
+    correo_norm: str,
+    docs: List[Dict[str, Any]],
+    fecha_base: date,
+    nombre_destino: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Arma el resumen de un entrenador a partir de sus docs de `rutinas_semanales`."""
+    lunes_actual = _lunes_de(fecha_base)
+    domingo_actual = lunes_actual + timedelta(days=6)
+    lunes_siguiente = lunes_actual + timedelta(days=7)
+
     bloques: Dict[Tuple[str, str], Dict[str, Any]] = {}
     comentarios_semana: List[Dict[str, Any]] = []
 
@@ -655,7 +931,8 @@ def preparar_resumen_bloques_entrenador(
     if not bloques_terminados and not bloques_proximos and not comentarios_agrupados:
         raise ValueError("No hay rutinas por terminar ni comentarios nuevos para esta semana.")
 
-    nombre_destino = _buscar_nombre_usuario(correo_norm) or ""
+    if nombre_destino is None:
+        nombre_destino = _buscar_nombre_usuario(correo_norm) or ""
     if not nombre_destino:
         local = correo_norm.split("@", 1)[0] if "@" in correo_norm else correo_norm
         nombre_destino = local.replace(".", " ").replace("_", " ").title()
@@ -689,6 +966,120 @@ def preparar_resumen_bloques_entrenador(
     }
 
 
+def _docs_resumen_por_entrenador(
+    db,
+    lunes_actual: date,
+    entrenadores: Optional[set] = None,
+) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """`entrenador -> doc_id -> datos` con lo necesario para los resúmenes de la semana.
+
+    Lee una sola vez las semanas desde `lunes_actual` (ahí están los comentarios de
+    la semana y la última semana de cada bloque vigente). Solo para los bloques que
+    terminan esta semana o la siguiente trae, proyectadas, sus semanas anteriores,
+    que hacen falta para el inicio y el total de semanas.
+    """
+    col = db.collection("rutinas_semanales")
+    desde = lunes_actual.isoformat()
+    lunes_siguiente = lunes_actual + timedelta(days=7)
+    por_entrenador: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def _agregar(snap, data: Dict[str, Any]) -> Optional[str]:
+        entrenador = str(data.get("entrenador") or "").strip().lower()
+        if not entrenador or (entrenadores is not None and entrenador not in entrenadores):
+            return None
+        data["_doc_id"] = snap.id
+        por_entrenador.setdefault(entrenador, {})[snap.id] = data
+        return entrenador
+
+    try:
+        snaps = list(col.where("fecha_lunes", ">=", desde).stream())
+    except Exception as exc:
+        _emit_warning(f"No se pudo filtrar rutinas desde {desde}; se recorre la colección una vez: {exc}")
+        try:
+            for snap in col.stream():
+                _agregar(snap, snap.to_dict() or {})
+        except Exception:
+            pass
+        return por_entrenador
+
+    ultimas: Dict[Tuple[str, str, str], date] = {}
+    for snap in snaps:
+        data = snap.to_dict() or {}
+        entrenador = _agregar(snap, data)
+        fecha = _parse_fecha_lunes(data.get("fecha_lunes"))
+        bloque = str(data.get("bloque_rutina") or "").strip()
+        if not entrenador or not fecha or not bloque:
+            continue
+        key = (entrenador, str(data.get("correo") or "").strip().lower(), bloque)
+        if key not in ultimas or fecha > ultimas[key]:
+            ultimas[key] = fecha
+
+    bloques = sorted({key[2] for key, ultima in ultimas.items() if ultima in (lunes_actual, lunes_siguiente)})
+    # Firestore admite hasta 30 valores por filtro `in`.
+    for i in range(0, len(bloques), 30):
+        try:
+            query = col.where("bloque_rutina", "in", bloques[i : i + 30]).select(CAMPOS_HISTORIAL_BLOQUE)
+            for snap in query.stream():
+                data = snap.to_dict() or {}
+                if str(data.get("fecha_lunes") or "") < desde:
+                    _agregar(snap, data)
+        except Exception as exc:
+            _emit_warning(f"No se pudieron leer las semanas previas de {len(bloques[i : i + 30])} bloques: {exc}")
+    return por_entrenador
+
+
+def preparar_resumenes_bloques(
+    fecha_referencia: Optional[date] = None,
+    correos_entrenadores: Optional[Iterable[str]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """Resúmenes de bloques de todos los entrenadores (o de los indicados) en una pasada.
+
+    Devuelve `correo -> contenido`, con la misma forma que
+    `preparar_resumen_bloques_entrenador`; si un entrenador no tiene nada que
+    reportar, su valor es `{"error": ..., "destinatario": correo}`.
+    """
+    fecha_base = fecha_referencia or date.today()
+    lunes_actual = _lunes_de(fecha_base)
+    filtro: Optional[set] = None
+    if correos_entrenadores is not None:
+        filtro = {normalizar_correo(c) for c in correos_entrenadores} - {""}
+
+    db = get_db()
+    docs_por_entrenador = _docs_resumen_por_entrenador(db, lunes_actual, filtro)
+    correos = sorted(filtro if filtro is not None else docs_por_entrenador)
+
+    perfiles: Dict[str, Dict[str, Any]] = {}
+    if correos:
+        por_doc_id = {correo_a_doc_id(c): c for c in correos}
+        refs = [db.collection("usuarios").document(doc_id) for doc_id in por_doc_id]
+        try:
+            for snap in db.get_all(refs):
+                if snap.exists and snap.id in por_doc_id:
+                    perfiles[por_doc_id[snap.id]] = snap.to_dict() or {}
+        except Exception as exc:
+            _emit_warning(f"No se pudieron leer los perfiles de entrenadores: {exc}")
+
+    resultados: Dict[str, Dict[str, Any]] = {}
+    for correo in correos:
+        perfil = perfiles.get(correo) or {}
+        rol = str(perfil.get("rol") or "").strip().lower()
+        docs = list((docs_por_entrenador.get(correo) or {}).values())
+        try:
+            if rol and rol not in ROLES_RESUMEN:
+                raise ValueError("Solo se generan resúmenes para entrenadores o administradores.")
+            if not docs:
+                raise ValueError("No hay rutinas por terminar ni comentarios nuevos para esta semana.")
+            resultados[correo] = _armar_resumen_bloques(
+                correo,
+                docs,
+                fecha_base,
+                nombre_destino=str(perfil.get("nombre") or "").strip(),
+            )
+        except ValueError as exc:
+            resultados[correo] = {"error": str(exc), "destinatario": correo}
+    return resultados
+
+
 def enviar_resumen_bloques_entrenador(
     correo_entrenador: str,
     enviar: bool = False,
@@ -703,13 +1094,17 @@ def enviar_resumen_bloques_entrenador(
             "destinatario": (correo_entrenador or "").strip().lower(),
         }
 
+    return _enviar_resumen(contenido, enviar)
+
+
+def _enviar_resumen(contenido: Dict[str, Any], enviar: bool) -> Dict[str, Any]:
     resultado = dict(contenido)
 
     if not enviar:
         resultado["enviado"] = False
         return resultado
 
-    enviado = _send_email(
+    envio = _enviar(
         to_email=contenido["destinatario"],
         subject=contenido["subject"],
         html_body=contenido["html_body"],
@@ -719,12 +1114,35 @@ def enviar_resumen_bloques_entrenador(
 
     if "metadata" in resultado:
         resultado["metadata"] = dict(resultado["metadata"])
-        resultado["metadata"]["enviado"] = enviado
+        resultado["metadata"]["enviado"] = envio.ok
 
-    resultado["enviado"] = enviado
+    resultado["enviado"] = envio.ok
+    resultado["latencia_ms"] = envio.latencia_ms
+    if envio.error:
+        resultado["error"] = envio.error
     return resultado
 
 
+def enviar_resumenes_bloques(
+    correos_entrenadores: Optional[Iterable[str]] = None,
+    enviar: bool = False,
+    fecha_referencia: Optional[date] = None,
+) -> List[Dict[str, Any]]:
+    """Resumen de bloques para varios entrenadores (todos si no se indican).
+
+    Los resúmenes salen de una sola lectura de `rutinas_semanales` y los envíos
+    comparten la conexión del transporte.
+    """
+    preparados = preparar_resumenes_bloques(fecha_referencia, correos_entrenadores)
+    resultados: List[Dict[str, Any]] = []
+    for contenido in preparados.values():
+        if "error" in contenido:
+            resultados.append({"enviado": False, **contenido})
+        else:
+            resultados.append(_enviar_resumen(contenido, enviar))
+    return resultados
+
+
 def enviar_correo_rutina_disponible(
     correo: str,
     nombre: Optional[str],
@@ -732,11 +1150,12 @@ def enviar_correo_rutina_disponible(
     semanas: int,
     empresa: Optional[str] = None,
     coach: Optional[str] = None,
-) -> bool:
+) -> str:
+    """Aviso de rutina nueva; devuelve cómo salió (ver `_despachar`), "" si no salió."""
     correo_norm = normalizar_correo(correo)
     if not correo_norm:
         _emit_warning("No se pudo enviar correo de rutina: correo vacío.")
-        return False
+        return ""
 
     if not nombre:
         nombre = _buscar_nombre_usuario(correo_norm) or ""
@@ -745,7 +1164,7 @@ def enviar_correo_rutina_disponible(
 
     if empresa_norm == EMPRESA_MOTION:
         _emit_info("Correo de rutina omitido para cliente Motion.")
-        return False
+        return ""
 
     portal_url = _resolve_portal_url(empresa_norm)
 
@@ -762,10 +1181,11 @@ def enviar_correo_rutina_disponible(
         coach_label=coach_label,
     )
 
-    return _send_email(
+    return _despachar(
         to_email=correo_norm,
         subject=contenido.subject,
         html_body=contenido.html_body,
         text_body=contenido.text_body,
         to_name=nombre or None,
+        tipo="rutina_disponible",
     )
@@ -0,0 +1,235 @@
+"""Cola de correo saliente respaldada en Firestore (`mail_queue`).
+
+Las vistas solo encolan el mensaje (`encolar_correo`) y siguen; un worker en
+segundo plano, uno por proceso, toma los pendientes en lotes, los envía
+por el transporte compartido (`email_notifications.entregar_lote`) y reintenta
+con backoff exponencial. Cada documento se reclama con una precondición sobre
+`update_time`, así dos procesos no envían el mismo correo.
+
+Los candidatos se piden ya filtrados por `proximo_intento <= ahora` (o
+`lease_hasta <= ahora` para los `enviando` abandonados), ordenados por ese
+campo: los mensajes en backoff no tapan a los nuevos. Requiere los índices
+compuestos `(estado, proximo_intento)` y `(estado, lease_hasta)`. Los enviados
+llevan `expira_en` (para una política TTL) y el worker borra los vencidos.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from firebase_admin import firestore
+
+from app_core.firebase_client import get_db
+
+logger = logging.getLogger(__name__)
+
+COLECCION_COLA = "mail_queue"
+
+ESTADO_PENDIENTE = "pendiente"
+ESTADO_ENVIANDO = "enviando"
+ESTADO_ENVIADO = "enviado"
+ESTADO_FALLIDO = "fallido"
+
+MAX_INTENTOS = 6
+BACKOFF_BASE_S = 30
+TAMANO_LOTE = 20
+INTERVALO_SONDEO_S = 30.0
+LEASE_ENVIO_S = 300
+RETENCION_ENVIADOS_DIAS = 14
+INTERVALO_LIMPIEZA_S = 3600.0
+
+
+def _ahora() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _backoff(intentos: int) -> timedelta:
+    return timedelta(seconds=BACKOFF_BASE_S * (2 ** max(0, intentos - 1)))
+
+
+def encolar_correo(
+    to_email: str,
+    subject: str,
+    html_body: str,
+    text_body: Optional[str] = None,
+    to_name: Optional[str] = None,
+    tipo: str = "",
+) -> Optional[str]:
+    """Guarda el mensaje en `mail_queue` y despierta al worker. Devuelve el id o None si falló."""
+    try:
+        db = get_db()
+        ref = db.collection(COLECCION_COLA).document()
+        ref.set(
+            {
+                "to_email": to_email,
+                "to_name": to_name or "",
+                "subject": subject,
+                "html_body": html_body,
+                "text_body": text_body or "",
+                "tipo": tipo,
+                "estado": ESTADO_PENDIENTE,
+                "intentos": 0,
+                "proximo_intento": _ahora(),
+                "creado_en": firestore.SERVER_TIMESTAMP,
+            }
+        )
+    except Exception as exc:
+        logger.warning("No se pudo encolar el correo a %s: %s", to_email, exc)
+        return None
+    _WORKER.despertar()
+    return ref.id
+
+
+def _reclamar(db, snap) -> bool:
+    """Marca el doc como `enviando` solo si nadie lo tocó desde que se leyó."""
+    try:
+        snap.reference.update(
+            {"estado": ESTADO_ENVIANDO, "lease_hasta": _ahora() + timedelta(seconds=LEASE_ENVIO_S)},
+            option=db.write_option(last_update_time=snap.update_time),
+        )
+        return True
+    except Exception:
+        return False
+
+
+def _candidatos(db, limite: int = TAMANO_LOTE):
+    ahora = _ahora()
+    col = db.collection(COLECCION_COLA)
+    # Pendientes cuyo backoff ya venció y `enviando` con lease vencido (el proceso
+    # que lo tomó murió antes de confirmarlo), los más antiguos primero.
+    for estado, campo in ((ESTADO_PENDIENTE, "proximo_intento"), (ESTADO_ENVIANDO, "lease_hasta")):
+        query = (
+            col.where("estado", "==", estado)
+            .where(campo, "<=", ahora)
+            .order_by(campo)
+            .limit(limite * 2)
+        )
+        for snap in query.stream():
+            yield snap, snap.to_dict() or {}
+
+
+def procesar_cola(limite: int = TAMANO_LOTE) -> Dict[str, int]:
+    """Procesa un lote de pendientes. Devuelve conteos de enviados/reintentos/fallidos."""
+    from app_core.email_notifications import entregar_lote
+
+    resumen = {"enviados": 0, "reintentos": 0, "fallidos": 0}
+    db = get_db()
+    tomados = []
+    for snap, data in _candidatos(db, limite):
+        if len(tomados) >= limite:
+            break
+        if _reclamar(db, snap):
+            tomados.append((snap.reference, data))
+    if not tomados:
+        return resumen
+
+    resultados = entregar_lote([data for _, data in tomados])
+    batch = db.batch()
+    for (ref, data), envio in zip(tomados, resultados):
+        if envio.ok:
+            batch.update(
+                ref,
+                {
+                    "estado": ESTADO_ENVIADO,
+                    "enviado_en": firestore.SERVER_TIMESTAMP,
+                    "expira_en": _ahora() + timedelta(days=RETENCION_ENVIADOS_DIAS),
+                    "latencia_ms": round(envio.latencia_ms, 1),
+                    "error": "",
+                },
+            )
+            resumen["enviados"] += 1
+            continue
+        error = envio.error or "error desconocido"
+        intentos = int(data.get("intentos") or 0) + 1
+        if intentos >= MAX_INTENTOS:
+            batch.update(ref, {"estado": ESTADO_FALLIDO, "intentos": intentos, "error": error})
+            resumen["fallidos"] += 1
+            logger.error("Correo a %s descartado tras %s intentos: %s", data.get("to_email"), intentos, error)
+        else:
+            batch.update(
+                ref,
+                {
+                    "estado": ESTADO_PENDIENTE,
+                    "intentos": intentos,
+                    "error": error,
+                    "proximo_intento": _ahora() + _backoff(intentos),
+                },
+            )
+            resumen["reintentos"] += 1
+    batch.commit()
+    return resumen
+
+
+def limpiar_enviados(limite: int = 400) -> int:
+    """Borra enviados con `expira_en` vencido (respaldo de la política TTL). Devuelve cuántos."""
+    db = get_db()
+    query = (
+        db.collection(COLECCION_COLA)
+        .where("estado", "==", ESTADO_ENVIADO)
+        .where("expira_en", "<=", _ahora())
+        .limit(limite)
+    )
+    batch = db.batch()
+    borrados = 0
+    for snap in query.stream():
+        batch.delete(snap.reference)
+        borrados += 1
+    if borrados:
+        batch.commit()
+    return borrados
+
+
+class _WorkerCola:
+    """Hilo daemon (uno por proceso) que vacía la cola periódicamente o al ser despertado."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._evento = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self._ultima_limpieza = 0.0
+
+    def despertar(self) -> None:
+        self.iniciar()
+        self._evento.set()
+
+    def iniciar(self) -> None:
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            self._hilo = threading.Thread(target=self._loop, name="mail-queue-worker", daemon=True)
+            self._hilo.start()
+
+    def _loop(self) -> None:
+        while True:
+            self._evento.wait(INTERVALO_SONDEO_S)
+            self._evento.clear()
+            try:
+                while True:
+                    resumen = procesar_cola()
+                    if sum(resumen.values()) < TAMANO_LOTE:
+                        break
+            except Exception as exc:
+                logger.warning("Error procesando la cola de correo: %s", exc)
+            self._limpiar_si_toca()
+
+    def _limpiar_si_toca(self) -> None:
+        ahora = time.monotonic()
+        if ahora - self._ultima_limpieza < INTERVALO_LIMPIEZA_S:
+            return
+        self._ultima_limpieza = ahora
+        try:
+            limpiar_enviados()
+        except Exception as exc:
+            logger.warning("Error limpiando enviados de la cola de correo: %s", exc)
+
+
+_WORKER = _WorkerCola()
+
+
+def iniciar_worker() -> None:
+    """Arranca el worker del proceso (idempotente) y drena lo que haya pendiente."""
+    _WORKER.despertar()
+
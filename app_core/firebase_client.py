@@ -9,6 +9,8 @@ except Exception:  # Permitir importar fuera de Streamlit (tests)
 import firebase_admin
 from firebase_admin import credentials, firestore
 
+from app_core.metricas_firestore import instrumentar
+
 
 def _initialize_app_from_secrets() -> None:
     if st is None:
@@ -42,21 +44,22 @@ def get_db() -> firestore.Client:
     - Prioriza credenciales en `st.secrets["FIREBASE_CREDENTIALS"]`.
     - Fallback a ADC si no existen secrets.
     - Cacheado a nivel de proceso vía singleton de firebase_admin.
+    - Envuelto por `metricas_firestore` para contar lecturas/escrituras por llamada.
     """
     # Cache a nivel Streamlit si está disponible
     if st is not None:
         return _get_db_cached()
     # Contexto sin Streamlit (tests/scripts)
     _ensure_initialized()
-    return firestore.client()
+    return instrumentar(firestore.client())
 
 
 if st is not None:
     @st.cache_resource(show_spinner=False)  # type: ignore[misc]
     def _get_db_cached() -> firestore.Client:
         _ensure_initialized()
-        return firestore.client()
+        return instrumentar(firestore.client())
 else:
     def _get_db_cached() -> firestore.Client:  # fallback para tipado
         _ensure_initialized()
-        return firestore.client()
+        return instrumentar(firestore.client())
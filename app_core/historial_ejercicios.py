@@ -0,0 +1,191 @@
+"""Serie temporal de reportes por cliente y ejercicio.
+
+`historial_ejercicios/<correo_doc_id>__<ejercicio_normalizado>` guarda, en el
+mapa `registros`, una entrada por reporte (semana, día, bloque y circuito):
+fecha, peso planificado, peso alcanzado, reps, RIR y 1RM estimado
+(`utils_rm.calcular_rm_teorico`). Se actualiza al guardar reportes en
+`vista_rutinas`, así que "cómo le fue en X" o el mejor 1RM son una sola lectura
+chica en vez de recorrer las semanas.
+"""
+from __future__ import annotations
+
+import math
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from app_core.busqueda_ejercicios import normalizar
+from app_core.firebase_client import get_db
+from app_core.utils import correo_a_doc_id, normalizar_correo
+from app_core.utils_rm import calcular_rm_teorico
+
+COLECCION_HISTORIAL_EJERCICIOS = "historial_ejercicios"
+
+_LIBRAS = {"lb", "lbs", "libra", "libras"}
+
+
+def clave_ejercicio(nombre: str) -> str:
+    return normalizar(nombre).replace(" ", "_")
+
+
+def doc_id_historial(correo: str, nombre_ejercicio: str) -> str:
+    clave = clave_ejercicio(nombre_ejercicio)
+    if not clave or not normalizar_correo(correo):
+        return ""
+    return f"{correo_a_doc_id(correo)}__{clave}"
+
+
+def _numero(valor) -> Optional[float]:
+    txt = re.sub(r"[^0-9\.-]", "", str(valor if valor is not None else "").replace(",", "."))
+    try:
+        num = float(txt)
+    except ValueError:
+        return None
+    return num if math.isfinite(num) else None
+
+
+def _kg(valor, unidad) -> Optional[float]:
+    num = _numero(valor)
+    if num is not None and str(unidad or "").strip().lower() in _LIBRAS:
+        num = num * 0.45359237
+    return num
+
+
+def _reps_plan(ej: Dict[str, Any]) -> Optional[int]:
+    m = re.match(r"\s*(\d+)", str(ej.get("reps_min") or ej.get("repeticiones") or ""))
+    return int(m.group(1)) if m else None
+
+
+def registro_desde_ejercicio(ej: Dict[str, Any], fecha_lunes: str, dia: str) -> Optional[Dict[str, Any]]:
+    """Entrada de la serie para un ejercicio reportado, o None si no tiene reporte."""
+    if all(ej.get(k) in (None, "", []) for k in ("peso_alcanzado", "reps_alcanzadas", "rir_alcanzado")):
+        return None
+    # `peso_alcanzado` ya viene en kg (ver `vista_rutinas._parsear_series`).
+    peso_alcanzado = _numero(ej.get("peso_alcanzado"))
+    peso_plan = _kg(ej.get("peso"), ej.get("peso_unidad"))
+    reps_alc = _numero(ej.get("reps_alcanzadas"))
+    reps = int(reps_alc) if reps_alc is not None else _reps_plan(ej)
+    rir = _numero(ej.get("rir_alcanzado"))
+    if rir is None:
+        rir = _numero(ej.get("rir"))
+
+    peso_rm = peso_alcanzado if peso_alcanzado else peso_plan
+    rm_estimado = None
+    if peso_rm and peso_rm > 0 and reps and reps > 0:
+        rm_estimado = round(calcular_rm_teorico(peso_rm, reps, int(rir) if rir and rir > 0 else None), 2)
+    return {
+        "fecha": str(fecha_lunes),
+        "dia": str(dia),
+        "bloque": ej.get("bloque", ej.get("seccion", "")) or "",
+        "circuito": ej.get("circuito") or "",
+        "peso_plan": peso_plan,
+        "peso_alcanzado": peso_alcanzado,
+        "reps": reps,
+        "rir": rir,
+        "rm_estimado": rm_estimado,
+    }
+
+
+def _clave_registro(registro: Dict[str, Any]) -> str:
+    # Un re-reporte del mismo ejercicio (misma semana, día, bloque y circuito) reemplaza al anterior.
+    partes = (registro["fecha"], f"d{registro['dia']}", registro["bloque"], registro["circuito"])
+    return "_".join(normalizar(p).replace(" ", "") or "x" for p in partes)
+
+
+def registrar_reportes(
+    correo: str,
+    fecha_lunes: str,
+    dia: str,
+    ejercicios: Iterable[Dict[str, Any]],
+    writer=None,
+) -> int:
+    """Agrega a la serie de cada ejercicio los reportes de `ejercicios` (un día).
+
+    Con un `BatchWriter` las escrituras se suman a su lote; si no, se confirman
+    aquí. Devuelve cuántos registros se escribieron.
+    """
+    correo_norm = normalizar_correo(correo)
+    if not correo_norm:
+        return 0
+    db = get_db()
+    col = db.collection(COLECCION_HISTORIAL_EJERCICIOS)
+    propio = writer is None
+    if propio:
+        from .batch_writer import BatchWriter
+
+        writer = BatchWriter(db)
+    escritos = 0
+    for ej in ejercicios:
+        if not isinstance(ej, dict):
+            continue
+        nombre = str(ej.get("ejercicio") or "").strip()
+        doc_id = doc_id_historial(correo_norm, nombre)
+        registro = registro_desde_ejercicio(ej, fecha_lunes, dia) if doc_id else None
+        if registro is None:
+            continue
+        writer.set(
+            col.document(doc_id),
+            {
+                "correo": correo_norm,
+                "ejercicio": nombre,
+                "clave": clave_ejercicio(nombre),
+                "registros": {_clave_registro(registro): registro},
+            },
+            merge=True,
+        )
+        escritos += 1
+    if propio:
+        writer.commit()
+    return escritos
+
+
+# ---------- lectura ----------
+def registros_de(data: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Registros de un documento del historial, ordenados por fecha y día."""
+    registros = [r for r in ((data or {}).get("registros") or {}).values() if isinstance(r, dict)]
+    registros.sort(key=lambda r: (str(r.get("fecha") or ""), str(r.get("dia") or "")))
+    return registros
+
+
+def mejor_registro(registros: Iterable[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Registro con mayor 1RM estimado (el más reciente si empatan)."""
+    mejor = None
+    for r in registros:
+        rm = r.get("rm_estimado")
+        if rm is not None and (mejor is None or rm >= mejor["rm_estimado"]):
+            mejor = r
+    return mejor
+
+
+def referencias(correo: str, nombres_ejercicio: Iterable[str]) -> Dict[str, Any]:
+    """`nombre -> DocumentReference` (para sumarlas a un `get_all` mayor)."""
+    col = get_db().collection(COLECCION_HISTORIAL_EJERCICIOS)
+    refs: Dict[str, Any] = {}
+    for nombre in nombres_ejercicio:
+        doc_id = doc_id_historial(correo, nombre)
+        if doc_id:
+            refs[nombre] = col.document(doc_id)
+    return refs
+
+
+def historiales(correo: str, nombres_ejercicio: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """`nombre -> registros` de varios ejercicios con un único `get_all`."""
+    nombres = list(dict.fromkeys(nombres_ejercicio))
+    refs = referencias(correo, nombres)
+    resultado: Dict[str, List[Dict[str, Any]]] = {nombre: [] for nombre in nombres}
+    if not refs:
+        return resultado
+    # Nombres que normalizan igual comparten documento.
+    por_id: Dict[str, List[str]] = {}
+    for nombre, ref in refs.items():
+        por_id.setdefault(ref.id, []).append(nombre)
+    unicos = {ref.id: ref for ref in refs.values()}
+    for snap in get_db().get_all(list(unicos.values())):
+        if snap.exists:
+            registros = registros_de(snap.to_dict())
+            for nombre in por_id.get(snap.id, ()):
+                resultado[nombre] = registros
+    return resultado
+
+
+def historial(correo: str, nombre_ejercicio: str) -> List[Dict[str, Any]]:
+    return historiales(correo, [nombre_ejercicio]).get(nombre_ejercicio, [])
@@ -0,0 +1,77 @@
+"""Mapa de identidad de documentos por run de Streamlit.
+
+Dentro de un mismo run, el primer `document(...).get()` de una ruta va a
+Firestore y los siguientes reutilizan ese snapshot; cualquier escritura a la
+ruta hecha por el cliente de `get_db()` la invalida. El mapa vive en
+`st.session_state` junto a una marca del run que lo llenó (el set
+`widget_ids_this_run` del contexto, que Streamlit recrea en cada run); si la
+marca cambió se descarta, así que nunca sirve datos de un run anterior aunque
+el punto de entrada no llame a `iniciar_run()` (appasesoria.py, páginas
+sueltas). Fuera de un run (hilos de listeners, worker de correo, scripts) no se
+usa.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+try:
+    import streamlit as st
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+except Exception:  # Permitir importar fuera de Streamlit (tests/scripts)
+    st = None  # type: ignore
+    get_script_run_ctx = None  # type: ignore
+
+CLAVE_MAPA = "_firestore_docs_run"
+
+
+def _mapa() -> Optional[Dict[str, Any]]:
+    if st is None or get_script_run_ctx is None:
+        return None
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return None
+    # Se compara por identidad y la tupla guarda la marca viva: su id no se reutiliza.
+    marca = getattr(ctx, "widget_ids_this_run", ctx)
+    try:
+        guardado = st.session_state.get(CLAVE_MAPA)
+        if not guardado or guardado[0] is not marca:
+            guardado = (marca, {})
+            st.session_state[CLAVE_MAPA] = guardado
+        return guardado[1]
+    except Exception:
+        return None
+
+
+def iniciar_run() -> None:
+    """Vacía el mapa (opcional: `_mapa()` ya lo descarta cuando cambia el run)."""
+    if st is None:
+        return
+    st.session_state[CLAVE_MAPA] = None
+
+
+def obtener(ruta: str) -> Any:
+    """Snapshot ya leído en este run para `ruta`, o None."""
+    mapa = _mapa()
+    return mapa.get(ruta) if mapa is not None else None
+
+
+def guardar(ruta: str, snap: Any) -> None:
+    mapa = _mapa()
+    if mapa is not None and ruta:
+        mapa[ruta] = snap
+
+
+def invalidar(ruta: str) -> None:
+    mapa = _mapa()
+    if mapa is not None:
+        mapa.pop(ruta, None)
+
+
+def invalidar_coleccion(coleccion: str) -> None:
+    """Descarta todos los documentos de `coleccion` (p. ej. tras una escritura masiva)."""
+    mapa = _mapa()
+    if mapa is None:
+        return
+    prefijo = f"{coleccion}/"
+    for ruta in [r for r in mapa if r.startswith(prefijo)]:
+        mapa.pop(ruta, None)
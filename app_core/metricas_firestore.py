@@ -0,0 +1,342 @@
+"""Contabilidad de lecturas/escrituras de Firestore por punto de llamada.
+
+`instrumentar(cliente)` envuelve el cliente (y todo lo que cuelga de él:
+colecciones, consultas, referencias, batches) en un proxy transparente que, por
+cada operación, registra documentos leídos y escritos, consultas y latencia,
+atribuidos al primer frame fuera de Firestore (`modulo.funcion`).
+
+Criterio de conteo (el de la factura, salvo el mínimo de 1 lectura por consulta
+vacía): `stream()`/`get()` de consulta y `get_all()` suman un doc leído por
+snapshot y una consulta; `get()` de documento suma una lectura; `set/update/
+delete/create` suman una escritura, las de un batch al hacer `commit()`; cada
+cambio entregado por `on_snapshot` cuenta como lectura. Los `get` servidos por
+`mapa_documentos` (mismo documento, mismo run) no leen y suman a `reutilizadas`.
+
+Los totales del run actual quedan en `st.session_state[CLAVE_RUN]` (los reinicia
+`iniciar_run()`); los hilos sin sesión (listeners, worker de correo) solo suman
+al acumulado del proceso (`resumen_proceso()`).
+"""
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List
+
+from app_core import mapa_documentos
+
+try:
+    import streamlit as st
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+except Exception:  # Permitir importar fuera de Streamlit (tests/scripts)
+    st = None  # type: ignore
+    get_script_run_ctx = None  # type: ignore
+
+CLAVE_RUN = "_firestore_metricas_run"
+
+_ENCADENABLES = {
+    "collection",
+    "document",
+    "where",
+    "order_by",
+    "limit",
+    "limit_to_last",
+    "select",
+    "start_at",
+    "start_after",
+    "end_at",
+    "end_before",
+    "offset",
+    "collection_group",
+    "parent",
+}
+_ESCRITURAS = {"set", "update", "delete", "create"}
+# Frames que no cuentan como punto de llamada.
+_MODULOS_INTERNOS = ("google.", "grpc", "firebase_admin", "proto.", "concurrent.", "threading")
+
+
+@dataclass
+class Evento:
+    sitio: str
+    operacion: str
+    coleccion: str
+    lecturas: int = 0
+    escrituras: int = 0
+    consultas: int = 0
+    reutilizadas: int = 0
+    segundos: float = 0.0
+
+
+def _nuevo_total() -> Dict[str, float]:
+    return {"llamadas": 0, "lecturas": 0, "escrituras": 0, "consultas": 0, "reutilizadas": 0, "ms": 0.0}
+
+
+def _sumar(destino: Dict[str, Dict[str, float]], evento: Evento) -> None:
+    for clave in (evento.sitio, "__total__"):
+        fila = destino.setdefault(clave, _nuevo_total())
+        fila["llamadas"] += 1
+        fila["lecturas"] += evento.lecturas
+        fila["escrituras"] += evento.escrituras
+        fila["consultas"] += evento.consultas
+        fila["reutilizadas"] += evento.reutilizadas
+        fila["ms"] += evento.segundos * 1000
+
+
+class _RegistroSesion:
+    """Destino por defecto: el run actual (si hay sesión) y el acumulado del proceso."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._proceso: Dict[str, Dict[str, float]] = {}
+
+    def registrar(self, evento: Evento) -> None:
+        with self._lock:
+            _sumar(self._proceso, evento)
+        if st is None or get_script_run_ctx is None or get_script_run_ctx() is None:
+            return
+        try:
+            run = st.session_state.setdefault(CLAVE_RUN, {})
+            _sumar(run, evento)
+        except Exception:
+            pass
+
+    def proceso(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {k: dict(v) for k, v in self._proceso.items()}
+
+
+_REGISTRO = _RegistroSesion()
+
+
+def _sitio() -> str:
+    frame = sys._getframe(1)
+    while frame is not None:
+        modulo = frame.f_globals.get("__name__", "")
+        if modulo != __name__ and not modulo.startswith(_MODULOS_INTERNOS):
+            return f"{modulo}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+
+def _coleccion_de(obj: Any) -> str:
+    if hasattr(obj, "document") and hasattr(obj, "where") and hasattr(obj, "id"):
+        return str(obj.id)
+    for attr in ("_parent", "parent"):
+        parent = getattr(obj, attr, None)
+        if parent is not None and hasattr(parent, "id"):
+            return str(parent.id)
+    return "?"
+
+
+def _es_documento(obj: Any) -> bool:
+    return hasattr(obj, "path") and hasattr(obj, "collection") and not hasattr(obj, "where")
+
+
+def _get_all_con_mapa(previos: List[Any], snaps):
+    yield from previos
+    for snap in snaps:
+        mapa_documentos.guardar(snap.reference.path, snap)
+        yield snap
+
+
+def _desenvolver(valor: Any) -> Any:
+    if isinstance(valor, Instrumentado):
+        return object.__getattribute__(valor, "_obj")
+    if isinstance(valor, list):
+        return [_desenvolver(v) for v in valor]
+    if isinstance(valor, tuple):
+        return tuple(_desenvolver(v) for v in valor)
+    if isinstance(valor, dict):
+        return {k: _desenvolver(v) for k, v in valor.items()}
+    return valor
+
+
+def _iterar_contando(snaps, registrar: Callable[[int, float], None]):
+    """Recorre el iterador sin materializarlo; la latencia excluye el tiempo del consumidor."""
+    n, segundos = 0, 0.0
+    it = iter(snaps)
+    try:
+        while True:
+            inicio = time.perf_counter()
+            try:
+                snap = next(it)
+            except StopIteration:
+                segundos += time.perf_counter() - inicio
+                return
+            segundos += time.perf_counter() - inicio
+            n += 1
+            yield snap
+    finally:
+        registrar(n, segundos)
+
+
+class Instrumentado:
+    """Proxy transparente sobre objetos del cliente de Firestore."""
+
+    __slots__ = ("_obj", "_registro", "_pendientes")
+
+    def __init__(self, obj: Any, registro: Any = None) -> None:
+        object.__setattr__(self, "_obj", obj)
+        object.__setattr__(self, "_registro", registro or _REGISTRO)
+        object.__setattr__(self, "_pendientes", [])
+
+    def __repr__(self) -> str:
+        return f"Instrumentado({object.__getattribute__(self, '_obj')!r})"
+
+    def __eq__(self, other: Any) -> bool:
+        return object.__getattribute__(self, "_obj") == _desenvolver(other)
+
+    def __hash__(self) -> int:
+        return hash(object.__getattribute__(self, "_obj"))
+
+    def __len__(self) -> int:
+        return len(object.__getattribute__(self, "_obj"))
+
+    def __bool__(self) -> bool:
+        # Sin esto Python prueba `__len__` y falla con objetos sin longitud (el Client).
+        return bool(object.__getattribute__(self, "_obj"))
+
+    def __getattr__(self, nombre: str) -> Any:
+        obj = object.__getattribute__(self, "_obj")
+        attr = getattr(obj, nombre)
+        if nombre in _ENCADENABLES and not callable(attr):
+            return Instrumentado(attr, object.__getattribute__(self, "_registro"))
+        if not callable(attr):
+            return attr
+
+        def llamada(*args: Any, **kwargs: Any) -> Any:
+            return self._llamar(nombre, attr, _desenvolver(args), _desenvolver(kwargs))
+
+        return llamada
+
+    def _llamar(self, nombre: str, attr: Callable, args, kwargs) -> Any:
+        obj = object.__getattribute__(self, "_obj")
+        registro = object.__getattribute__(self, "_registro")
+
+        if nombre in _ENCADENABLES or nombre == "batch":
+            return Instrumentado(attr(*args, **kwargs), registro)
+
+        sitio = _sitio()
+        coleccion = _coleccion_de(obj)
+
+        def emitir(**valores: Any) -> None:
+            registro.registrar(Evento(sitio, nombre, valores.pop("coleccion", coleccion), **valores))
+
+        if nombre == "on_snapshot" and args:
+            callback = args[0]
+
+            def contar_entrega(docs, cambios, read_time):
+                emitir(lecturas=len(cambios))
+                return callback(docs, cambios, read_time)
+
+            args = (contar_entrega,) + tuple(args[1:])
+            return attr(*args, **kwargs)
+
+        es_batch = hasattr(obj, "commit")
+        if es_batch and nombre in _ESCRITURAS:
+            ref = args[0] if args else kwargs.get("reference")
+            ruta = getattr(ref, "path", "")
+            mapa_documentos.invalidar(ruta)
+            object.__getattribute__(self, "_pendientes").append((_coleccion_de(ref), ruta))
+            return attr(*args, **kwargs)
+
+        es_documento = _es_documento(obj)
+        if es_documento and nombre in _ESCRITURAS:
+            mapa_documentos.invalidar(obj.path)
+        # Solo los `get` completos y fuera de transacción pasan por el mapa del run.
+        usa_mapa = not args and not kwargs
+        if es_documento and nombre == "get" and usa_mapa:
+            previo = mapa_documentos.obtener(obj.path)
+            if previo is not None:
+                emitir(reutilizadas=1)
+                return previo
+
+        previos: List[Any] = []
+        if nombre == "get_all":
+            # Acepta generadores de referencias envueltas: se materializan y desenvuelven.
+            refs = [_desenvolver(r) for r in (args[0] if args else kwargs.pop("references", []))]
+            usa_mapa = not args[1:] and not kwargs
+            if refs:
+                coleccion = _coleccion_de(refs[0])
+            if usa_mapa:
+                faltantes = []
+                for ref in refs:
+                    previo = mapa_documentos.obtener(ref.path)
+                    if previo is None:
+                        faltantes.append(ref)
+                    else:
+                        previos.append(previo)
+                refs = faltantes
+                if previos and not refs:
+                    emitir(coleccion=coleccion, reutilizadas=len(previos))
+                    return iter(previos)
+            args = (refs,) + tuple(args[1:])
+
+        inicio = time.perf_counter()
+        resultado = attr(*args, **kwargs)
+        segundos = time.perf_counter() - inicio
+
+        if nombre == "stream":
+            return _iterar_contando(
+                resultado,
+                lambda n, s: emitir(lecturas=n, consultas=1, segundos=segundos + s),
+            )
+        if nombre == "get_all":
+            contados = _iterar_contando(
+                resultado,
+                lambda n, s: emitir(
+                    coleccion=coleccion, lecturas=n, consultas=1, reutilizadas=len(previos), segundos=segundos + s
+                ),
+            )
+            return _get_all_con_mapa(previos, contados) if usa_mapa else contados
+        if nombre == "get":
+            if isinstance(resultado, list):
+                emitir(lecturas=len(resultado), consultas=1, segundos=segundos)
+            else:
+                emitir(lecturas=1, segundos=segundos)
+                if es_documento and usa_mapa:
+                    mapa_documentos.guardar(obj.path, resultado)
+        elif nombre in _ESCRITURAS or nombre == "add":
+            emitir(escrituras=1, segundos=segundos)
+        elif nombre == "commit":
+            pendientes: List[tuple] = object.__getattribute__(self, "_pendientes")
+            # Un `get` entre el `set` y el `commit` habría vuelto a guardar la versión vieja.
+            for _, ruta in pendientes:
+                mapa_documentos.invalidar(ruta)
+            colecciones = "+".join(sorted({col for col, _ in pendientes})) or "?"
+            emitir(coleccion=colecciones, escrituras=len(pendientes), segundos=segundos)
+            pendientes.clear()
+        return resultado
+
+
+def instrumentar(cliente: Any, registro: Any = None) -> Any:
+    """Envuelve `cliente`. `registro` recibe cada `Evento` (por defecto, sesión + proceso)."""
+    if isinstance(cliente, Instrumentado):
+        return cliente
+    return Instrumentado(cliente, registro)
+
+
+def iniciar_run() -> None:
+    """Reinicia los totales del run; se llama al comienzo de cada ejecución del script."""
+    if st is None:
+        return
+    st.session_state[CLAVE_RUN] = {}
+
+
+def resumen_run() -> Dict[str, Dict[str, float]]:
+    """`sitio -> totales` del run actual; `__total__` lleva la suma."""
+    if st is None:
+        return {}
+    return dict(st.session_state.get(CLAVE_RUN) or {})
+
+
+def resumen_proceso() -> Dict[str, Dict[str, float]]:
+    """`sitio -> totales` acumulados en el proceso desde que arrancó (todas las sesiones)."""
+    return _REGISTRO.proceso()
+
+
+def top_sitios(totales: Dict[str, Dict[str, float]], n: int = 15, criterio: str = "lecturas") -> List[Dict[str, Any]]:
+    filas = [{"sitio": sitio, **valores} for sitio, valores in totales.items() if sitio != "__total__"]
+    filas.sort(key=lambda f: (f.get(criterio, 0), f.get("ms", 0)), reverse=True)
+    return filas[:n]
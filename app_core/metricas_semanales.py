@@ -0,0 +1,339 @@
+"""Métricas semanales materializadas: `metricas_semanales/<doc_id de la rutina>`.
+
+Un documento chico por semana de `rutinas_semanales` con, por día: series,
+volumen (series × reps mínimas) y tonelaje (volumen × peso) por categoría
+(Fuerza / Hipertrofia / Accesorio), la parte de Warm Up aparte, si el día está
+finalizado y su RPE; más los totales de la semana (plan = todos los días,
+real = días finalizados, ambos sin Warm Up). Se reescribe cada vez que la
+semana se guarda, edita o reporta, así que los paneles leen estos documentos en
+vez de recorrer las rutinas completas.
+
+Los clientes cuyo histórico ya está materializado llevan
+`ultima_rutina/<correo>.metricas_completas = True`; para el resto,
+`metricas_en_rango` lo materializa la primera vez.
+"""
+from __future__ import annotations
+
+import re
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from app_core.data_access import COLECCION_ULTIMA_RUTINA, docs_de_cliente
+from app_core.firebase_client import get_db
+from app_core.utils import correo_a_doc_id, normalizar_correo
+
+COLECCION_METRICAS_SEMANALES = "metricas_semanales"
+CATEGORIAS = ("Fuerza", "Hipertrofia", "Accesorio")
+CAMPO_COMPLETAS = "metricas_completas"
+
+
+# ---------- lectura de rutinas ----------
+def parse_reps_min(value) -> int | None:
+    """Extrae el mínimo de repeticiones desde formatos típicos."""
+    if value is None: return None
+    if isinstance(value, (int, float)):
+        try: return int(value)
+        except Exception: return None
+    if isinstance(value, dict):
+        for k in ("min","reps_min","rep_min","rmin"):
+            if k in value:
+                try: return int(value[k])
+                except Exception: pass
+        if "reps" in value:
+            return parse_reps_min(value["reps"])
+    s = str(value).strip().lower()
+    m = re.match(r"^\s*(\d+)\s*[x×]\s*\d+", s)
+    if m: return int(m.group(1))
+    m = re.match(r"^\s*(\d+)\s*[-–—]\s*(\d+)", s)
+    if m: return int(m.group(1))
+    m = re.match(r"^\s*(\d+)\s*$", s)
+    if m: return int(m.group(1))
+    return None
+
+
+def _entero(x) -> int:
+    try: return int(float(x))
+    except Exception: return 0
+
+
+def _decimal(x) -> float:
+    try: return float(x)
+    except Exception: return 0.0
+
+
+def categoria_por_reps(reps_min: int) -> str:
+    # reps 0 (sin dato) cuenta como Fuerza, igual que en el seguimiento.
+    if reps_min < 6:
+        return "Fuerza"
+    if reps_min < 12:
+        return "Hipertrofia"
+    return "Accesorio"
+
+
+def es_warmup(ejercicio: dict) -> bool:
+    bloque = str(ejercicio.get("bloque", ejercicio.get("seccion", ""))).strip().lower()
+    return bloque.replace("-", " ").replace("_", " ") == "warm up"
+
+
+def dia_finalizado(doc_dict: dict, dia_key: str) -> bool:
+    """
+    Día finalizado según la app:
+      - doc["rutina"][f"{dia}_finalizado"] == True
+    (Se mantiene compatibilidad con mapas alternativos si existieran).
+    """
+    dia_key = str(dia_key)
+    rutina = doc_dict.get("rutina") or {}
+    flag_key = f"{dia_key}_finalizado"
+    if isinstance(rutina, dict) and flag_key in rutina:
+        return bool(rutina.get(flag_key) is True)
+
+    fin_map = doc_dict.get("finalizados")
+    if isinstance(fin_map, dict):
+        val = fin_map.get(dia_key)
+        if isinstance(val, bool):
+            return val
+
+    estado_map = doc_dict.get("estado_por_dia")
+    if isinstance(estado_map, dict):
+        val = str(estado_map.get(dia_key, "")).strip().lower()
+        if val in ("fin","final","finalizado","completado","done"):
+            return True
+
+    alt = doc_dict.get(f"dia_{dia_key}")
+    if isinstance(alt, dict) and "finalizado" in alt:
+        return bool(alt.get("finalizado"))
+
+    return False
+
+
+def obtener_lista_ejercicios(data_dia):
+    """
+    Normaliza el contenido del día a lista de ejercicios (dicts):
+      - lista directa de dicts
+      - dict con subclave 'ejercicios' (list/dict)
+      - dict con claves numéricas "1","2",...
+    """
+    if data_dia is None: return []
+    # Lista
+    if isinstance(data_dia, list):
+        if len(data_dia) == 1 and isinstance(data_dia[0], dict) and "ejercicios" in data_dia[0]:
+            return obtener_lista_ejercicios(data_dia[0]["ejercicios"])
+        return [e for e in data_dia if isinstance(e, dict)]
+    # Dict
+    if isinstance(data_dia, dict):
+        if "ejercicios" in data_dia:
+            ej = data_dia["ejercicios"]
+            if isinstance(ej, list):
+                return [e for e in ej if isinstance(e, dict)]
+            if isinstance(ej, dict):
+                try:
+                    pares = sorted(ej.items(), key=lambda kv: int(kv[0]))
+                    return [v for _, v in pares if isinstance(v, dict)]
+                except Exception:
+                    return [v for v in ej.values() if isinstance(v, dict)]
+            return []
+        claves_numericas = [k for k in data_dia.keys() if str(k).isdigit()]
+        if claves_numericas:
+            try:
+                pares = sorted(((k, data_dia[k]) for k in claves_numericas), key=lambda kv: int(kv[0]))
+                return [v for _, v in pares if isinstance(v, dict)]
+            except Exception:
+                return [data_dia[k] for k in data_dia if isinstance(data_dia[k], dict)]
+        return [v for v in data_dia.values() if isinstance(v, dict)]
+    return []
+
+
+def iter_dias_rutina(doc_dict: dict):
+    """
+    Itera días desde doc['rutina'] (dict) y devuelve (dia_key, lista_ejercicios_del_dia).
+    Detecta días por claves numéricas "1","2",... y normaliza el día con obtener_lista_ejercicios().
+    """
+    r = doc_dict.get("rutina")
+    if not isinstance(r, dict):
+        return
+    dia_keys = [k for k in r.keys() if str(k).isdigit()]
+    dia_keys.sort(key=lambda x: int(x))
+    for dia_key in dia_keys:
+        yield str(dia_key), obtener_lista_ejercicios(r.get(dia_key))
+
+
+def fecha_semana(doc_id: str, data: dict) -> date | None:
+    v = data.get("fecha_lunes") or data.get("semana_inicio") or data.get("fecha")
+    if isinstance(v, str):
+        try: return datetime.fromisoformat(v).date()
+        except Exception: pass
+    # Fallback por ID *_YYYY_MM_DD
+    try:
+        tail = "_".join(doc_id.split("_")[-3:])
+        return datetime.strptime(tail, "%Y_%m_%d").date()
+    except Exception:
+        return None
+
+
+# ---------- cálculo ----------
+def _por_categoria() -> Dict[str, Dict[str, Any]]:
+    return {cat: {"ejercicios": 0, "series": 0, "volumen": 0, "tonelaje": 0.0} for cat in CATEGORIAS}
+
+
+def _sumar(destino: Dict[str, Any], origen: Dict[str, Any], signo: int = 1) -> None:
+    for campo in ("series", "volumen", "tonelaje"):
+        destino[campo] += signo * origen[campo]
+
+
+def metricas_dia(ejercicios: Iterable[dict]) -> Dict[str, Any]:
+    """`total` y `warmup` por categoría para la lista de ejercicios de un día."""
+    total = _por_categoria()
+    warmup = _por_categoria()
+    for ej in ejercicios:
+        reps_min = _entero(parse_reps_min(ej.get("reps_min", ej.get("reps"))) or 0)
+        series = _entero(ej.get("series", 0))
+        volumen = series * reps_min
+        fila = {"series": series, "volumen": volumen, "tonelaje": volumen * _decimal(ej.get("peso", 0))}
+        cat = categoria_por_reps(reps_min)
+        destinos = (total[cat], warmup[cat]) if es_warmup(ej) else (total[cat],)
+        for destino in destinos:
+            destino["ejercicios"] += 1
+            _sumar(destino, fila)
+    return {"total": total, "warmup": warmup}
+
+
+def calcular_metricas(doc_id: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Documento de `metricas_semanales` para la semana `doc_id`, o None si no tiene fecha."""
+    lunes = fecha_semana(doc_id, data)
+    if lunes is None:
+        return None
+    rutina = data.get("rutina") if isinstance(data.get("rutina"), dict) else {}
+    plan = {"series": 0, "volumen": 0, "tonelaje": 0.0}
+    real = {"series": 0, "volumen": 0, "tonelaje": 0.0}
+    dias: Dict[str, Any] = {}
+    rpes: List[float] = []
+    for dia_key, lista in iter_dias_rutina(data):
+        dia = metricas_dia(lista)
+        dia["finalizado"] = dia_finalizado(data, dia_key)
+        rpe = _decimal(rutina.get(f"{dia_key}_rpe"))
+        dia["rpe"] = rpe if rpe > 0 else None
+        for cat in CATEGORIAS:
+            sin_warmup = dict(dia["total"][cat])
+            _sumar(sin_warmup, dia["warmup"][cat], -1)
+            _sumar(plan, sin_warmup)
+            if dia["finalizado"]:
+                _sumar(real, sin_warmup)
+        if dia["finalizado"] and dia["rpe"] is not None:
+            rpes.append(dia["rpe"])
+        dias[dia_key] = dia
+
+    return {
+        "correo": normalizar_correo(data.get("correo", "")),
+        "cliente": data.get("cliente") or "",
+        "entrenador": normalizar_correo(data.get("entrenador", "")),
+        "bloque_rutina": data.get("bloque_rutina") or "",
+        "fecha_lunes": lunes.isoformat(),
+        "rutina_id": doc_id,
+        "dias": dias,
+        "plan": plan,
+        "real": real,
+        "dias_planificados": len(dias),
+        "dias_completados": sum(1 for d in dias.values() if d["finalizado"]),
+        "rpe_promedio": round(sum(rpes) / len(rpes), 2) if rpes else None,
+    }
+
+
+# ---------- escritura ----------
+def registrar_metricas_semanas(semanas: Dict[str, Dict[str, Any]], writer=None) -> int:
+    """Reescribe las métricas de `semanas` (`doc_id -> datos` de `rutinas_semanales`).
+
+    Con un `BatchWriter` las escrituras se suman a su lote (atómicas con la
+    rutina); si no, se confirman aquí. Devuelve cuántas métricas se escribieron.
+    """
+    db = get_db()
+    col = db.collection(COLECCION_METRICAS_SEMANALES)
+    propio = writer is None
+    if propio:
+        from .batch_writer import BatchWriter
+
+        writer = BatchWriter(db)
+    escritas = 0
+    for doc_id, data in semanas.items():
+        metricas = calcular_metricas(doc_id, data or {}) if doc_id else None
+        if metricas is None:
+            continue
+        writer.set(col.document(doc_id), metricas)
+        escritas += 1
+    if propio:
+        writer.commit()
+    return escritas
+
+
+def recalcular_metricas_semana(doc_id: str) -> Optional[Dict[str, Any]]:
+    """Relee la semana y reescribe sus métricas (tras escrituras parciales, p. ej. finalizar un día)."""
+    db = get_db()
+    snap = db.collection("rutinas_semanales").document(doc_id).get()
+    ref = db.collection(COLECCION_METRICAS_SEMANALES).document(doc_id)
+    if not snap.exists:
+        ref.delete()
+        return None
+    metricas = calcular_metricas(doc_id, snap.to_dict() or {})
+    if metricas is not None:
+        ref.set(metricas)
+    return metricas
+
+
+def borrar_metricas_semanas(doc_ids: Iterable[str]) -> int:
+    from .batch_writer import BatchWriter
+
+    db = get_db()
+    col = db.collection(COLECCION_METRICAS_SEMANALES)
+    writer = BatchWriter(db)
+    for doc_id in dict.fromkeys(doc_ids):
+        if doc_id:
+            writer.delete(col.document(doc_id))
+    return writer.commit()
+
+
+def materializar_cliente(correo: str) -> List[Dict[str, Any]]:
+    """Calcula y guarda las métricas de todo el histórico del cliente y lo marca como completo."""
+    correo_norm = normalizar_correo(correo)
+    if not correo_norm:
+        return []
+    from .batch_writer import BatchWriter
+
+    db = get_db()
+    col = db.collection(COLECCION_METRICAS_SEMANALES)
+    writer = BatchWriter(db)
+    resultado: List[Dict[str, Any]] = []
+    for doc_id, data in docs_de_cliente("rutinas_semanales", correo_norm).items():
+        metricas = calcular_metricas(doc_id, data)
+        if metricas is None:
+            continue
+        writer.set(col.document(doc_id), metricas)
+        resultado.append(metricas)
+    marca = db.collection(COLECCION_ULTIMA_RUTINA).document(correo_a_doc_id(correo_norm))
+    writer.set(marca, {CAMPO_COMPLETAS: True}, merge=True)
+    writer.commit()
+    return resultado
+
+
+# ---------- lectura ----------
+def metricas_en_rango(correo: str, desde: date, hasta: date) -> List[Dict[str, Any]]:
+    """Métricas de las semanas del cliente con algún día en [desde, hasta], ordenadas por fecha."""
+    correo_norm = normalizar_correo(correo)
+    if not correo_norm:
+        return []
+    inicio = (desde - timedelta(days=6)).isoformat()
+    fin = hasta.isoformat()
+
+    db = get_db()
+    marca = db.collection(COLECCION_ULTIMA_RUTINA).document(correo_a_doc_id(correo_norm)).get()
+    if not (marca.exists and (marca.to_dict() or {}).get(CAMPO_COMPLETAS) is True):
+        semanas = materializar_cliente(correo_norm)
+    else:
+        base = db.collection(COLECCION_METRICAS_SEMANALES).where("correo", "==", correo_norm)
+        try:
+            q = base.where("fecha_lunes", ">=", inicio).where("fecha_lunes", "<=", fin)
+            semanas = [snap.to_dict() or {} for snap in q.stream()]
+        except Exception:
+            # Sin índice compuesto (correo + fecha_lunes): se filtra en memoria.
+            semanas = [snap.to_dict() or {} for snap in base.stream()]
+    semanas = [m for m in semanas if inicio <= str(m.get("fecha_lunes") or "") <= fin]
+    semanas.sort(key=lambda m: m["fecha_lunes"])
+    return semanas
@@ -0,0 +1,145 @@
+"""Snapshot compartido (por proceso) de una colección de Firestore.
+
+Se descarga una sola vez por proceso y se mantiene al día con un listener
+`on_snapshot` que aplica solo los cambios (alta/modificación/baja). Vive fuera
+de `st.cache_data`, así que un `st.cache_data.clear()` no obliga a
+re-descargarlo. Lo usan `catalogo_service` (ejercicios) y `users_service`
+(usuarios).
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict
+
+from app_core.firebase_client import get_db
+
+ESPERA_INICIAL_S = 20.0
+REINTENTO_S = 60.0
+MAX_VISTAS = 64
+
+
+class SnapshotColeccion:
+    """Mapa `doc_id -> datos` inmutable por versión (copy-on-write)."""
+
+    def __init__(self, coleccion: str) -> None:
+        self._coleccion = coleccion
+        self._lock = threading.RLock()
+        self._listo = threading.Event()
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._version = 0
+        self._watch = None
+        self._primera_entrega = True
+        self._ultimo_intento = float("-inf")
+        self._vistas: Dict[tuple, Any] = {}
+
+    # ---------- ciclo de vida ----------
+    def _listener_activo(self) -> bool:
+        watch = self._watch
+        if watch is None:
+            return False
+        return bool(getattr(watch, "is_active", True))
+
+    def asegurar(self) -> bool:
+        """Arranca (o re-arranca) el listener. Devuelve True si hay snapshot utilizable."""
+        if self._listo.is_set() and self._listener_activo():
+            return True
+        with self._lock:
+            ahora = time.monotonic()
+            if not self._listener_activo() and ahora - self._ultimo_intento >= REINTENTO_S:
+                self._ultimo_intento = ahora
+                self._detener()
+                self._primera_entrega = True
+                try:
+                    col = get_db().collection(self._coleccion)
+                    self._watch = col.on_snapshot(self._on_snapshot)
+                except Exception:
+                    self._watch = None
+            espera = ESPERA_INICIAL_S if self._watch is not None else 0
+        if self._listo.wait(espera):
+            return True
+        # Sin listener: una carga puntual mantiene la página funcionando.
+        return self._carga_completa()
+
+    def _detener(self) -> None:
+        watch, self._watch = self._watch, None
+        if watch is not None:
+            try:
+                watch.unsubscribe()
+            except Exception:
+                pass
+
+    def _carga_completa(self) -> bool:
+        try:
+            docs = {
+                snap.id: snap.to_dict() or {}
+                for snap in get_db().collection(self._coleccion).stream()
+                if snap.exists
+            }
+        except Exception:
+            return self._listo.is_set()
+        self._publicar(docs)
+        return True
+
+    def _on_snapshot(self, _col_snapshot, cambios, _read_time) -> None:
+        with self._lock:
+            # La primera entrega de cada suscripción trae la colección completa.
+            docs = {} if self._primera_entrega else dict(self._docs)
+            self._primera_entrega = False
+            for cambio in cambios:
+                snap = cambio.document
+                tipo = getattr(cambio.type, "name", str(cambio.type))
+                if tipo == "REMOVED":
+                    docs.pop(snap.id, None)
+                else:
+                    docs[snap.id] = snap.to_dict() or {}
+            self._publicar(docs)
+
+    def _publicar(self, docs: Dict[str, Dict[str, Any]]) -> None:
+        with self._lock:
+            self._docs = docs
+            self._version += 1
+            self._vistas.clear()
+            self._listo.set()
+
+    # ---------- lectura ----------
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def docs(self) -> Dict[str, Dict[str, Any]]:
+        return self._docs
+
+    def vista(self, clave: tuple, construir) -> Any:
+        """Resultado de `construir(docs)` memorizado por versión del snapshot y `clave`."""
+        with self._lock:
+            cache_key = (self._version,) + clave
+            resultado = self._vistas.get(cache_key)
+            docs = self._docs
+        if resultado is not None:
+            return resultado
+        resultado = construir(docs)
+        with self._lock:
+            if len(self._vistas) >= MAX_VISTAS:
+                self._vistas.clear()
+            self._vistas[cache_key] = resultado
+        return resultado
+
+    # ---------- escrituras locales (optimistas) ----------
+    def aplicar_local(self, doc_id: str, cambios: Dict[str, Any], merge: bool = True) -> None:
+        with self._lock:
+            if not self._listo.is_set():
+                return
+            docs = dict(self._docs)
+            base = dict(docs.get(doc_id) or {}) if merge else {}
+            base.update(cambios or {})
+            docs[doc_id] = base
+            self._publicar(docs)
+
+    def eliminar_local(self, doc_id: str) -> None:
+        with self._lock:
+            if not self._listo.is_set() or doc_id not in self._docs:
+                return
+            docs = dict(self._docs)
+            docs.pop(doc_id, None)
+            self._publicar(docs)
@@ -72,6 +72,14 @@ def _get_bucket():
     return storage.bucket()
 
 
+def upload_bytes(data: bytes, path: str, *, content_type: Optional[str] = None):
+    """Sube bytes al bucket en `path` (ruta completa) y devuelve el blob."""
+    bucket = _get_bucket()
+    blob = bucket.blob(path)
+    blob.upload_from_string(data, content_type=content_type)
+    return blob
+
+
 def upload_bytes_get_url(
     data: bytes,
     path: str,
@@ -84,12 +92,21 @@ def upload_bytes_get_url(
     - path: ruta completa dentro del bucket (ej: reportes_videos/...)
     - signed_ttl_days: vigencia de la URL; el archivo permanece hasta que se borre (p. ej. regla lifecycle).
     """
-    bucket = _get_bucket()
-    blob = bucket.blob(path)
-    blob.upload_from_string(data, content_type=content_type)
+    blob = upload_bytes(data, path, content_type=content_type)
     return blob.generate_signed_url(datetime.timedelta(days=signed_ttl_days))
 
 
+def download_bytes_safe(path: str) -> Optional[bytes]:
+    """Bytes del blob indicado, o None si no existe o no se pudo leer."""
+    try:
+        blob = _get_bucket().blob(path)
+        if not blob.exists():
+            return None
+        return blob.download_as_bytes()
+    except Exception:
+        return None
+
+
 def delete_blob_safe(path: str) -> bool:
     """Borra el blob indicado; ignora si no existe."""
     try:
@@ -0,0 +1,162 @@
+"""Render de las tarjetas PNG de resumen de sesión fuera del hilo de la página.
+
+Las tarjetas (`vista_rutinas.generar_tarjeta_resumen_sesion`,
+`resumen_strava.generar_tarjeta_resumen`) se dibujan sobre una `Figure` con el
+backend Agg, sin `pyplot` (no hay estado global compartido entre hilos), en un
+pool de hilos del proceso. El PNG se memoriza por hash del contenido y, con
+`persistir=True`, también se guarda en Storage (`tarjetas_resumen/<hash>.png`),
+así cada tarjeta se genera una sola vez aunque el proceso se reinicie. Persistir
+solo cuando el usuario genera la tarjeta (llevan su nombre); la carpeta debe
+tener una regla lifecycle en el bucket para que se borren solas.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+MAX_TARJETAS = 128
+CARPETA_STORAGE = "tarjetas_resumen"
+TAMANO = (6, 8)
+DPI = 200
+
+Dibujo = Callable[[Figure, Any], None]
+
+_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tarjetas-resumen")
+_PNGS: "OrderedDict[str, bytes]" = OrderedDict()
+_PENDIENTES: Dict[str, Tuple[Future, bool]] = {}
+_EN_STORAGE: set = set()
+_LOCK = threading.Lock()
+
+
+def clave_tarjeta(tipo: str, contenido: Any) -> str:
+    """Hash estable de `(tipo, contenido)`; el contenido debe ser serializable a JSON."""
+    crudo = json.dumps([tipo, contenido], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(crudo.encode("utf-8")).hexdigest()
+
+
+def nueva_figura() -> Tuple[Figure, Any]:
+    """Figura Agg del tamaño de las tarjetas con un eje a página completa y sin marcos."""
+    fig = Figure(figsize=TAMANO, dpi=DPI)
+    FigureCanvasAgg(fig)
+    # Eje fijo a toda la figura: no hace falta `tight_layout` en cada render.
+    ax = fig.add_axes((0, 0, 1, 1))
+    ax.axis("off")
+    return fig, ax
+
+
+def figura_a_png(fig: Figure) -> bytes:
+    buf = BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight")
+    return buf.getvalue()
+
+
+def _ruta_storage(clave: str) -> str:
+    return f"{CARPETA_STORAGE}/{clave}.png"
+
+
+def _leer_storage(clave: str) -> Optional[bytes]:
+    try:
+        from app_core import storage_client
+
+        return storage_client.download_bytes_safe(_ruta_storage(clave))
+    except Exception:
+        return None
+
+
+def _guardar_storage(clave: str, png: bytes) -> None:
+    try:
+        from app_core import storage_client
+
+        storage_client.upload_bytes(png, _ruta_storage(clave), content_type="image/png")
+    except Exception:
+        with _LOCK:
+            _EN_STORAGE.discard(clave)
+
+
+def _renderizar(clave: str, dibujar: Dibujo, persistir: bool) -> bytes:
+    try:
+        png = _leer_storage(clave) if persistir else None
+        if png is None:
+            fig, ax = nueva_figura()
+            dibujar(fig, ax)
+            png = figura_a_png(fig)
+            if persistir:
+                with _LOCK:
+                    _EN_STORAGE.add(clave)
+                _guardar_storage(clave, png)
+        elif persistir:
+            with _LOCK:
+                _EN_STORAGE.add(clave)
+        with _LOCK:
+            _PNGS[clave] = png
+            while len(_PNGS) > MAX_TARJETAS:
+                _PNGS.popitem(last=False)
+        return png
+    finally:
+        with _LOCK:
+            _PENDIENTES.pop(clave, None)
+
+
+def solicitar(tipo: str, contenido: Any, dibujar: Dibujo, persistir: bool = False) -> Future:
+    """Encola el render de la tarjeta y devuelve un `Future` con los bytes PNG.
+
+    Si la tarjeta ya está memorizada el `Future` vuelve resuelto (y, con
+    `persistir`, se sube en segundo plano si aún no está en Storage); si otra
+    sesión ya la está dibujando, se comparte ese mismo `Future` (y, con
+    `persistir`, se sube al terminar si ese render no la iba a subir). `dibujar(fig, ax)`
+    solo se llama cuando hace falta generarla.
+    """
+    clave = clave_tarjeta(tipo, contenido)
+    with _LOCK:
+        png = _PNGS.get(clave)
+        if png is not None:
+            _PNGS.move_to_end(clave)
+            if persistir and clave not in _EN_STORAGE:
+                _EN_STORAGE.add(clave)
+                _POOL.submit(_guardar_storage, clave, png)
+            listo: Future = Future()
+            listo.set_result(png)
+            return listo
+        pendiente = _PENDIENTES.get(clave)
+        if pendiente is None:
+            futuro = _POOL.submit(_renderizar, clave, dibujar, persistir)
+            _PENDIENTES[clave] = (futuro, persistir)
+            return futuro
+        futuro, persiste = pendiente
+        subir = persistir and not persiste
+        if subir:
+            _PENDIENTES[clave] = (futuro, True)
+    if subir:
+        # El render en curso no sube la tarjeta: se sube cuando termine (fuera del
+        # lock: si ya terminó, el callback corre en este mismo hilo).
+        futuro.add_done_callback(lambda f: _subir_al_terminar(clave, f))
+    return futuro
+
+
+def _subir_al_terminar(clave: str, futuro: Future) -> None:
+    if futuro.cancelled() or futuro.exception() is not None:
+        return
+    with _LOCK:
+        if clave in _EN_STORAGE:
+            return
+        _EN_STORAGE.add(clave)
+    _POOL.submit(_guardar_storage, clave, futuro.result())
+
+
+def tarjeta_png(
+    tipo: str,
+    contenido: Any,
+    dibujar: Dibujo,
+    persistir: bool = False,
+    timeout: Optional[float] = None,
+) -> bytes:
+    """Bytes PNG de la tarjeta (espera el render si todavía no terminó)."""
+    return solicitar(tipo, contenido, dibujar, persistir=persistir).result(timeout=timeout)
@@ -1,46 +1,157 @@
-"""Utilities para acceder a la colección de usuarios sin repetir queries pesadas."""
+"""Directorio de usuarios compartido por todas las sesiones del proceso.
+
+La colección `usuarios` se descarga una vez por proceso y la mantiene al día un
+listener (`app_core.snapshot_coleccion`); sobre cada versión se construyen, una
+sola vez, índices por correo/doc_id, rol, empresa, coach responsable y estado
+activo. Las páginas consultan estos índices en vez de recorrer la colección.
+Todo lo que devuelve este módulo es de solo lectura: no mutar los payloads.
+"""
 from __future__ import annotations
 
-from typing import Dict, List
+from typing import Any, Dict, List, Optional
+
+from app_core.snapshot_coleccion import SnapshotColeccion
+from app_core.utils import activo_desde_datos, correo_a_doc_id, empresa_desde_datos, normalizar_correo
+
+_COLECCION = "usuarios"
+
+
+class _DirectorioUsuarios(SnapshotColeccion):
+    def __init__(self) -> None:
+        super().__init__(_COLECCION)
 
-from app_core.cache import cache_data
-from app_core.firebase_client import get_db
-from app_core.utils import normalizar_correo, correo_a_doc_id
 
+_DIRECTORIO = _DirectorioUsuarios()
 
-@cache_data("usuarios", show_spinner=False, ttl=300, max_entries=8)
-def _fetch_all_users() -> List[dict]:
-    """Obtiene todos los usuarios una sola vez y cachea el resultado."""
 
-    db = get_db()
-    usuarios: List[dict] = []
-    for snap in db.collection("usuarios").stream():
-        if not snap.exists:
-            continue
-        data = snap.to_dict() or {}
-        data.setdefault("_id", snap.id)
-        correo_norm = normalizar_correo(data.get("correo", ""))
+def _rol_de(data: Dict[str, Any]) -> str:
+    return str(data.get("rol") or data.get("role") or "").strip().lower()
+
+
+def _construir_indices(docs: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    lista: List[dict] = []
+    por_clave: Dict[str, dict] = {}
+    por_id: Dict[str, dict] = {}
+    por_rol: Dict[str, List[dict]] = {}
+    por_empresa: Dict[str, List[dict]] = {}
+    por_coach: Dict[str, List[dict]] = {}
+    activos: List[dict] = []
+
+    for doc_id, data in docs.items():
+        user = dict(data)
+        user.setdefault("_id", doc_id)
+        correo_norm = normalizar_correo(user.get("correo", ""))
+        if correo_norm:
+            user["_correo_norm"] = correo_norm
+        lista.append(user)
+        por_id[doc_id] = user
+        por_clave[normalizar_correo(doc_id)] = user
         if correo_norm:
-            data["_correo_norm"] = correo_norm
-        usuarios.append(data)
-    return usuarios
+            por_clave[correo_norm] = user
+            por_clave.setdefault(correo_a_doc_id(correo_norm), user)
+
+        por_rol.setdefault(_rol_de(user), []).append(user)
+        por_empresa.setdefault(empresa_desde_datos(correo_norm, user), []).append(user)
+        coach = normalizar_correo(user.get("coach_responsable", ""))
+        if coach:
+            por_coach.setdefault(coach, []).append(user)
+        if activo_desde_datos(user, default_if_missing=True):
+            activos.append(user)
+
+    return {
+        "lista": lista,
+        "por_clave": por_clave,
+        "por_id": por_id,
+        "por_rol": por_rol,
+        "por_empresa": por_empresa,
+        "por_coach": por_coach,
+        "activos": activos,
+    }
+
+
+def _indices() -> Optional[Dict[str, Any]]:
+    if not _DIRECTORIO.asegurar():
+        return None
+    return _DIRECTORIO.vista(("indices",), _construir_indices)
+
+
+def disponible() -> bool:
+    """True si el directorio está cargado (listener activo o carga puntual)."""
+    return _DIRECTORIO.asegurar()
+
+
+def version() -> int:
+    """Versión del directorio; cambia con cada diff aplicado (útil como clave de cache)."""
+    _DIRECTORIO.asegurar()
+    return _DIRECTORIO.version
+
+
+def usuario(correo_o_id: str) -> Optional[dict]:
+    """Payload del usuario por correo o doc_id, o None si no existe."""
+    clave = normalizar_correo(correo_o_id)
+    indices = _indices()
+    if not clave or indices is None:
+        return None
+    return indices["por_clave"].get(clave)
+
+
+def usuarios_por_id() -> Dict[str, dict]:
+    """`doc_id -> payload` (con `_id` y `_correo_norm`)."""
+    indices = _indices()
+    return indices["por_id"] if indices else {}
+
+
+def por_rol(*roles: str) -> List[dict]:
+    """Usuarios cuyo `rol`/`role` (en minúsculas) está en `roles`."""
+    indices = _indices()
+    if indices is None:
+        return []
+    resultado: List[dict] = []
+    for rol in dict.fromkeys(r.strip().lower() for r in roles):
+        resultado.extend(indices["por_rol"].get(rol, ()))
+    return resultado
+
+
+def por_empresa(empresa: str) -> List[dict]:
+    """Usuarios de `empresa` según `utils.empresa_desde_datos`."""
+    indices = _indices()
+    if indices is None:
+        return []
+    return list(indices["por_empresa"].get((empresa or "").strip().lower(), ()))
+
+
+def por_coach(correo_coach: str) -> List[dict]:
+    """Usuarios cuyo `coach_responsable` es `correo_coach`."""
+    indices = _indices()
+    if indices is None:
+        return []
+    return list(indices["por_coach"].get(normalizar_correo(correo_coach), ()))
+
+
+def activos() -> List[dict]:
+    """Usuarios activos (sin flag `activo` cuentan como activos)."""
+    indices = _indices()
+    return list(indices["activos"]) if indices else []
 
 
-@cache_data("usuarios", show_spinner=False, ttl=300, max_entries=8)
 def get_users_map() -> Dict[str, dict]:
     """Mapping correo/doc_id normalizado -> payload del usuario."""
-
-    mapping: Dict[str, dict] = {}
-    for user in _fetch_all_users():
-        correo_norm = user.get("_correo_norm") or normalizar_correo(user.get("correo", ""))
-        if not correo_norm:
-            continue
-        mapping[correo_norm] = user
-        mapping[correo_a_doc_id(correo_norm)] = user
-    return mapping
+    indices = _indices()
+    return indices["por_clave"] if indices else {}
 
 
 def list_users() -> List[dict]:
-    """Expone la lista cacheada cuando se necesita iterar completa."""
+    """Lista completa cuando se necesita iterar todos los usuarios."""
+    indices = _indices()
+    return list(indices["lista"]) if indices else []
+
+
+def registrar_escritura(doc_id: str, cambios: Dict[str, Any], merge: bool = True) -> None:
+    """Refleja al instante una escritura propia; el listener la confirma después."""
+    if doc_id:
+        _DIRECTORIO.aplicar_local(doc_id, cambios, merge=merge)
+
 
-    return list(_fetch_all_users())
+def registrar_borrado(doc_id: str) -> None:
+    if doc_id:
+        _DIRECTORIO.eliminar_local(doc_id)
@@ -1,6 +1,5 @@
 from __future__ import annotations
 from datetime import date, datetime, timedelta
-from functools import lru_cache
 from typing import Optional, Tuple, Dict, Any
 
 from app_core.firebase_client import get_db
@@ -10,13 +9,6 @@ EMPRESA_ASESORIA = "asesoria"
 EMPRESA_DESCONOCIDA = "desconocida"
 
 
-def _invalidate_usuario_cache():
-    try:
-        _fetch_usuario_por_doc_id.cache_clear()
-    except Exception:
-        pass
-
-
 def normalizar_correo(correo: str) -> str:
     return (correo or "").strip().lower()
 
@@ -37,10 +29,14 @@ def _infer_empresa_por_dominio(correo: str) -> str:
     return EMPRESA_DESCONOCIDA
 
 
-@lru_cache(maxsize=256)
 def _fetch_usuario_por_doc_id(doc_id: str) -> Optional[Dict[str, Any]]:
     if not doc_id:
         return None
+    # Import diferido: users_service importa este módulo.
+    from app_core import users_service
+
+    if users_service.disponible():
+        return users_service.usuario(doc_id)
     try:
         db = get_db()
         snap = db.collection("usuarios").document(doc_id).get()
@@ -69,6 +65,12 @@ def empresa_de_usuario(correo: str, usuarios_cache: Dict[str, Dict[str, Any]] |
     if data is None:
         data = _fetch_usuario_por_doc_id(correo_a_doc_id(correo_norm))
 
+    return empresa_desde_datos(correo_norm, data)
+
+
+def empresa_desde_datos(correo: str, data: Dict[str, Any] | None) -> str:
+    """Resuelve la empresa a partir de un payload de usuario ya leído (sin ir a Firestore)."""
+    correo_norm = normalizar_correo(correo)
     empresa = ""
     if isinstance(data, dict):
         empresa = str(data.get("empresa", "")).strip().lower()
@@ -110,6 +112,11 @@ def usuario_activo(
     if data is None:
         data = _fetch_usuario_por_doc_id(correo_a_doc_id(correo_norm))
 
+    return activo_desde_datos(data, default_if_missing)
+
+
+def activo_desde_datos(data: Dict[str, Any] | None, default_if_missing: bool = False) -> bool:
+    """Interpreta el flag `activo` de un payload de usuario ya leído."""
     if not isinstance(data, dict):
         return default_if_missing
 
@@ -131,15 +138,16 @@ def usuario_activo(
 
 
 def set_usuario_activo(correo: str, activo: bool = True) -> None:
+    # Import diferido: users_service importa este módulo.
+    from app_core import users_service
+
     correo_norm = normalizar_correo(correo)
     if not correo_norm:
         return
-    try:
-        db = get_db()
-        doc_id = correo_a_doc_id(correo_norm)
-        db.collection("usuarios").document(doc_id).set({"activo": bool(activo)}, merge=True)
-    finally:
-        _invalidate_usuario_cache()
+    db = get_db()
+    doc_id = correo_a_doc_id(correo_norm)
+    db.collection("usuarios").document(doc_id).set({"activo": bool(activo)}, merge=True)
+    users_service.registrar_escritura(doc_id, {"activo": bool(activo)})
 
 
 def safe_int(value, default: int = 0) -> int:
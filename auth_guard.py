@@ -2,17 +2,19 @@
 import streamlit as st
 import json
 import firebase_admin
-from firebase_admin import credentials, auth as admin_auth, firestore
+from firebase_admin import credentials, auth as admin_auth
 from datetime import datetime, timezone
 from typing import Optional
 
+from app_core.firebase_client import get_db
+
 # Inicializa Admin SDK una vez
 if not firebase_admin._apps:
     cred_dict = json.loads(st.secrets["FIREBASE_CREDENTIALS"])
     cred = credentials.Certificate(cred_dict)
     firebase_admin.initialize_app(cred)
 
-_db = firestore.client()
+_db = get_db()
 
 def _normalizar_id(correo: str) -> str:
     return correo.replace("@","_").replace(".","_")
@@ -1,5 +1,5 @@
 import streamlit as st
-from firebase_admin import credentials, firestore
+from firebase_admin import credentials
 import firebase_admin
 import json
 
@@ -10,6 +10,11 @@ from app_core.utils import (
     EMPRESA_DESCONOCIDA,
     correo_a_doc_id,
 )
+from app_core.batch_writer import BatchWriter
+from app_core.cache import clear_cache
+from app_core.data_access import docs_de_cliente, recalcular_ultima_rutina
+from app_core.firebase_client import get_db
+from app_core.metricas_semanales import borrar_metricas_semanas
 
 # === INICIALIZAR FIREBASE con secretos ===
 if not firebase_admin._apps:
@@ -17,7 +22,7 @@ if not firebase_admin._apps:
     cred = credentials.Certificate(cred_dict)
     firebase_admin.initialize_app(cred)
 
-db = firestore.client()
+db = get_db()
 
 def borrar_rutinas():
     st.title("🗑️ Borrar Rutinas por Semana")
@@ -71,41 +76,36 @@ def borrar_rutinas():
 
     for nombre_col in colecciones:
         try:
-            col_ref = db.collection(nombre_col)
-            # list_documents() obtiene referencias sin leer todo el doc (más rápido que .stream())
-            for ref in col_ref.list_documents():
-                total_refs += 1
-                doc_id = ref.id
-                did_lower = doc_id.lower()
-
-                # 1) Prefijo exacto (correo tal cual) o normalizado
-                match_prefix = did_lower.startswith(raw_lower) or did_lower.startswith(correo_norm)
-
-                # 2) Si no hubo prefijo, intentamos contains por si el correo está en medio
-                match_contains = (raw_lower in did_lower) or (correo_norm in did_lower)
-
-                if match_prefix or match_contains:
-                    hallados_debug.append((nombre_col, doc_id))
-
-                    # Extraer fecha desde el final del ID: ..._YYYY_MM_DD
-                    try:
-                        base, y, m, d = doc_id.rsplit("_", 3)
-                        fecha_semana = f"{y}_{m}_{d}"
-                    except ValueError:
-                        # No cumple patrón de fecha al final, saltamos
-                        continue
-
-                    semanas.setdefault(fecha_semana, []).append((nombre_col, doc_id))
+            # Rango sobre el ID (prefijo del correo) + `correo == ...`; solo se leen los docs del cliente.
+            docs = docs_de_cliente(nombre_col, raw_lower, campos=["correo", "fecha_lunes"])
         except Exception as e:
             st.error(f"Error leyendo colección '{nombre_col}': {e}")
+            continue
+        for doc_id, data in docs.items():
+            total_refs += 1
+            hallados_debug.append((nombre_col, doc_id))
+
+            # Extraer fecha desde el final del ID: ..._YYYY_MM_DD (o desde fecha_lunes)
+            try:
+                base, y, m, d = doc_id.rsplit("_", 3)
+                if not (y.isdigit() and m.isdigit() and d.isdigit()):
+                    raise ValueError(doc_id)
+                fecha_semana = f"{y}_{m}_{d}"
+            except ValueError:
+                fecha_semana = str(data.get("fecha_lunes") or "").replace("-", "_")
+                if not fecha_semana:
+                    # No cumple patrón de fecha al final, saltamos
+                    continue
+
+            semanas.setdefault(fecha_semana, []).append((nombre_col, doc_id))
 
     if not semanas:
-        st.warning("No se encontraron rutinas para ese correo (probado: tal cual, normalizado, prefijo y contains).")
+        st.warning("No se encontraron rutinas para ese correo (probado: prefijo tal cual, prefijo normalizado y campo 'correo').")
         with st.expander("Detalles de ayuda"):
             st.markdown("- **Ejemplo de ID esperado:** `correo@dominio.com_YYYY_MM_DD` o `correo_dominio_com_YYYY_MM_DD`")
             st.write(f"Correo ingresado: {correo_raw}")
             st.write(f"Correo normalizado probado: {correo_norm}")
-            st.write(f"Total de refs inspeccionadas: {total_refs}")
+            st.write(f"Total de docs del cliente encontrados: {total_refs}")
             if hallados_debug:
                 st.write("Se encontraron algunos IDs que contienen el correo, pero no tenían fecha válida al final:")
                 st.write(hallados_debug[:10])
@@ -124,11 +124,20 @@ def borrar_rutinas():
         st.write(hallados_debug[:20])
 
     if semanas_seleccionadas and st.button("🗑️ Eliminar semanas seleccionadas"):
-        batch = db.batch()
-        total_del = 0
+        writer = BatchWriter(db)
         for semana in semanas_seleccionadas:
             for (col_name, doc_id) in semanas[semana]:
-                batch.delete(db.collection(col_name).document(doc_id))
-                total_del += 1
-        batch.commit()
+                writer.delete(db.collection(col_name).document(doc_id))
+        total_del = writer.commit()
+        clear_cache("rutinas")  # índice de semanas de "Ver rutinas"
+        try:
+            recalcular_ultima_rutina(raw_lower)
+            borrar_metricas_semanas(
+                doc_id
+                for semana in semanas_seleccionadas
+                for (col_name, doc_id) in semanas[semana]
+                if col_name == "rutinas_semanales"
+            )
+        except Exception:
+            pass
         st.success(f"Se eliminaron {total_del} documento(s) de las semanas seleccionadas.")
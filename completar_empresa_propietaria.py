@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Completa `empresa_propietaria` en ejercicios antiguos que no tienen el campo.
+
+El catálogo filtra los ejercicios compartidos por empresa con consultas indexadas
+(`empresa_propietaria == empresa`), por lo que los documentos sin el campo solo
+vuelven a ser visibles para su empresa después de ejecutar este script.
+"""
+
+import argparse
+import sys
+from typing import Optional
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+from app_core.utils import correo_a_doc_id, empresa_desde_datos, normalizar_correo
+
+
+def _init_firebase(cred_path: Optional[str]) -> None:
+    if firebase_admin._apps:
+        return
+
+    if cred_path:
+        cred = credentials.Certificate(cred_path)
+        firebase_admin.initialize_app(cred)
+        return
+
+    try:
+        firebase_admin.initialize_app()
+    except ValueError as exc:
+        raise SystemExit(
+            "No se pudo inicializar Firebase. Usa --cred con el path al JSON del servicio."
+        ) from exc
+
+
+def _completar(batch_size: int, dry_run: bool) -> tuple[int, int]:
+    db = firestore.client()
+    pendientes: list[tuple[firestore.DocumentReference, str]] = []
+    total = 0
+
+    for doc in db.collection("ejercicios").stream():
+        total += 1
+        data = doc.to_dict() or {}
+        if "empresa_propietaria" in data:
+            continue
+        pendientes.append((doc.reference, normalizar_correo(data.get("entrenador"))))
+
+    creadores = sorted({c for _, c in pendientes if c})
+    perfiles: dict[str, dict] = {}
+    if creadores:
+        refs = [db.collection("usuarios").document(correo_a_doc_id(c)) for c in creadores]
+        for snap in db.get_all(refs):
+            if snap.exists:
+                perfiles[snap.id] = snap.to_dict() or {}
+
+    if dry_run:
+        return total, len(pendientes)
+
+    batch = db.batch()
+    writes = 0
+    for ref, creador in pendientes:
+        empresa = ""
+        if creador:
+            empresa = empresa_desde_datos(creador, perfiles.get(correo_a_doc_id(creador)))
+        batch.update(ref, {"empresa_propietaria": empresa})
+        writes += 1
+        if writes >= batch_size:
+            batch.commit()
+            batch = db.batch()
+            writes = 0
+
+    if writes:
+        batch.commit()
+
+    return total, len(pendientes)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--cred",
+        help="Ruta al archivo JSON de credenciales de servicio.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=400,
+        help="Límite de escrituras por batch (default: 400).",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Solo cuenta los documentos pendientes, sin escribir.",
+    )
+    args = parser.parse_args()
+
+    _init_firebase(args.cred)
+
+    total, pendientes = _completar(args.batch_size, args.dry_run)
+    print(f"Documentos leídos: {total}")
+    print(f"Documentos sin empresa_propietaria: {pendientes}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
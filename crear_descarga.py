@@ -12,10 +12,13 @@ from app_core.utils import (
     EMPRESA_ASESORIA,
     EMPRESA_DESCONOCIDA,
     EMPRESA_MOTION,
-    correo_a_doc_id,
     empresa_de_usuario,
     usuario_activo,
 )
+from app_core import busqueda_ejercicios, catalogo_service, users_service
+from app_core.cache import clear_cache
+from app_core.data_access import registrar_ultima_rutina
+from app_core.metricas_semanales import registrar_metricas_semanas
 from app_core.firebase_client import get_db
 from app_core.video_utils import normalizar_link_youtube
 from servicio_catalogos import get_catalogos, add_item
@@ -26,7 +29,7 @@ if not firebase_admin._apps:
     cred = credentials.Certificate(cred_dict)
     firebase_admin.initialize_app(cred)
 
-db = firestore.client()
+db = get_db()
 
 # =============== 🧰 UTILIDADES COMUNES ===============
 def normalizar_correo(correo: str) -> str:
@@ -84,15 +87,8 @@ def obtener_lista_ejercicios(data_dia):
     return []
 
 # =============== 📦 CARGAS (igual filosofía editor) ===============
-@st.cache_data(show_spinner=False)
 def cargar_ejercicios():
-    docs = db.collection("ejercicios").stream()
-    return { (d.to_dict() or {}).get("nombre",""): (d.to_dict() or {}) for d in docs if d.exists }
-
-@st.cache_data(show_spinner=False)
-def cargar_usuarios():
-    docs = db.collection("usuarios").stream()
-    return [doc.to_dict() for doc in docs if doc.exists]
+    return catalogo_service.ejercicios_por_nombre()
 
 @st.cache_data(show_spinner=False)
 def cargar_implementos():
@@ -104,7 +100,6 @@ def cargar_implementos():
     return impl
 
 EJERCICIOS  = cargar_ejercicios()
-USUARIOS    = cargar_usuarios()
 IMPLEMENTOS = cargar_implementos()
 
 SECTION_BREAK_HTML = "<div style='height:0;margin:14px 0;'></div>"
@@ -315,6 +310,7 @@ def guardar_ejercicio_firestore(nombre_final: str, payload_base: dict) -> None:
 
     doc_id = slug_nombre(nombre_final) if _es_admin else f"{slug_nombre(nombre_final)}__{_correo or 'sin_correo'}"
     db_local.collection("ejercicios").document(doc_id).set(meta, merge=True)
+    catalogo_service.registrar_escritura(doc_id, meta)
 
 def _ejercicio_firestore_a_fila_ui(ej: dict) -> dict:
     fila = {k: "" for k in COLUMNAS_TABLA}
@@ -663,7 +659,8 @@ def _render_tabla_manual(
         horizontal=True,
     )
 
-    ejercicios_dict = EJERCICIOS
+    # Copia superficial: el snapshot compartido es de solo lectura.
+    ejercicios_dict = dict(cargar_ejercicios())
 
     head_cols = st.columns([6.6, 1.1, 1.1, 1.1, 1.1, 1.6], gap="small")
     head_cols[0].markdown(f"<h4 class='h-accent' style='margin-top:2px'>{bloque_sel}</h4>", unsafe_allow_html=True)
@@ -907,16 +904,10 @@ def _render_tabla_manual(
         headers.pop(prog_idx)
         sizes.pop(prog_idx)
 
+    indice_busqueda = busqueda_ejercicios.indice_catalogo(ejercicios_dict, ("descarga",))
+
     def _buscar_fuzzy_local(palabra: str) -> list[str]:
-        if not palabra.strip():
-            return []
-        tokens = normalizar_texto(palabra).split()
-        res = []
-        for nombre in ejercicios_dict.keys():
-            nn = normalizar_texto(nombre)
-            if all(t in nn for t in tokens):
-                res.append(nombre)
-        return res
+        return indice_busqueda.buscar(palabra, limite=busqueda_ejercicios.LIMITE_AUTOCOMPLETADO)
 
     st.caption("Los cambios se guardan automáticamente.")
     header_cols = st.columns(sizes)
@@ -1353,12 +1344,7 @@ def descarga_rutina():
     st.title("📉 Crear Rutina de Descarga")
 
     # Mapear usuarios y filtrarlos según empresa
-    usuarios_map: dict[str, dict] = {}
-    for u in USUARIOS:
-        correo_u = (u.get("correo") or "").strip().lower()
-        if correo_u:
-            usuarios_map[correo_u] = u
-            usuarios_map[correo_a_doc_id(correo_u)] = u
+    usuarios_map = users_service.get_users_map()
 
     correo_login = (st.session_state.get("correo") or "").strip().lower()
     rol_login = (st.session_state.get("rol") or "").strip().lower()
@@ -1500,6 +1486,12 @@ def descarga_rutina():
         nuevo_doc["tipo"] = "descarga"
         nuevo_doc_id = f"{normalizar_correo(correo)}_{nueva_fecha.replace('-', '_')}"
         db.collection("rutinas_semanales").document(nuevo_doc_id).set(nuevo_doc)
+        clear_cache("rutinas")  # índice de semanas de "Ver rutinas"
+        try:
+            registrar_ultima_rutina({nuevo_doc_id: nuevo_doc})
+            registrar_metricas_semanas({nuevo_doc_id: nuevo_doc})
+        except Exception:
+            pass
         st.success(f"✅ Rutina de descarga creada para la semana {nueva_fecha}")
 
 # Multipage
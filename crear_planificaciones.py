@@ -5,7 +5,7 @@ from datetime import date, timedelta, datetime, timezone
 import pandas as pd
 import uuid
 # Agente de sugerencias de pesos
-from agente_rutinas import agente_sugerencia_rutina
+from agente_rutinas import SEMANAS_ATRAS_SUGERENCIA, agente_sugerencia_rutina, cargar_historial_cliente
 # Catálogos para caracteristica / patrón / grupo
 from servicio_catalogos import get_catalogos, add_item
 from firebase_admin import firestore
@@ -47,14 +47,13 @@ LIGHT = dict(
 
 
 from app_core.cache import cache_data, clear_cache
+from app_core import busqueda_ejercicios, catalogo_service, users_service
 from app_core.firebase_client import get_db
 from app_core.theme import inject_theme
 from app_core.video_utils import normalizar_link_youtube as _normalizar_link_youtube
 from app_core.utils import (
-    EMPRESA_ASESORIA,
     EMPRESA_DESCONOCIDA,
     EMPRESA_MOTION,
-    correo_a_doc_id,
     empresa_de_usuario,
     usuario_activo,
 )
@@ -290,6 +289,7 @@ def _guardar_video_en_ejercicio_si_falta(nombre_ejercicio: str, video_url: str,
         try:
             db = get_db()
             db.collection("ejercicios").document(doc_id).update({"video": video_url, "Video": video_url})
+            catalogo_service.registrar_escritura(doc_id, {"video": video_url, "Video": video_url})
         except Exception as exc:
             st.warning(f"No se pudo guardar el video del ejercicio '{nombre_ejercicio}': {exc}")
             _marcar_video_guardado(nombre_ejercicio, video_url)
@@ -375,15 +375,15 @@ def guardar_ejercicio_firestore(nombre_final: str, payload_base: dict) -> None:
 
     doc_id = slug_nombre(nombre_final) if _es_admin else f"{slug_nombre(nombre_final)}__{_correo or 'sin_correo'}"
     db.collection("ejercicios").document(doc_id).set(meta, merge=True)
+    catalogo_service.registrar_escritura(doc_id, meta)
 
-@cache_data("ejercicios", show_spinner=False)
-def _cargar_ejercicios_cached(correo_usuario: str, rol: str):
-    db = get_db()
+@cache_data("ejercicios", show_spinner=False, max_entries=16)
+def _cargar_ejercicios_cached(correo_usuario: str, rol: str, version_catalogo: int = 0):
     correo_usuario = (correo_usuario or "").strip().lower()
     rol = (rol or "").strip()
     rol_lower = rol.lower()
     es_admin = rol_lower in {r.lower() for r in ADMIN_ROLES}
-    empresa_usuario = empresa_de_usuario(correo_usuario) if correo_usuario else ""
+    empresa_usuario = empresa_de_usuario(correo_usuario) if correo_usuario and not es_admin else ""
 
     def _store(target: dict[str, dict], doc_id: str, data: dict) -> None:
         nombre = (data.get("nombre") or "").strip()
@@ -408,75 +408,13 @@ def _cargar_ejercicios_cached(correo_usuario: str, rol: str):
 
     ejercicios_por_nombre: dict[str, dict] = {}
     try:
-        if es_admin:
-            for doc in db.collection("ejercicios").stream():
-                if not doc.exists:
-                    continue
-                data = doc.to_dict() or {}
-                _store(ejercicios_por_nombre, doc.id, data)
-        else:
-            empresa_cache: dict[str, str] = {}
-
-            def _empresa_de_creador(correo_creador: str) -> str:
-                correo_creador = (correo_creador or "").strip().lower()
-                if not correo_creador:
-                    return ""
-                if correo_creador not in empresa_cache:
-                    try:
-                        empresa_cache[correo_creador] = empresa_de_usuario(correo_creador)
-                    except Exception:
-                        empresa_cache[correo_creador] = ""
-                return empresa_cache[correo_creador]
-
-            publicos: dict[str, dict] = {}
-            personales: dict[str, dict] = {}
-            compartidos: dict[str, dict] = {}
-
-            if empresa_usuario == EMPRESA_MOTION:
-                for doc in db.collection("ejercicios").stream():
-                    if not doc.exists:
-                        continue
-                    data = doc.to_dict() or {}
-                    if not data:
-                        continue
-                    nombre = (data.get("nombre") or "").strip()
-                    if not nombre:
-                        continue
-                    es_publico = bool(data.get("publico"))
-                    creador = (data.get("entrenador") or "").strip().lower()
-
-                    if es_publico:
-                        _store(publicos, doc.id, data)
-                        continue
-
-                    if creador and creador == correo_usuario:
-                        _store(personales, doc.id, data)
-                        continue
-
-                    empresa_doc = (data.get("empresa_propietaria") or "").strip().lower()
-                    if not empresa_doc:
-                        empresa_doc = _empresa_de_creador(creador)
-
-                    if empresa_doc == EMPRESA_MOTION:
-                        _store(compartidos, doc.id, data)
-                ejercicios_por_nombre.update(publicos)
-                ejercicios_por_nombre.update(compartidos)
-                ejercicios_por_nombre.update(personales)
-            else:
-                for doc in db.collection("ejercicios").where("publico", "==", True).stream():
-                    if not doc.exists:
-                        continue
-                    data = doc.to_dict() or {}
-                    _store(publicos, doc.id, data)
-                if correo_usuario:
-                    for doc in db.collection("ejercicios").where("entrenador", "==", correo_usuario).stream():
-                        if not doc.exists:
-                            continue
-                        data = doc.to_dict() or {}
-                        _store(personales, doc.id, data)
-                        publicos.pop((data.get("nombre") or "").strip(), None)
-                ejercicios_por_nombre.update(publicos)
-                ejercicios_por_nombre.update(personales)
+        catalogo = catalogo_service.ejercicios_visibles(
+            correo_usuario,
+            es_admin=es_admin,
+            empresa=empresa_usuario,
+        )
+        for data in catalogo.values():
+            _store(ejercicios_por_nombre, data.get("_doc_id", ""), data)
     except Exception as e:
         st.error(f"Error cargando ejercicios: {e}")
     return ejercicios_por_nombre
@@ -485,13 +423,10 @@ def _cargar_ejercicios_cached(correo_usuario: str, rol: str):
 def cargar_ejercicios():
     correo_usuario = (st.session_state.get("correo") or "").strip().lower()
     rol = (st.session_state.get("rol") or "").strip()
-    return _cargar_ejercicios_cached(correo_usuario, rol)
+    return _cargar_ejercicios_cached(correo_usuario, rol, catalogo_service.version())
 
-@cache_data("usuarios", show_spinner=False)
 def cargar_usuarios():
-    db = get_db()
-    docs = db.collection("usuarios").stream()
-    return [doc.to_dict() for doc in docs if doc.exists]
+    return users_service.list_users()
 
 @cache_data("implementos", show_spinner=False)
 def cargar_implementos():
@@ -506,36 +441,11 @@ def cargar_implementos():
 DESCANSO_OPCIONES = ["", "1", "2", "3", "4", "5"]
 
 
-class _FuzzyIndex:
-    def __init__(self, ejercicios: dict[str, dict]):
-        self._entries: list[tuple[str, str]] = []
-        for nombre, data in ejercicios.items():
-            norm = normalizar_texto(nombre)
-            slug = normalizar_texto((data or {}).get("buscable_id") or slug_nombre(nombre))
-            extra_text = f"{norm} {slug}".strip()
-            if not extra_text:
-                continue
-            self._entries.append((nombre, extra_text))
-
-    def search(self, consulta: str) -> list[str]:
-        norm = normalizar_texto(consulta)
-        if not norm:
-            return []
-        resultados: list[str] = []
-        for nombre, extra_text in self._entries:
-            if norm in extra_text:
-                resultados.append(nombre)
-        return resultados
-
-def _get_fuzzy_index(ejercicios_dict: dict[str, dict]) -> _FuzzyIndex:
-    """Devuelve un índice reusable, regenerándolo sólo si cambia el catálogo."""
-    cache = st.session_state.get("_fuzzy_index_cache")
-    claves = tuple(sorted(ejercicios_dict.keys()))
-    if cache and cache.get("claves") == claves:
-        return cache["index"]
-    index = _FuzzyIndex(ejercicios_dict)
-    st.session_state["_fuzzy_index_cache"] = {"claves": claves, "index": index}
-    return index
+def _get_fuzzy_index(ejercicios_dict: dict[str, dict]) -> busqueda_ejercicios.Indice:
+    """Índice de búsqueda compartido para lo visible por este usuario (por versión del catálogo)."""
+    correo_usuario = (st.session_state.get("correo") or "").strip().lower()
+    rol = (st.session_state.get("rol") or "").strip()
+    return busqueda_ejercicios.indice_catalogo(ejercicios_dict, ("planificaciones", correo_usuario, rol))
 
 def _ensure_len(lista: list[dict], n: int, plantilla: dict):
     if n < 0: n = 0
@@ -1046,12 +956,7 @@ def crear_rutinas():
     usuarios = cargar_usuarios()
 
     correo_login = (st.session_state.get("correo") or "").strip().lower()
-    usuarios_map: dict[str, dict] = {}
-    for u in usuarios:
-        correo_u = (u.get("correo") or "").strip().lower()
-        if correo_u:
-            usuarios_map[correo_u] = u
-            usuarios_map[correo_a_doc_id(correo_u)] = u
+    usuarios_map = users_service.get_users_map()
 
     def _es_cliente_activo(user: dict) -> bool:
         correo_u = (user.get("correo") or "").strip().lower()
@@ -1061,26 +966,13 @@ def crear_rutinas():
 
     if rol == "entrenador" and correo_login:
         empresa_entrenador = empresa_de_usuario(correo_login, usuarios_map)
-        if empresa_entrenador == EMPRESA_ASESORIA:
-            usuarios = [
-                u for u in usuarios
-                if (u.get("coach_responsable") or "").strip().lower() == correo_login
+        if empresa_entrenador == EMPRESA_MOTION:
+            usuarios = users_service.por_empresa(EMPRESA_MOTION) + [
+                u for u in users_service.por_coach(correo_login)
+                if empresa_de_usuario(u.get("correo") or "", usuarios_map) == EMPRESA_DESCONOCIDA
             ]
-        elif empresa_entrenador == EMPRESA_MOTION:
-            usuarios_filtrados = []
-            for u in usuarios:
-                correo_cli = (u.get("correo") or "").strip().lower()
-                empresa_cli = empresa_de_usuario(correo_cli, usuarios_map)
-                if empresa_cli == EMPRESA_MOTION:
-                    usuarios_filtrados.append(u)
-                elif empresa_cli == EMPRESA_DESCONOCIDA and (u.get("coach_responsable") or "").strip().lower() == correo_login:
-                    usuarios_filtrados.append(u)
-            usuarios = usuarios_filtrados
         else:
-            usuarios = [
-                u for u in usuarios
-                if (u.get("coach_responsable") or "").strip().lower() == correo_login
-            ]
+            usuarios = users_service.por_coach(correo_login)
 
     usuarios = [u for u in usuarios if _es_cliente_activo(u)]
 
@@ -1779,7 +1671,7 @@ def crear_rutinas():
                             return []
                         cached = search_cache.get(norm_txt)
                         if cached is None:
-                            base = fuzzy_index.search(query)
+                            base = fuzzy_index.buscar(query, limite=busqueda_ejercicios.LIMITE_AUTOCOMPLETADO)
                             if len(search_cache) >= 50:
                                 search_cache.clear()
                             search_cache[norm_txt] = tuple(base)
@@ -2157,6 +2049,16 @@ def crear_rutinas():
                             with st.spinner("Consultando KEPE para pesos vacíos..."):
                                 pending_updates = dict(st.session_state.get("_pending_pesos", {}))
                                 resumen_pop = []
+                                # Una sola lectura en lote para el historial de todos los ejercicios.
+                                try:
+                                    historial_cli = cargar_historial_cliente(
+                                        correo_cli,
+                                        fecha_str,
+                                        semanas_atras=SEMANAS_ATRAS_SUGERENCIA,
+                                        nombres_ejercicio=[pend["nombre"] for pend in pendientes_sugerencia],
+                                    )
+                                except Exception:
+                                    historial_cli = None
                                 for pend in pendientes_sugerencia:
                                     pct_raw = pend.get("porcentaje")
                                     try:
@@ -2169,6 +2071,7 @@ def crear_rutinas():
                                             nombre_ejercicio=pend["nombre"],
                                             fecha_semana_actual=fecha_str,
                                             porcentaje_objetivo=pct_val,
+                                            historial_cliente=historial_cli,
                                         )
                                         peso_sug = res.get("peso_sugerido")
                                         if peso_sug not in (None, ""):
@@ -2628,6 +2531,7 @@ def crear_rutinas():
     
                 try:
                     db.collection("ejercicios").document(item["doc_id"]).set(payload_update, merge=True)
+                    catalogo_service.registrar_escritura(item["doc_id"], payload_update)
                     dict_key = item.get("nombre_catalogo")
                     if dict_key and dict_key in ejercicios_dict:
                         ejercicios_dict[dict_key]["grupo_muscular_principal"] = primary_clean
@@ -9,9 +9,13 @@ import pandas as pd
 import streamlit as st
 from firebase_admin import firestore
 
+from app_core import busqueda_ejercicios, catalogo_service, users_service
 from app_core.ejercicios_catalogo import obtener_ejercicios_disponibles
+from app_core.cache import clear_cache
+from app_core.data_access import registrar_ultima_rutina
+from app_core.metricas_semanales import registrar_metricas_semanas
 from app_core.firebase_client import get_db
-from app_core.email_notifications import enviar_correo_rutina_disponible
+from app_core.email_notifications import DESPACHO_ENCOLADO, DESPACHO_ENVIADO, enviar_correo_rutina_disponible
 from app_core.theme import inject_theme
 from app_core.video_utils import (
     normalizar_link_youtube as _normalizar_link_youtube,
@@ -21,7 +25,6 @@ from app_core.utils import (
     EMPRESA_ASESORIA,
     EMPRESA_DESCONOCIDA,
     EMPRESA_MOTION,
-    correo_a_doc_id,
     empresa_de_usuario,
     usuario_activo,
 )
@@ -376,15 +379,10 @@ def guardar_ejercicio_firestore(nombre_final: str, payload_base: dict) -> None:
         else f"{normalizar_texto(nombre_final).replace(' ', '_')}__{correo or 'sin_correo'}"
     )
     db.collection("ejercicios").document(doc_id).set(meta, merge=True)
+    catalogo_service.registrar_escritura(doc_id, meta)
 
 
 # ===================== 📦 CACHE =====================
-@st.cache_data(show_spinner=False)
-def cargar_usuarios():
-    db = get_db()
-    return [doc.to_dict() for doc in db.collection("usuarios").stream() if doc.exists]
-
-
 @st.cache_data(show_spinner=False)
 def cargar_implementos():
     db = get_db()
@@ -401,7 +399,6 @@ def _refrescar_catalogo() -> dict[str, dict]:
 
 
 EJERCICIOS: dict[str, dict] = {}
-USUARIOS = cargar_usuarios()
 IMPLEMENTOS = cargar_implementos()
 
 
@@ -1566,20 +1563,11 @@ def render_tabla_dia(i: int, seccion: str, progresion_activa: str, dias_labels:
         headers.pop(prog_idx)
         sizes.pop(prog_idx)
 
+    correo_login = (st.session_state.get("correo") or "").strip().lower()
+    indice_busqueda = busqueda_ejercicios.indice_catalogo(ejercicios_dict, ("editar", correo_login))
+
     def _buscar_fuzzy(palabra: str) -> list[str]:
-        if not palabra.strip():
-            return []
-        patron = normalizar_texto(palabra)
-        if not patron:
-            return []
-        candidatos = []
-        for nombre, data in ejercicios_dict.items():
-            nombre_norm = normalizar_texto(nombre)
-            slug_norm = normalizar_texto((data or {}).get("buscable_id") or _buscable_id(nombre))
-            extra_texto = f"{nombre_norm} {slug_norm}".strip()
-            if patron in extra_texto:
-                candidatos.append(nombre)
-        return candidatos
+        return indice_busqueda.buscar(palabra, limite=busqueda_ejercicios.LIMITE_AUTOCOMPLETADO)
 
     section_container = st.container()
     with section_container:
@@ -2120,12 +2108,7 @@ def editar_rutinas():
     db = get_db()
 
     # ===== Clientes disponibles según permisos =====
-    usuarios_map: dict[str, dict] = {}
-    for user in USUARIOS:
-        correo_u = (user.get("correo") or "").strip().lower()
-        if correo_u:
-            usuarios_map[correo_u] = user
-            usuarios_map[correo_a_doc_id(correo_u)] = user
+    usuarios_map = users_service.get_users_map()
 
     correo_login = (st.session_state.get("correo") or "").strip().lower()
     rol_login = (st.session_state.get("rol") or "").strip().lower()
@@ -2446,9 +2429,16 @@ def editar_rutinas():
             objetivo_para_guardar,
         )
         if total:
+            clear_cache("rutinas")  # índice de semanas de "Ver rutinas"
             for doc_id in doc_ids_destino:
                 snap = db.collection("rutinas_semanales").document(doc_id).get()
                 datos_cache[doc_id] = snap.to_dict() or {}
+            semanas_guardadas = {doc_id: datos_cache[doc_id] for doc_id in doc_ids_destino}
+            try:
+                registrar_ultima_rutina(semanas_guardadas)
+                registrar_metricas_semanas(semanas_guardadas)
+            except Exception:
+                pass
             doc_data = datos_cache.get(doc_id_semana) or {}
             st.success(f"Rutina guardada en {total} semana(s).")
             if notificar_correo:
@@ -2458,7 +2448,7 @@ def editar_rutinas():
                 empresa_cliente = empresa_de_usuario(correo_cliente, usuarios_map)
                 coach_correo = (doc_data.get("entrenador") or correo_login or "").strip()
                 semanas_notificadas = max(1, len(doc_ids_destino))
-                envio_ok = enviar_correo_rutina_disponible(
+                despacho = enviar_correo_rutina_disponible(
                     correo=correo_cliente,
                     nombre=nombre_email,
                     fecha_inicio=fecha_base,
@@ -2466,8 +2456,10 @@ def editar_rutinas():
                     empresa=empresa_cliente,
                     coach=coach_correo,
                 )
-                if envio_ok:
-                    st.caption("El cliente fue notificado por correo con la rutina editada.")
+                if despacho == DESPACHO_ENCOLADO:
+                    st.caption("Aviso por correo en cola; el cliente lo recibirá en unos instantes.")
+                elif despacho == DESPACHO_ENVIADO:
+                    st.caption("Aviso por correo enviado al cliente.")
                 else:
                     st.caption("No se pudo enviar el aviso por correo; revisa la configuración de notificaciones.")
             else:
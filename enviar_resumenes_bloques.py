@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Envía el resumen dominical de bloques a los entrenadores (job programado).
+
+Arma todos los resúmenes con `preparar_resumenes_bloques` (una sola lectura de
+`rutinas_semanales` y un `get_all` de perfiles) y los manda por la conexión
+compartida del transporte. Sin `--enviar` solo muestra a quién le llegaría.
+"""
+
+import argparse
+import sys
+from datetime import date
+from typing import Optional
+
+import firebase_admin
+from firebase_admin import credentials
+
+from app_core.email_notifications import enviar_resumenes_bloques
+
+
+def _init_firebase(cred_path: Optional[str]) -> None:
+    if firebase_admin._apps:
+        return
+
+    if cred_path:
+        cred = credentials.Certificate(cred_path)
+        firebase_admin.initialize_app(cred)
+        return
+
+    try:
+        firebase_admin.initialize_app()
+    except ValueError as exc:
+        raise SystemExit(
+            "No se pudo inicializar Firebase. Usa --cred con el path al JSON del servicio."
+        ) from exc
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--cred",
+        help="Ruta al archivo JSON de credenciales de servicio.",
+    )
+    parser.add_argument(
+        "--fecha",
+        type=date.fromisoformat,
+        help="Fecha de referencia YYYY-MM-DD (default: hoy).",
+    )
+    parser.add_argument(
+        "--entrenador",
+        action="append",
+        help="Correo de un entrenador; se puede repetir (default: todos).",
+    )
+    parser.add_argument(
+        "--enviar",
+        action="store_true",
+        help="Envía los correos; sin esta opción solo se previsualiza.",
+    )
+    args = parser.parse_args()
+
+    _init_firebase(args.cred)
+
+    resultados = enviar_resumenes_bloques(args.entrenador, enviar=args.enviar, fecha_referencia=args.fecha)
+    enviados = 0
+    for resultado in resultados:
+        destinatario = resultado.get("destinatario", "")
+        if resultado.get("enviado"):
+            enviados += 1
+            print(f"Enviado: {destinatario}")
+        elif resultado.get("error"):
+            print(f"Omitido: {destinatario} ({resultado['error']})")
+        else:
+            print(f"Previsualizado: {destinatario} — {resultado.get('subject', '')}")
+    print(f"Resúmenes: {len(resultados)} · enviados: {enviados}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,8 +6,13 @@ from firebase_admin import firestore
 from herramientas import aplicar_progresion, normalizar_texto
 import streamlit as st
 import uuid
+from app_core import catalogo_service
+from app_core.batch_writer import BatchWriter
+from app_core.cache import clear_cache
+from app_core.data_access import registrar_ultima_rutina
+from app_core.metricas_semanales import registrar_metricas_semanas
 from app_core.firebase_client import get_db
-from app_core.email_notifications import enviar_correo_rutina_disponible
+from app_core.email_notifications import DESPACHO_ENCOLADO, DESPACHO_ENVIADO, enviar_correo_rutina_disponible
 from app_core.utils import empresa_de_usuario
 from app_core.video_utils import normalizar_link_youtube
 
@@ -241,11 +246,7 @@ def _cargar_ejercicios_metadata_para_guardado() -> dict[str, dict]:
     """
     resultado: dict[str, dict] = {}
     try:
-        db = get_db()
-        for doc in db.collection("ejercicios").stream():
-            if not doc.exists:
-                continue
-            data = doc.to_dict() or {}
+        for data in catalogo_service.ejercicios_por_id().values():
             nombre = (data.get("nombre") or data.get("Nombre") or "").strip()
             if not nombre:
                 continue
@@ -314,6 +315,32 @@ def _cargar_doc_semana(db, cache: dict, correo_norm: str, fecha_iso: str):
     return cache[key]
 
 
+def _hay_condiciones_rir(dias) -> bool:
+    """True si alguna fila de la UI tiene una regla condicionada por RIR de la semana previa."""
+    for i, _dia_label in enumerate(dias):
+        for seccion in ["Warm Up", "Work Out"]:
+            dia_key = f"rutina_dia_{i + 1}_{seccion.replace(' ', '_')}"
+            for ejercicio in st.session_state.get(dia_key, []) or []:
+                for p in range(1, 4):
+                    if _s(ejercicio.get(f"CondicionVar_{p}", "")).lower() == "rir":
+                        return True
+    return False
+
+
+def _precargar_docs_semana(db, cache: dict, correo_norm: str, fechas_iso: list[str]) -> None:
+    """Llena `cache` con un único `get_all` para todas las semanas indicadas."""
+    pendientes = [f for f in fechas_iso if (correo_norm, f) not in cache]
+    if not pendientes:
+        return
+    col = db.collection("rutinas_semanales")
+    refs = {f"{correo_norm}_{f.replace('-', '_')}": f for f in pendientes}
+    for f in pendientes:
+        cache[(correo_norm, f)] = None
+    for snap in db.get_all([col.document(doc_id) for doc_id in refs]):
+        if snap.exists:
+            cache[(correo_norm, refs[snap.id])] = snap.to_dict()
+
+
 def _condicion_rir_cumplida(db, cache, correo_norm: str, fecha_prev: str, numero_dia: int, ejercicio_ref: dict, operador: str, umbral: float) -> bool:
     doc_prev = _cargar_doc_semana(db, cache, correo_norm, fecha_prev)
     if not doc_prev:
@@ -439,15 +466,26 @@ def guardar_rutina(
     ejercicios_meta = ejercicios_meta or _cargar_ejercicios_metadata_para_guardado()
     ejercicios_idx = _indice_ejercicios_por_nombre(ejercicios_meta)
     campos_series_categoria = ("grupo_muscular_principal", "patron_de_movimiento")
+    correo_norm = _s(correo).lower().replace("@", "_").replace(".", "_")
+    nombre_normalizado = normalizar_texto(_s(nombre_sel).title())
+    docs_bloque: dict[str, dict] = {}
 
     try:
+        # Paso 1: construir todas las semanas en memoria. Las condiciones por RIR leen la
+        # semana previa; las que ya existen en Firestore se traen juntas con un get_all.
+        if int(semanas) > 1 and _hay_condiciones_rir(dias):
+            _precargar_docs_semana(
+                db,
+                docs_prev_cache,
+                correo_norm,
+                [(fecha_inicio + timedelta(weeks=k)).strftime("%Y-%m-%d") for k in range(int(semanas) - 1)],
+            )
+
         for semana_idx in range(int(semanas)):  # 0..(N-1)
             semana_actual = semana_idx + 1      # 1..N
             fecha_semana = fecha_inicio + timedelta(weeks=semana_idx)
             fecha_str = fecha_semana.strftime("%Y-%m-%d")
             fecha_norm = fecha_semana.strftime("%Y_%m_%d")
-            correo_norm = _s(correo).lower().replace("@", "_").replace(".", "_")
-            nombre_normalizado = normalizar_texto(_s(nombre_sel).title())
 
             rutina_semana = {
                 "cliente": nombre_normalizado,
@@ -688,12 +726,30 @@ def guardar_rutina(
 
             if rutina_semana["rutina"]:
                 doc_id = f"{correo_norm}_{fecha_norm}"
-                db.collection("rutinas_semanales").document(doc_id).set(rutina_semana)
+                docs_bloque[doc_id] = rutina_semana
+                # La semana siguiente ve esta versión como "semana previa", igual que tras escribirla.
+                docs_prev_cache[(correo_norm, fecha_str)] = rutina_semana
+
+        # Paso 2: un único batch atómico; el bloque queda completo o no se crea.
+        writer = BatchWriter(db)
+        col_rutinas = db.collection("rutinas_semanales")
+        for doc_id, rutina_semana in docs_bloque.items():
+            writer.set(col_rutinas.document(doc_id), rutina_semana)
+        try:
+            registrar_ultima_rutina(docs_bloque, writer)
+        except Exception:
+            pass  # El resumen es derivado; el panel admin lo reconstruye si falta.
+        try:
+            registrar_metricas_semanas(docs_bloque, writer)
+        except Exception:
+            pass
+        writer.commit()
+        clear_cache("rutinas")  # índice de semanas de "Ver rutinas"
 
         st.success(f"✅ Rutina generada correctamente para {semanas} semanas (progresión acumulativa + descanso + RIR min/max + series).")
         if notificar_correo:
             empresa_cliente = empresa_de_usuario(correo)
-            envio_ok = enviar_correo_rutina_disponible(
+            despacho = enviar_correo_rutina_disponible(
                 correo=correo,
                 nombre=nombre_sel,
                 fecha_inicio=fecha_inicio,
@@ -701,8 +757,10 @@ def guardar_rutina(
                 empresa=empresa_cliente,
                 coach=entrenador,
             )
-            if envio_ok:
-                st.caption("El cliente fue notificado por correo con su bloque actualizado.")
+            if despacho == DESPACHO_ENCOLADO:
+                st.caption("Aviso por correo en cola; el cliente lo recibirá en unos instantes.")
+            elif despacho == DESPACHO_ENVIADO:
+                st.caption("Aviso por correo enviado al cliente.")
             else:
                 st.caption("No se pudo enviar el aviso por correo; revisa la configuración de notificaciones.")
         else:
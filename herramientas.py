@@ -1,5 +1,4 @@
 import unicodedata
-from firebase_admin import firestore
 from datetime import datetime, timedelta
 
 def aplicar_progresion(valor_inicial, incremento, operacion):
@@ -23,6 +22,8 @@ def normalizar_texto(texto):
 # herramientas.py  (agrega al final o donde prefieras)
 from typing import Any, Optional
 
+from app_core.firebase_client import get_db
+
 def safe_float(v: Any, default: Optional[float] = None) -> Optional[float]:
     if v is None:
         return default
@@ -51,7 +52,7 @@ def to_float_or_zero(v: Any) -> float:
     return 0.0 if f is None else f
 
 def actualizar_progresiones_individual(nombre, correo, ejercicio, circuito, bloque, fecha_actual_lunes, dia_numero, peso_alcanzado):
-    db = firestore.client()
+    db = get_db()
 
     # Normalización
     correo_id = correo.replace("@", "_").replace(".", "_").lower()
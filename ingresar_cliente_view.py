@@ -1,7 +1,7 @@
 # admin_panel_tarjetas.py — Selector por tarjetas + botón Volver (misma paleta)
 import streamlit as st
 import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import credentials
 import unicodedata
 import json
 import re
@@ -11,6 +11,8 @@ from datetime import datetime
 
 # 👇 servicio de catálogos (tuyo)
 from servicio_catalogos import get_catalogos, add_item
+from app_core import catalogo_service, users_service
+from app_core.firebase_client import get_db
 from app_core.utils import empresa_de_usuario, EMPRESA_MOTION, EMPRESA_ASESORIA, EMPRESA_DESCONOCIDA
 
 # ==========================
@@ -89,7 +91,7 @@ if not firebase_admin._apps:
     cred_dict = json.loads(st.secrets["FIREBASE_CREDENTIALS"])
     cred = credentials.Certificate(cred_dict)
     firebase_admin.initialize_app(cred)
-db = firestore.client()
+db = get_db()
 
 # ====== helpers de normalización ======
 def normalizar_id(correo: str) -> str:
@@ -128,24 +130,14 @@ def es_admin() -> bool:
             pass
     return False
 
-@st.cache_data(show_spinner=False)
 def listar_entrenadores():
     coaches = []
-    try:
-        for snap in db.collection("usuarios").stream():
-            if not snap.exists:
-                continue
-            data = snap.to_dict() or {}
-            rol = (data.get("rol") or data.get("role") or "").strip().lower()
-            if rol not in {"entrenador", "admin", "administrador"}:
-                continue
-            correo = (data.get("correo") or "").strip().lower()
-            if not correo:
-                continue
-            nombre = (data.get("nombre") or correo).strip()
-            coaches.append((nombre, correo))
-    except Exception:
-        pass
+    for data in users_service.por_rol("entrenador", "admin", "administrador"):
+        correo = data.get("_correo_norm")
+        if not correo:
+            continue
+        nombre = (data.get("nombre") or correo).strip()
+        coaches.append((nombre, correo))
     coaches.sort(key=lambda item: item[0].lower())
     return coaches
 
@@ -466,9 +458,9 @@ def _render_ejercicio():
 
     admin = es_admin()
 
-    # Cargar ejercicios ya existentes
-    docs = db.collection("ejercicios").stream()
-    ejercicios_disponibles = {doc.id: doc.to_dict().get("nombre", doc.id) for doc in docs}
+    # Cargar ejercicios ya existentes (snapshot compartido del proceso)
+    catalogo = catalogo_service.ejercicios_por_id()
+    ejercicios_disponibles = {doc_id: data.get("nombre", doc_id) for doc_id, data in catalogo.items()}
 
     modo = st.radio("¿Qué quieres hacer?", ["Nuevo ejercicio", "Editar ejercicio existente"], horizontal=True)
 
@@ -477,8 +469,7 @@ def _render_ejercicio():
     if modo == "Editar ejercicio existente" and ejercicios_disponibles:
         seleccion = st.selectbox("Selecciona un ejercicio:", list(ejercicios_disponibles.values()))
         doc_id_sel = [k for k, v in ejercicios_disponibles.items() if v == seleccion][0]
-        snap = db.collection("ejercicios").document(doc_id_sel).get()
-        datos = snap.to_dict() if snap.exists else {}
+        datos = dict(catalogo.get(doc_id_sel) or {})
 
     # === catálogos ===
     cat = get_catalogos()
@@ -613,15 +604,18 @@ def _render_ejercicio():
                     if not datos.get("entrenador"):
                         datos_guardar["entrenador"] = correo_usuario  # backfill si faltaba
                     db.collection("ejercicios").document(doc_id_sel).update(datos_guardar)
+                    catalogo_service.registrar_escritura(doc_id_sel, datos_guardar)
                     st.success(f"✅ Ejercicio '{datos.get('nombre', doc_id_sel)}' actualizado correctamente")
                 else:
                     doc_id = normalizar_texto(nombre_final)
-                    db.collection("ejercicios").document(doc_id).set({
+                    nuevo = {
                         **datos_guardar,
                         "creado_por": correo_usuario,
                         "fecha_creacion": datetime.utcnow(),
                         "entrenador": correo_usuario,
-                    }, merge=True)
+                    }
+                    db.collection("ejercicios").document(doc_id).set(nuevo, merge=True)
+                    catalogo_service.registrar_escritura(doc_id, nuevo)
                     st.success(f"✅ Ejercicio '{nombre_final}' guardado correctamente")
 
                 if datos_guardar["publico"]:
@@ -733,11 +727,13 @@ def _render_carga_csv():
                     "entrenador": correo_usuario,
                 }
 
-                db.collection("ejercicios").document(doc_id).set({
+                nuevo = {
                     **payload,
                     "creado_por": correo_usuario,
                     "fecha_creacion": datetime.utcnow(),
-                }, merge=True)
+                }
+                db.collection("ejercicios").document(doc_id).set(nuevo, merge=True)
+                catalogo_service.registrar_escritura(doc_id, nuevo)
                 guardados += 1
             except Exception as exc:
                 errores.append((idx, str(exc)))
@@ -1,9 +1,14 @@
 # offline_storage.py
+import base64
+import copy
 import json
 import time
+import uuid
+import zlib
 from typing import Any, Dict, List, Optional, Tuple
 
 import streamlit as st
+import streamlit.components.v1 as components
 from streamlit_local_storage import LocalStorage
 
 _local = LocalStorage()
@@ -16,21 +21,76 @@ KEY_MUTATION_QUEUE    = "mp_mutation_queue_v1"
 KEY_LAST_SYNC_OK      = "mp_last_sync_ok_v1"
 KEY_OFFLINE_FLAG      = "mp_is_offline_v1"
 
+KEY_PREFIX            = "mp_"
+
 # ========= Generador de keys únicos por llamada =========
 def _next_uid(prefix: str, item_key: str) -> str:
     c = st.session_state.get("_ls_uid_counter", 0) + 1
     st.session_state["_ls_uid_counter"] = c
     return f"{prefix}::{item_key}::{c}::{int(time.time()*1000)}"
 
-# ========= Wrappers con key único =========
+# ========= Puente localStorage (memo en sesión) =========
+# Todas las claves `mp_*` se leen con UNA llamada al componente (`getAll`) y quedan en
+# st.session_state; las escrituras actualizan esa copia y salen al navegador en un
+# único <script> por llamada a set_many. Esta pestaña es la única que escribe estas
+# claves, así que la copia en sesión no se desincroniza.
+_SS_LS_MEMO   = "_mp_ls_memo"
+_SS_LS_LOADED = "_mp_ls_loaded"
+
+def _ls_memo() -> Dict[str, Optional[str]]:
+    memo = st.session_state.setdefault(_SS_LS_MEMO, {})
+    if st.session_state.get(_SS_LS_LOADED):
+        return memo
+    get_all = getattr(_local, "getAll", None)
+    if get_all is None:
+        return memo
+    try:
+        todo = get_all(key=_next_uid("getall", KEY_PREFIX))
+    except Exception:
+        todo = None
+    if isinstance(todo, dict):
+        for k, v in todo.items():
+            # Lo escrito en esta sesión manda sobre lo leído
+            if str(k).startswith(KEY_PREFIX) and k not in memo:
+                memo[k] = v if v is None or isinstance(v, str) else json.dumps(v, ensure_ascii=False)
+        st.session_state[_SS_LS_LOADED] = True
+    return memo
+
+def get_many(item_keys: List[str]) -> Dict[str, Optional[str]]:
+    """Valores de varias claves; como mucho una ida y vuelta al navegador por sesión."""
+    memo = _ls_memo()
+    if not st.session_state.get(_SS_LS_LOADED):
+        # Sin getAll (o aún sin respuesta del componente): lectura clave a clave
+        for k in item_keys:
+            if k not in memo:
+                v = _local.getItem(k, key=_next_uid("get", k))
+                if v is not None:
+                    memo[k] = v
+    return {k: memo.get(k) for k in item_keys}
+
+def set_many(items: Dict[str, Optional[str]]) -> None:
+    """Escribe (o borra, con None) varias claves con un solo componente."""
+    if not items:
+        return
+    memo = st.session_state.setdefault(_SS_LS_MEMO, {})
+    memo.update(items)
+    payload = json.dumps(items, ensure_ascii=False).replace("</", "<\\/")
+    components.html(
+        "<script>(function(){const d=" + payload + ";"
+        "for(const [k,v] of Object.entries(d)){"
+        "if(v===null){localStorage.removeItem(k);}else{localStorage.setItem(k,v);}}})();</script>",
+        height=0,
+    )
+
+# ========= Wrappers =========
 def _ls_get_raw(item_key: str) -> Optional[str]:
-    return _local.getItem(item_key, key=_next_uid("get", item_key))
+    return get_many([item_key])[item_key]
 
 def _ls_set_raw(item_key: str, value: str) -> None:
-    _local.setItem(item_key, value, key=_next_uid("set", item_key))
+    set_many({item_key: value})
 
 def _ls_remove(item_key: str) -> None:
-    _local.removeItem(item_key, key=_next_uid("rm", item_key))
+    set_many({item_key: None})
 
 def _load_json(item_key: str, default: Any):
     try:
@@ -56,37 +116,393 @@ def is_offline() -> bool:
 
 # ========= Cacheo login =========
 def cache_login(email: str, role: str):
-    _ls_set_raw(KEY_EMAIL, email or "")
-    _ls_set_raw(KEY_ROLE,  role or "")
+    set_many({KEY_EMAIL: email or "", KEY_ROLE: role or ""})
 
 def get_cached_login() -> Tuple[Optional[str], Optional[str]]:
-    return _ls_get_raw(KEY_EMAIL), _ls_get_raw(KEY_ROLE)
+    vals = get_many([KEY_EMAIL, KEY_ROLE])
+    return vals[KEY_EMAIL], vals[KEY_ROLE]
 
 def clear_cached_login():
-    _ls_remove(KEY_EMAIL)
-    _ls_remove(KEY_ROLE)
+    set_many({KEY_EMAIL: None, KEY_ROLE: None})
 
 # ========= Cacheo semana =========
+# Formato v2: la clave principal guarda un encabezado {"__mpwc": 2, "enc": "j"|"z", "chunks": n,
+# "update_time": "...", "saved": ts, "data": "..."}; si el valor supera WEEK_CACHE_CHUNK_CHARS
+# el payload va repartido en `<clave>::1..n` y "data" queda vacío. Un índice LRU
+# (KEY_WEEK_CACHE_INDEX) lleva tamaño y último uso de cada semana para desalojar las viejas.
+WEEK_CACHE_FORMAT        = 2
+KEY_WEEK_CACHE_INDEX     = "mp_weekcache_index_v2"
+WEEK_CACHE_CHUNK_CHARS   = 100_000        # holgado bajo la cuota por valor de los navegadores
+WEEK_CACHE_MAX_WEEKS     = 8
+WEEK_CACHE_MAX_CHARS     = 1_500_000      # ~3 MB en UTF-16, bajo los 5 MB típicos por origen
+WEEK_CACHE_COMPRESS_MIN  = 2_000          # bajo esto comprimir no compensa el base64
+# Campos que solo sirven para mostrar con conexión (videos) o para reportes del coach.
+WEEK_CACHE_DROP_FIELDS          = ("series_por_categoria",)
+WEEK_CACHE_DROP_EXERCISE_FIELDS = ("video",)
+
 def week_cache_key(normalized_email: str, monday_str: str) -> str:
     return f"{KEY_WEEK_CACHE_PREFIX}{normalized_email}_{monday_str}"
 
+def _compact_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            if k in WEEK_CACHE_DROP_EXERCISE_FIELDS:
+                continue
+            v = _compact_value(v)
+            if v in (None, "", [], {}):
+                continue
+            out[k] = v
+        return out
+    if isinstance(value, list):
+        return [_compact_value(v) for v in value]
+    return value
+
+def compact_week(week_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Copia de la semana sin campos de solo-visualización ni valores vacíos."""
+    out: Dict[str, Any] = {}
+    for k, v in (week_data or {}).items():
+        if k in WEEK_CACHE_DROP_FIELDS:
+            continue
+        if k == "rutina":
+            v = _compact_value(v)
+        if v in (None, "", [], {}):
+            continue
+        out[k] = v
+    return out
+
+def _encode_week(week_data: Dict[str, Any], compress: bool) -> Tuple[str, str]:
+    raw = json.dumps(week_data, ensure_ascii=False, separators=(",", ":"), default=str)
+    if compress and len(raw) >= WEEK_CACHE_COMPRESS_MIN:
+        packed = base64.b64encode(zlib.compress(raw.encode("utf-8"), 9)).decode("ascii")
+        if len(packed) < len(raw):
+            return "z", packed
+    return "j", raw
+
+def _decode_week(enc: str, payload: str) -> Optional[Dict[str, Any]]:
+    if enc == "z":
+        payload = zlib.decompress(base64.b64decode(payload)).decode("utf-8")
+    return json.loads(payload)
+
+def _load_week_index() -> Dict[str, Dict[str, Any]]:
+    index = _load_json(KEY_WEEK_CACHE_INDEX, {})
+    return index if isinstance(index, dict) else {}
+
+def _week_entry_keys(key: str, chunks: int) -> List[str]:
+    return [key] + [f"{key}::{i}" for i in range(1, int(chunks or 0) + 1)]
+
+def _evict_weeks(index: Dict[str, Dict[str, Any]], keep: str, removals: Dict[str, Optional[str]]) -> Dict[str, Dict[str, Any]]:
+    """Desaloja por LRU hasta respetar WEEK_CACHE_MAX_WEEKS y WEEK_CACHE_MAX_CHARS (borrados en `removals`)."""
+    orden = sorted((k for k in index if k != keep), key=lambda k: index[k].get("last_used", 0))
+    total = sum(int(e.get("size", 0)) for e in index.values())
+    while orden and (len(index) > WEEK_CACHE_MAX_WEEKS or total > WEEK_CACHE_MAX_CHARS):
+        viejo = orden.pop(0)
+        entrada = index.pop(viejo)
+        total -= int(entrada.get("size", 0))
+        removals.update(dict.fromkeys(_week_entry_keys(viejo, entrada.get("chunks", 0))))
+    return index
+
+def _read_week_header(key: str) -> Optional[Dict[str, Any]]:
+    header = _load_json(key, None)
+    if not isinstance(header, dict):
+        return None
+    if header.get("__mpwc") != WEEK_CACHE_FORMAT:
+        # Formato v1: el doc de la semana guardado tal cual
+        return {"__mpwc": 1, "legacy": header}
+    return header
+
+def get_cached_week_meta(normalized_email: str, monday_str: str) -> Optional[Dict[str, Any]]:
+    """Encabezado de la semana cacheada (`update_time`, `saved`, ...) sin decodificar el payload."""
+    header = _read_week_header(week_cache_key(normalized_email, monday_str))
+    if header is None:
+        return None
+    return {k: v for k, v in header.items() if k not in ("data", "legacy")}
+
+def is_cached_week_current(normalized_email: str, monday_str: str, update_time: Optional[str]) -> bool:
+    """True si la copia local corresponde a ese `update_time` y no hace falta re-descargar."""
+    meta = get_cached_week_meta(normalized_email, monday_str)
+    return bool(meta and update_time and meta.get("update_time") == update_time)
+
 def get_cached_week(normalized_email: str, monday_str: str) -> Optional[Dict[str, Any]]:
-    return _load_json(week_cache_key(normalized_email, monday_str), None)
+    key = week_cache_key(normalized_email, monday_str)
+    header = _read_week_header(key)
+    if header is None:
+        return None
+    if header.get("__mpwc") == 1:
+        return header["legacy"]
+    try:
+        chunks = int(header.get("chunks") or 0)
+        if chunks:
+            partes = list(get_many(_week_entry_keys(key, chunks)[1:]).values())
+            if any(p is None for p in partes):
+                return None
+            payload = "".join(partes)
+        else:
+            payload = header.get("data") or ""
+        data = _decode_week(header.get("enc", "j"), payload)
+    except Exception:
+        return None
+
+    index = _load_week_index()
+    ahora = int(time.time())
+    # Precisión de un minuto basta para el LRU y evita escribir en cada lectura
+    if key in index and ahora - int(index[key].get("last_used", 0)) >= 60:
+        index[key]["last_used"] = ahora
+        _save_json(KEY_WEEK_CACHE_INDEX, index)
+    return data
+
+def set_cached_week(
+    normalized_email: str,
+    monday_str: str,
+    week_data: Dict[str, Any],
+    update_time: Optional[str] = None,
+    compress: bool = True,
+):
+    """Guarda la semana compacta (y comprimida si conviene), en trozos si es grande.
+
+    `update_time` (ver `update_time_str`) permite luego saltarse la descarga si el doc
+    no cambió (`is_cached_week_current`).
+    """
+    key = week_cache_key(normalized_email, monday_str)
+    enc, payload = _encode_week(compact_week(week_data), compress)
+    index = _load_week_index()
+    previo = index.get(key) or {}
 
-def set_cached_week(normalized_email: str, monday_str: str, week_data: Dict[str, Any]):
-    _save_json(week_cache_key(normalized_email, monday_str), week_data)
+    header: Dict[str, Any] = {
+        "__mpwc": WEEK_CACHE_FORMAT,
+        "enc": enc,
+        "chunks": 0,
+        "update_time": update_time or "",
+        "saved": int(time.time()),
+        "data": "",
+    }
+    writes: Dict[str, Optional[str]] = {}
+    if len(payload) > WEEK_CACHE_CHUNK_CHARS:
+        partes = [payload[i:i + WEEK_CACHE_CHUNK_CHARS] for i in range(0, len(payload), WEEK_CACHE_CHUNK_CHARS)]
+        for i, parte in enumerate(partes, start=1):
+            writes[f"{key}::{i}"] = parte
+        header["chunks"] = len(partes)
+    else:
+        header["data"] = payload
+    writes[key] = json.dumps(header, ensure_ascii=False, separators=(",", ":"))
+    # Trozos sobrantes de una versión anterior más grande
+    for i in range(header["chunks"] + 1, int(previo.get("chunks", 0)) + 1):
+        writes[f"{key}::{i}"] = None
+
+    index[key] = {"last_used": int(time.time()), "size": len(payload), "chunks": header["chunks"]}
+    index = _evict_weeks(index, keep=key, removals=writes)
+    writes[KEY_WEEK_CACHE_INDEX] = json.dumps(index, ensure_ascii=False)
+    try:
+        set_many(writes)
+    except Exception:
+        pass
 
 # ========= Cola de mutaciones =========
-# { "id": "...", "ts": 1712345678901, "op": "update_doc", "doc_path": "col/doc", "data": {...}, "merge": true }
+# { "id": "...", "ids": ["..."], "ts": 1712345678901, "op": "update_doc", "doc_path": "col/doc", "data": {...}, "merge": true,
+#   "base_update_time": "2024-...Z", "base": {"campo.sub": valor_previo}, "conflict": "local" | "server" }
+# ops: update_doc, create_doc, delete_doc, array_union (campo + values).
+# `ids` lista las mutaciones originales que quedaron plegadas en esta (ver coalesce_mutations).
+# `base_update_time`/`base` son opcionales: con ellos la réplica detecta qué campos cambió
+# otro usuario mientras tanto y resuelve campo a campo según `conflict` (por defecto "local").
+_SS_MUTATION_QUEUE = "_mp_mutation_queue"
+TRANSFORM_KEY = "__transform__"
+
+# ========= Transformaciones de campo (serializables en JSON) =========
+def increment(value: float) -> Dict[str, Any]:
+    return {TRANSFORM_KEY: "increment", "value": value}
+
+def array_union(*values: Any) -> Dict[str, Any]:
+    return {TRANSFORM_KEY: "array_union", "values": list(values)}
+
+def array_remove(*values: Any) -> Dict[str, Any]:
+    return {TRANSFORM_KEY: "array_remove", "values": list(values)}
+
+def server_timestamp() -> Dict[str, Any]:
+    return {TRANSFORM_KEY: "server_timestamp"}
+
+def is_transform(value: Any) -> bool:
+    return isinstance(value, dict) and TRANSFORM_KEY in value
+
+def flatten_fields(data: Dict[str, Any], prefix: Tuple[str, ...] = ()) -> List[Tuple[Tuple[str, ...], Any]]:
+    """Hojas de un payload anidado como (ruta, valor); las transformaciones cuentan como hoja."""
+    out: List[Tuple[Tuple[str, ...], Any]] = []
+    for k, v in data.items():
+        ruta = prefix + (str(k),)
+        if isinstance(v, dict) and v and not is_transform(v):
+            out.extend(flatten_fields(v, ruta))
+        else:
+            out.append((ruta, v))
+    return out
+
+def field_key(ruta: Tuple[str, ...]) -> str:
+    # Clave estable para `base`; la réplica la convierte en FieldPath.
+    return json.dumps(list(ruta), ensure_ascii=False)
+
+def _merge_leaf(prev: Any, new: Any) -> Any:
+    """Pliega dos escrituras sucesivas sobre el mismo campo."""
+    if is_transform(new):
+        kind = new[TRANSFORM_KEY]
+        if kind == "increment":
+            if is_transform(prev) and prev[TRANSFORM_KEY] == "increment":
+                return increment(prev["value"] + new["value"])
+            if isinstance(prev, (int, float)) and not isinstance(prev, bool):
+                return prev + new["value"]
+        elif kind == "array_union":
+            if is_transform(prev) and prev[TRANSFORM_KEY] == "array_union":
+                return array_union(*prev["values"], *[v for v in new["values"] if v not in prev["values"]])
+            if isinstance(prev, list):
+                return prev + [v for v in new["values"] if v not in prev]
+        elif kind == "array_remove":
+            if is_transform(prev) and prev[TRANSFORM_KEY] == "array_remove":
+                return array_remove(*prev["values"], *[v for v in new["values"] if v not in prev["values"]])
+            if isinstance(prev, list):
+                return [v for v in prev if v not in new["values"]]
+    return copy.deepcopy(new)
+
+def _transformaciones_chocan(prev: Dict[str, Any], new: Dict[str, Any]) -> bool:
+    """True si `new` aplica sobre algún campo una transformación distinta a la pendiente en `prev`.
+
+    Dos transformaciones de distinto tipo (array_union y luego array_remove,
+    server_timestamp y luego increment) no se pueden expresar como una sola.
+    """
+    for ruta, valor in flatten_fields(new):
+        if not is_transform(valor):
+            continue
+        previo = get_path(prev, ruta)
+        if is_transform(previo) and previo[TRANSFORM_KEY] != valor[TRANSFORM_KEY]:
+            return True
+    return False
+
+def _deep_merge(base: Dict[str, Any], extra: Dict[str, Any]) -> Dict[str, Any]:
+    """Mezcla `extra` sobre `base` como lo haría `set(..., merge=True)` en Firestore."""
+    out = dict(base)
+    for k, v in extra.items():
+        prev = out.get(k)
+        if isinstance(v, dict) and isinstance(prev, dict) and not is_transform(v) and not is_transform(prev):
+            out[k] = _deep_merge(prev, v)
+        else:
+            out[k] = _merge_leaf(prev, v)
+    return out
+
+def get_path(doc: Dict[str, Any], ruta: Tuple[str, ...]) -> Any:
+    actual: Any = doc
+    for parte in ruta:
+        if not isinstance(actual, dict) or parte not in actual:
+            return None
+        actual = actual[parte]
+    return actual
+
+def update_time_str(ts) -> str:
+    """`update_time` de un snapshot como texto (RFC 3339 con nanosegundos), para `base_update_time`."""
+    if ts is None:
+        return ""
+    rfc = getattr(ts, "rfc3339", None)
+    return rfc() if callable(rfc) else ts.isoformat()
+
+def build_update(
+    doc_path: str,
+    data: Dict[str, Any],
+    base_doc: Optional[Dict[str, Any]] = None,
+    base_update_time: Optional[str] = None,
+    merge: bool = True,
+    conflict: str = "local",
+) -> Dict[str, Any]:
+    """Mutación `update_doc`; con `base_doc` guarda el valor previo de cada campo tocado."""
+    m: Dict[str, Any] = {"op": "update_doc", "doc_path": doc_path, "data": data, "merge": merge, "conflict": conflict}
+    if base_update_time:
+        m["base_update_time"] = base_update_time
+    if base_doc is not None:
+        m["base"] = {
+            field_key(ruta): get_path(base_doc, ruta)
+            for ruta, valor in flatten_fields(data)
+            if not is_transform(valor)
+        }
+    return m
+
+def build_create(doc_path: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    return {"op": "create_doc", "doc_path": doc_path, "data": data}
+
+def build_delete(doc_path: str, base_update_time: Optional[str] = None, conflict: str = "local") -> Dict[str, Any]:
+    m: Dict[str, Any] = {"op": "delete_doc", "doc_path": doc_path, "conflict": conflict}
+    if base_update_time:
+        m["base_update_time"] = base_update_time
+    return m
+
+def build_array_union(doc_path: str, field: str, values: List[Any]) -> Dict[str, Any]:
+    return {"op": "array_union", "doc_path": doc_path, "field": field, "values": list(values)}
+
+def mutation_ids(m: Dict[str, Any]) -> List[str]:
+    ids = m.get("ids") or ([m["id"]] if m.get("id") else [])
+    return [str(i) for i in ids]
+
+def coalesce_mutations(queue: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Pliega `update_doc` consecutivos sobre el mismo `doc_path` en una sola mutación.
+
+    - update (merge) tras update: se mezclan en profundidad (incrementos se suman,
+      array_union/array_remove se unen); conserva el `merge` y la base del primero.
+    - update sin merge (sobrescritura) tras update: reemplaza al anterior.
+    Cualquier otra op sobre el path corta la cadena, igual que un campo con dos
+    transformaciones de distinto tipo o una mutación ya `enviada` (pudo llegar a Firestore: plegarle otra haría que un reintento
+    aplicara dos veces sus incrementos). Se conserva el orden de la cola.
+    """
+    out: List[Dict[str, Any]] = []
+    last_idx: Dict[str, int] = {}
+    for m in queue:
+        path = m.get("doc_path")
+        idx = last_idx.get(path) if path else None
+        prev = out[idx] if idx is not None else None
+        if (
+            prev is not None
+            and prev.get("op") == "update_doc"
+            and m.get("op") == "update_doc"
+            and not prev.get("enviada")
+            and not m.get("enviada")
+            and not (
+                bool(m.get("merge", True))
+                and _transformaciones_chocan(prev.get("data") or {}, m.get("data") or {})
+            )
+        ):
+            ids = mutation_ids(prev) + mutation_ids(m)
+            if bool(m.get("merge", True)):
+                merged = dict(prev)
+                merged["data"] = _deep_merge(prev.get("data") or {}, m.get("data") or {})
+                if prev.get("base") is not None or m.get("base") is not None:
+                    # El valor previo que vale es el anterior a la primera edición.
+                    merged["base"] = {**(m.get("base") or {}), **(prev.get("base") or {})}
+            else:
+                merged = dict(m)
+                merged["id"] = prev.get("id") or m.get("id")
+                for campo in ("base_update_time", "base"):
+                    if campo in prev:
+                        merged[campo] = prev[campo]
+            merged["ids"] = ids
+            merged["ts"] = m.get("ts", prev.get("ts"))
+            out[idx] = merged
+            continue
+        out.append(dict(m))
+        if path:
+            last_idx[path] = len(out) - 1
+    return out
+
+def _queue_state() -> List[Dict[str, Any]]:
+    # Copia en sesión: evita releer y parsear el JSON de localStorage en cada enqueue.
+    if _SS_MUTATION_QUEUE not in st.session_state:
+        st.session_state[_SS_MUTATION_QUEUE] = _load_json(KEY_MUTATION_QUEUE, [])
+    return st.session_state[_SS_MUTATION_QUEUE]
+
 def enqueue_mutation(mutation: Dict[str, Any]):
-    queue: List[Dict[str, Any]] = _load_json(KEY_MUTATION_QUEUE, [])
-    queue.append(mutation)
+    m = dict(mutation)
+    m.setdefault("id", uuid.uuid4().hex)
+    m.setdefault("ts", int(time.time() * 1000))
+    queue = coalesce_mutations(_queue_state() + [m])
+    st.session_state[_SS_MUTATION_QUEUE] = queue
     _save_json(KEY_MUTATION_QUEUE, queue)
 
 def peek_mutations() -> List[Dict[str, Any]]:
-    return _load_json(KEY_MUTATION_QUEUE, [])
+    return list(_queue_state())
 
 def replace_mutations(new_queue: List[Dict[str, Any]]):
+    st.session_state[_SS_MUTATION_QUEUE] = list(new_queue)
     _save_json(KEY_MUTATION_QUEUE, new_queue)
 
 def set_last_sync_ok():
@@ -1,33 +1,223 @@
 # offline_sync.py
 import time
+import uuid
+from datetime import datetime, timedelta, timezone
 from typing import Dict, Any, List, Tuple
 import streamlit as st
 import firebase_admin
 from firebase_admin import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from app_core.firebase_client import get_db
 
 from offline_storage import (
-    peek_mutations, replace_mutations, set_last_sync_ok, is_offline
+    peek_mutations, replace_mutations, set_last_sync_ok, is_offline,
+    coalesce_mutations, mutation_ids,
+    TRANSFORM_KEY, is_transform, flatten_fields, field_key, get_path, update_time_str,
 )
 
-# === Conector Firestore (Admin SDK) ===
-def get_db():
-    # Ya lo inicializas en tu app principal; solo usa firestore.client()
-    return firestore.client()
+# Recibos de mutaciones ya aplicadas: hacen idempotente el reintento si el commit
+# llegó a Firestore pero la respuesta (o el vaciado de la cola) se perdió.
+RECEIPTS_COLLECTION = "offline_mutaciones_aplicadas"
+RECEIPT_TTL_DAYS = 30
+# Cada mutación ocupa su escritura + la de su recibo; WriteBatch admite 500.
+MAX_WRITES_PER_BATCH = 500
+
+CONFLICTS_STATE_KEY = "offline_sync_conflicts"
+
+def _materialize(value: Any) -> Any:
+    """Convierte los marcadores JSON de offline_storage en transformaciones de Firestore."""
+    if is_transform(value):
+        kind = value[TRANSFORM_KEY]
+        if kind == "increment":
+            return firestore.Increment(value.get("value", 0))
+        if kind == "array_union":
+            return firestore.ArrayUnion(list(value.get("values") or []))
+        if kind == "array_remove":
+            return firestore.ArrayRemove(list(value.get("values") or []))
+        if kind == "server_timestamp":
+            return firestore.SERVER_TIMESTAMP
+        raise ValueError(f"Transformación desconocida: {kind}")
+    if isinstance(value, dict):
+        return {k: _materialize(v) for k, v in value.items()}
+    return value
+
+def _field_path(ruta) -> str:
+    return FieldPath(*ruta).to_api_repr()
+
+def _resolve_fields(m: Dict[str, Any], current: Dict[str, Any], conflicts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Campos a escribir cuando el doc cambió desde `base_update_time`.
+
+    Un campo sin conflicto (el servidor sigue con el valor base, o ya tiene el nuestro)
+    se escribe; las transformaciones conmutan y siempre se aplican. Si otro usuario
+    cambió el mismo campo, decide `conflict`: "local" escribe el nuestro, "server" lo deja.
+    """
+    base = m.get("base") or {}
+    policy = m.get("conflict", "local")
+    resolved: Dict[str, Any] = {}
+    for ruta, valor in flatten_fields(m.get("data") or {}):
+        if is_transform(valor):
+            resolved[_field_path(ruta)] = _materialize(valor)
+            continue
+        key = field_key(ruta)
+        server_val = get_path(current, ruta)
+        if key not in base or server_val == base[key] or server_val == valor:
+            resolved[_field_path(ruta)] = valor
+            continue
+        conflicts.append({
+            "doc_path": m.get("doc_path"),
+            "campo": ".".join(ruta),
+            "local": valor,
+            "servidor": server_val,
+            "gana": policy,
+        })
+        if policy != "server":
+            resolved[_field_path(ruta)] = valor
+    return resolved
+
+def _apply_mutation(db, m: Dict[str, Any], batch=None, snaps: Dict[str, Any] = None,
+                    conflicts: List[Dict[str, Any]] = None):
+    """Aplica UNA mutación contra Firestore (dentro de `batch` si se entrega).
 
-def _apply_mutation(db, m: Dict[str, Any]):
-    """Aplica UNA mutación contra Firestore. Puedes extender con más tipos."""
+    `snaps` trae el estado actual de los docs con precondición (`base_update_time`) o
+    creación; `conflicts` acumula los campos en conflicto detectados. Devuelve False
+    para ops desconocidas.
+    """
     op = m.get("op")
+    snaps = snaps or {}
+    conflicts = conflicts if conflicts is not None else []
+    w = batch if batch is not None else db.batch()
+    doc_path = m.get("doc_path", "")
+    doc_ref = _doc_ref_from_path(db, doc_path)
+    snap = snaps.get(doc_path)
+    base_time = m.get("base_update_time")
+
     if op == "update_doc":
-        doc_path = m["doc_path"]            # p.ej. "rutinas_semanales/abc123"
         data     = m.get("data", {})
         merge    = bool(m.get("merge", True))
-        doc_ref  = _doc_ref_from_path(db, doc_path)
-        # Last-write-wins (tu app define las reglas; aquí un update/merge simple)
-        doc_ref.set(data, merge=merge)
-        return True
+        if not base_time or snap is None:
+            # Last-write-wins (sin base conocida)
+            w.set(doc_ref, _materialize(data), merge=merge)
+        elif not snap.exists:
+            conflicts.append({"doc_path": doc_path, "campo": "*", "local": "update", "servidor": "borrado",
+                              "gana": m.get("conflict", "local")})
+            if m.get("conflict", "local") != "server":
+                w.set(doc_ref, _materialize(data), merge=merge)
+        elif update_time_str(snap.update_time) == base_time:
+            # Nadie tocó el doc: se aplica tal cual, con precondición por si cambia ahora
+            option = db.write_option(last_update_time=snap.update_time)
+            if merge:
+                campos = {_field_path(r): _materialize(v) for r, v in flatten_fields(data)}
+                if campos:
+                    w.update(doc_ref, campos, option=option)
+            else:
+                w.set(doc_ref, _materialize(data))
+        else:
+            resolved = _resolve_fields(m, snap.to_dict() or {}, conflicts)
+            if resolved:
+                w.update(doc_ref, resolved, option=db.write_option(last_update_time=snap.update_time))
+    elif op == "create_doc":
+        if snap is not None and snap.exists:
+            # Ya existe (p. ej. otro dispositivo lo creó): no se pisa
+            conflicts.append({"doc_path": doc_path, "campo": "*", "local": "create", "servidor": "existe",
+                              "gana": "server"})
+        else:
+            w.create(doc_ref, _materialize(m.get("data", {})))
+    elif op == "delete_doc":
+        if snap is not None and not snap.exists:
+            pass  # ya borrado
+        elif base_time and snap is not None and update_time_str(snap.update_time) != base_time:
+            conflicts.append({"doc_path": doc_path, "campo": "*", "local": "delete", "servidor": "modificado",
+                              "gana": m.get("conflict", "local")})
+            if m.get("conflict", "local") != "server":
+                w.delete(doc_ref)
+        elif snap is not None and base_time:
+            w.delete(doc_ref, option=db.write_option(last_update_time=snap.update_time))
+        else:
+            w.delete(doc_ref)
+    elif op == "array_union":
+        ruta = tuple(str(m.get("field", "")).split("."))
+        payload: Dict[str, Any] = firestore.ArrayUnion(list(m.get("values") or []))
+        for parte in reversed(ruta):
+            payload = {parte: payload}
+        w.set(doc_ref, payload, merge=True)
     else:
-        # futuros tipos: "delete_doc", "create_doc", "array_union", etc.
         return False
+    if batch is None:
+        w.commit()
+    return True
+
+def _sin_incrementos(data: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """Copia de `data` sin los `increment` (los únicos transforms no idempotentes)."""
+    limpio: Dict[str, Any] = {}
+    quitados: List[str] = []
+    for k, v in data.items():
+        if is_transform(v) and v[TRANSFORM_KEY] == "increment":
+            quitados.append(k)
+        elif isinstance(v, dict) and not is_transform(v):
+            sub, sub_quitados = _sin_incrementos(v)
+            limpio[k] = sub
+            quitados.extend(f"{k}.{q}" for q in sub_quitados)
+        else:
+            limpio[k] = v
+    return limpio, quitados
+
+def _pendiente(m: Dict[str, Any], applied: set, conflicts: List[Dict[str, Any]]):
+    """La mutación a reintentar, o None si todos sus ids ya tienen recibo.
+
+    Si solo parte de los ids plegados tiene recibo (colas anteriores a la marca
+    `enviada`), el resto no se puede separar: se reaplica sin los incrementos,
+    que se sumarían dos veces, y se informa como conflicto.
+    """
+    ids = set(mutation_ids(m))
+    if ids <= applied:
+        return None
+    if not ids & applied or m.get("op") != "update_doc":
+        return m
+    data, quitados = _sin_incrementos(m.get("data") or {})
+    for campo in quitados:
+        conflicts.append({"doc_path": m.get("doc_path"), "campo": campo, "local": "increment",
+                          "servidor": "aplicado en parte", "gana": "server"})
+    return {**m, "data": data}
+
+def _needs_snapshot(m: Dict[str, Any]) -> bool:
+    return m.get("op") == "create_doc" or (
+        m.get("op") in ("update_doc", "delete_doc") and bool(m.get("base_update_time"))
+    )
+
+def _current_snapshots(db, queue: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Estado actual (un solo get_all) de los docs que lo necesitan para resolver conflictos."""
+    paths = list(dict.fromkeys(m["doc_path"] for m in queue if _needs_snapshot(m) and m.get("doc_path")))
+    if not paths:
+        return {}
+    refs = [_doc_ref_from_path(db, p) for p in paths]
+    por_ruta = {ref.path: p for ref, p in zip(refs, paths)}
+    return {por_ruta.get(snap.reference.path, snap.reference.path): snap for snap in db.get_all(refs)}
+
+def last_sync_conflicts() -> List[Dict[str, Any]]:
+    """Campos en conflicto detectados en la última sincronización."""
+    return list(st.session_state.get(CONFLICTS_STATE_KEY, []))
+
+def _writes_for(m: Dict[str, Any]) -> int:
+    # 1 escritura de la mutación + 1 recibo por cada id plegado en ella
+    return 1 + max(1, len(mutation_ids(m)))
+
+def _applied_ids(db, ids: List[str]) -> set:
+    if not ids:
+        return set()
+    col = db.collection(RECEIPTS_COLLECTION)
+    return {snap.id for snap in db.get_all([col.document(i) for i in ids]) if snap.exists}
+
+def _add_receipts(db, batch, m: Dict[str, Any]):
+    col = db.collection(RECEIPTS_COLLECTION)
+    expira = datetime.now(timezone.utc) + timedelta(days=RECEIPT_TTL_DAYS)
+    for mid in mutation_ids(m):
+        batch.set(col.document(mid), {
+            "doc_path": m.get("doc_path", ""),
+            "op": m.get("op", ""),
+            "aplicada_en": firestore.SERVER_TIMESTAMP,
+            "expira_en": expira,  # para una política TTL en Firestore
+        })
 
 def _doc_ref_from_path(db, path: str):
     # path "col/doc/col/doc" -> navegar dinámico
@@ -43,8 +233,32 @@ def _doc_ref_from_path(db, path: str):
             ref = ref.collection(col).document(doc)
     return ref
 
+def _chunks(queue: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    chunks: List[List[Dict[str, Any]]] = []
+    actual: List[Dict[str, Any]] = []
+    writes = 0
+    for m in queue:
+        w = _writes_for(m)
+        if actual and writes + w > MAX_WRITES_PER_BATCH:
+            chunks.append(actual)
+            actual, writes = [], 0
+        actual.append(m)
+        writes += w
+    if actual:
+        chunks.append(actual)
+    return chunks
+
 def try_sync_now() -> Tuple[int, int]:
-    """Intenta sincronizar toda la cola. Devuelve (ok, fail)."""
+    """Intenta sincronizar toda la cola. Devuelve (ok, fail).
+
+    La cola se pliega (coalesce_mutations) y se aplica en WriteBatch de hasta 500
+    escrituras, cada mutación junto con su recibo. Las ya recibidas se descartan
+    sin reescribirlas; antes del primer commit se marcan como `enviada` para que
+    las ediciones posteriores no se plieguen en ellas. Si un lote falla (p. ej. porque una precondición de
+    `update_time` dejó de cumplirse), él y los siguientes quedan en la cola y se
+    resuelven contra el estado nuevo en el próximo intento. Los conflictos por
+    campo quedan en `last_sync_conflicts()`.
+    """
     if is_offline():
         return (0, 0)
 
@@ -53,19 +267,64 @@ def try_sync_now() -> Tuple[int, int]:
     if not queue:
         return (0, 0)
 
+    for m in queue:
+        if not m.get("id") and not m.get("ids"):
+            m["id"] = uuid.uuid4().hex
+    try:
+        applied = _applied_ids(db, [i for m in queue for i in mutation_ids(m)])
+    except Exception:
+        # Sin red no hay nada que hacer; se reintenta más tarde
+        return (0, len(queue))
+    conflicts: List[Dict[str, Any]] = []
+    pending = [p for p in (_pendiente(m, applied, conflicts) for m in queue) if p is not None]
+    pending = coalesce_mutations(pending)
+    try:
+        snaps = _current_snapshots(db, pending)
+    except Exception:
+        return (0, len(queue))
+    # Desde aquí pueden llegar a Firestore: no se les pliegan ediciones nuevas.
+    for m in pending:
+        m["enviada"] = True
+    replace_mutations(pending)
+
     ok = 0
     fail = 0
     new_queue: List[Dict[str, Any]] = []
-    for m in queue:
+    lote_fallido = False
+    for chunk in _chunks(pending):
+        if lote_fallido:
+            # Un lote anterior falló: conservar el orden, no aplicar los siguientes
+            new_queue.extend(chunk)
+            fail += len(chunk)
+            continue
+        batch = db.batch()
+        aplicables = []
+        for m in chunk:
+            try:
+                aplicada = _apply_mutation(db, m, batch, snaps, conflicts)
+            except Exception:
+                # Mutación que no se pudo preparar (p. ej. datos inválidos): se conserva
+                # en la cola sin frenar al resto.
+                aplicada = False
+            if aplicada:
+                _add_receipts(db, batch, m)
+                aplicables.append(m)
+            else:
+                # op desconocida o fallida: se conserva para reintentarla más adelante
+                new_queue.append(m)
+                fail += 1
         try:
-            _apply_mutation(db, m)
-            ok += 1
+            if aplicables:
+                batch.commit()
+            ok += len(aplicables)
         except Exception as e:
             # Si falla por red o conflicto, lo reintentamos más tarde
-            new_queue.append(m)
-            fail += 1
+            new_queue.extend(aplicables)
+            fail += len(aplicables)
+            lote_fallido = True
 
     replace_mutations(new_queue)
+    st.session_state[CONFLICTS_STATE_KEY] = conflicts
     if fail == 0:  # todo OK
         set_last_sync_ok()
     return (ok, fail)
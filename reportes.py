@@ -1,12 +1,15 @@
 # reportes.py — Reportes + Resumen "Semana X de Y" por bloque
 import streamlit as st
 import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import credentials
 from datetime import datetime, timedelta, date
 import json, re
 import pandas as pd
 from collections import defaultdict
 
+from app_core.data_access import fechas_de_bloques
+from app_core.firebase_client import get_db
+
 DIAS_VALIDOS = {"1","2","3","4","5"}
 
 def _doc_id_from_mail(mail: str) -> str:
@@ -109,7 +112,7 @@ def ver_reportes():
     st.title("📊 Reportes de Sesión (agrupados)")
 
     init_firebase()
-    db = firestore.client()
+    db = get_db()
 
     correo_entrenador = st.session_state.get("correo", "").strip().lower()
     if not correo_entrenador:
@@ -163,21 +166,8 @@ def ver_reportes():
     for c_mail, b_id, c_nombre in pares:
         pares_unicos[(c_mail, b_id)] = c_nombre  # conserva último nombre
 
-    # cache de fechas por (correo_cliente, bloque_id)
-    fechas_por_bloque = {}
-    for (c_mail, b_id), c_nombre in pares_unicos.items():
-        q = (
-            col.where("correo", "==", c_mail)
-               .where("bloque_rutina", "==", b_id)
-        )
-        semanas_bloque = list(q.stream())
-        fechas = []
-        for r in semanas_bloque:
-            dct = r.to_dict() or {}
-            f = dct.get("fecha_lunes") or parse_fecha_de_id(r.id)
-            if f: fechas.append(f)
-        fechas = sorted(set(fechas))
-        fechas_por_bloque[(c_mail, b_id)] = fechas
+    # fechas por (correo_cliente, bloque_id): consultas por lotes de bloques, no una por cliente
+    fechas_por_bloque = fechas_de_bloques(pares_unicos)
 
     # construir avance por cada doc de esta semana
     for d in docs:
@@ -6,8 +6,8 @@
 
 import streamlit as st
 from datetime import datetime, date, timedelta
-from io import BytesIO
-import matplotlib.pyplot as plt
+from concurrent.futures import Future
+from matplotlib.figure import Figure
 import textwrap
 import json
 import unicodedata
@@ -16,6 +16,8 @@ import unicodedata
 import firebase_admin
 from firebase_admin import credentials, firestore
 
+from app_core import tarjetas_resumen
+
 # ==========================
 #  Utilidades generales
 # ==========================
@@ -178,7 +180,7 @@ def generar_tarjeta_resumen(
     dia_semana: str,
     ejercicios: list[dict],
     gym_name: str = "Motion Performance",
-) -> plt.Figure:
+) -> Figure:
     """
     Crea un gráfico tipo "tarjeta Strava" con:
       - Encabezado con marca
@@ -187,6 +189,37 @@ def generar_tarjeta_resumen(
       - Totales de la sesión
       - Mensaje motivacional
     """
+    fig, ax = tarjetas_resumen.nueva_figura()
+    _dibujar_tarjeta(ax, nombre, fecha_sesion, dia_semana, ejercicios, gym_name)
+    return fig
+
+def tarjeta_resumen_png(
+    nombre: str,
+    fecha_sesion: date,
+    dia_semana: str,
+    ejercicios: list[dict],
+    gym_name: str = "Motion Performance",
+    persistir: bool = False,
+) -> Future:
+    """
+    PNG de la tarjeta renderizado en segundo plano y memorizado por contenido
+    (ver `app_core.tarjetas_resumen`); `.result()` devuelve los bytes.
+    """
+    contenido = {
+        "nombre": nombre,
+        "fecha": fecha_sesion,
+        "dia": dia_semana,
+        "ejercicios": ejercicios,
+        "gym": gym_name,
+    }
+    return tarjetas_resumen.solicitar(
+        "strava",
+        contenido,
+        lambda fig, ax: _dibujar_tarjeta(ax, nombre, fecha_sesion, dia_semana, ejercicios, gym_name),
+        persistir=persistir,
+    )
+
+def _dibujar_tarjeta(ax, nombre, fecha_sesion, dia_semana, ejercicios, gym_name):
     # Totales
     total_series = 0
     total_reps = 0
@@ -199,9 +232,6 @@ def generar_tarjeta_resumen(
         total_reps += s * r
         total_peso += s * r * p
 
-    fig, ax = plt.subplots(figsize=(6, 8), dpi=200)
-    ax.axis("off")
-
     # Encabezado marca
     ax.text(
         0.5, 0.96, gym_name,
@@ -258,19 +288,17 @@ def generar_tarjeta_resumen(
     ax.text(0.07, y, f"• Repeticiones: {total_reps}", fontsize=11, ha="left"); y -= 0.028
     ax.text(0.07, y, f"• Volumen estimado: {total_peso:g} kg", fontsize=11, ha="left"); y -= 0.02
 
-    # Mensaje motivacional
-    frase = random_mensaje(nombre or "Atleta")
+    # Mensaje motivacional (fijo por sesión: la tarjeta se memoriza por contenido)
+    frase = random_mensaje(nombre or "Atleta", semilla=f"{nombre}|{fecha_sesion}|{dia_semana}")
     ax.text(0.5, 0.08, frase, fontsize=10.5, ha="center", style="italic")
 
     # Pie
     ax.text(0.5, 0.04, "Comparte tu progreso 📸", fontsize=9, ha="center")
 
-    fig.tight_layout()
-    return fig
-
-def random_mensaje(nombre: str) -> str:
+def random_mensaje(nombre: str, semilla: str | None = None) -> str:
     import random
-    frase = random.choice(MENSAJES_MOTIVACIONALES)
+    azar = random.Random(semilla) if semilla is not None else random
+    frase = azar.choice(MENSAJES_MOTIVACIONALES)
     return frase.format(nombre=nombre.split(" ")[0])
 
 # ==========================
@@ -346,26 +374,31 @@ def ui_resumen_strava():
     else:
         st.warning("No se encontraron ejercicios para esa sesión. Puedes probar con datos de ejemplo en la barra lateral.")
 
+    # La tarjeta se empieza a dibujar en segundo plano apenas hay ejercicios,
+    # así el botón solo muestra el PNG ya listo (o casi). Solo se sube a
+    # Storage cuando el usuario la genera.
+    datos_tarjeta = dict(
+        nombre=nombre,
+        fecha_sesion=fecha_sesion,
+        dia_semana=dia_semana,
+        ejercicios=ejercicios,
+        gym_name=gym_name
+    )
+    if ejercicios:
+        tarjeta_resumen_png(**datos_tarjeta)
+
     # Botón generar imagen
     generar = st.button("📸 Generar imagen de resumen", use_container_width=True)
 
     if generar and ejercicios:
-        fig = generar_tarjeta_resumen(
-            nombre=nombre,
-            fecha_sesion=fecha_sesion,
-            dia_semana=dia_semana,
-            ejercicios=ejercicios,
-            gym_name=gym_name
-        )
-        st.pyplot(fig, clear_figure=False)
+        with st.spinner("Generando imagen…"):
+            png = tarjeta_resumen_png(**datos_tarjeta, persistir=True).result()
+        st.image(png, use_container_width=True)
 
         # Descargar como PNG
-        buf = BytesIO()
-        fig.savefig(buf, format="png", bbox_inches="tight")
-        buf.seek(0)
         st.download_button(
             "⬇️ Descargar PNG",
-            data=buf,
+            data=png,
             file_name=f"resumen_{normalizar_correo(nombre or 'atleta')}_{fecha_sesion.isoformat()}.png",
             mime="image/png",
             use_container_width=True
@@ -6,6 +6,7 @@ from typing import Any, Dict, List, Tuple
 
 import streamlit as st
 
+from app_core import users_service
 from app_core.firebase_client import get_db
 
 
@@ -51,33 +52,25 @@ def _limpiar_empresa(valor: str | None) -> str:
     return (valor or "").strip().title()
 
 
-@st.cache_data(ttl=180)
 def _listar_deportistas() -> List[Dict[str, str]]:
-    db = get_db()
     usuarios: List[Dict[str, str]] = []
-    try:
-        snaps = db.collection("usuarios").where("rol", "==", "deportista").stream()
-        for snap in snaps:
-            data = snap.to_dict() or {}
-            correo = (data.get("correo") or "").strip().lower()
-            if not correo:
-                continue
-            nombre = (
-                data.get("nombre")
-                or data.get("primer_nombre")
-                or data.get("Nombre")
-                or correo.split("@")[0]
-            )
-            usuarios.append(
-                {
-                    "correo": correo,
-                    "nombre": nombre.strip() or correo,
-                    "empresa": _limpiar_empresa(data.get("empresa") or data.get("empresa_id")),
-                }
-            )
-    except Exception as exc:
-        st.error(f"No se pudieron cargar los deportistas: {exc}")
-        return []
+    for data in users_service.por_rol("deportista"):
+        correo = data.get("_correo_norm")
+        if not correo:
+            continue
+        nombre = (
+            data.get("nombre")
+            or data.get("primer_nombre")
+            or data.get("Nombre")
+            or correo.split("@")[0]
+        )
+        usuarios.append(
+            {
+                "correo": correo,
+                "nombre": nombre.strip() or correo,
+                "empresa": _limpiar_empresa(data.get("empresa") or data.get("empresa_id")),
+            }
+        )
 
     usuarios.sort(key=lambda item: (item["nombre"].lower(), item["correo"]))
     return usuarios
@@ -4,8 +4,9 @@ import io
 import re
 import streamlit as st
 import firebase_admin
-from firebase_admin import firestore
 
+from app_core import busqueda_ejercicios, catalogo_service
+from app_core.firebase_client import get_db
 from app_core.utils import empresa_de_usuario, EMPRESA_ASESORIA
 
 # ======================
@@ -80,26 +81,26 @@ def _actualizar_privacidad(doc_ids: list[str], publico: bool):
     if not doc_ids:
         return
 
-    db = firestore.client()
+    db = get_db()
     ref = db.collection("ejercicios")
     for lote in _chunked(doc_ids, 400):
         batch = db.batch()
         for doc_id in lote:
             batch.set(ref.document(doc_id), {"publico": publico}, merge=True)
         batch.commit()
+        for doc_id in lote:
+            catalogo_service.registrar_escritura(doc_id, {"publico": publico})
 
 # ======================
 # Lectura con filtros de visibilidad
 # ======================
-@st.cache_data(show_spinner=False, ttl=60)
 def _cargar_ejercicios():
     """
-    Lee colección 'ejercicios' filtrando:
+    Lee el snapshot compartido de 'ejercicios' filtrando:
       - Admin: ve TODOS.
       - No admin: ve (publico == True) + (entrenador == <su_correo>).
     Devuelve lista de dicts para UI.
     """
-    db = firestore.client()  # Firebase ya debe estar inicializado en tu main
     data = []
     correo = _correo_user()
     es_admin = _es_admin()
@@ -107,27 +108,13 @@ def _cargar_ejercicios():
     restringe_privados_por_empresa = (not es_admin) and (empresa == EMPRESA_ASESORIA)
 
     try:
-        if es_admin:
-            docs = db.collection("ejercicios").stream()
-        else:
-            # 1) Públicos
-            pub_docs = list(db.collection("ejercicios").where("publico", "==", True).stream())
-            # 2) Privados del entrenador
-            priv_docs = []
-            if correo:
-                priv_docs = list(db.collection("ejercicios").where("entrenador", "==", correo).stream())
-            # Unir (evitar duplicados por id)
-            by_id = {}
-            for d in pub_docs + priv_docs:
-                if getattr(d, "exists", True):
-                    by_id[d.id] = d
-            docs = by_id.values()
-
-        for d in docs:
-            if not getattr(d, "exists", True):
-                continue
-            row = d.to_dict() or {}
-            row["_id"] = d.id
+        for doc_id, doc_data in catalogo_service.ejercicios_por_id().items():
+            if not es_admin:
+                propio = bool(correo) and (doc_data.get("entrenador") or "").strip().lower() == correo
+                if doc_data.get("publico") is not True and not propio:
+                    continue
+            row = dict(doc_data)
+            row["_id"] = doc_id
             row["nombre"] = row.get("nombre", "")
             row["id_implemento"] = row.get("id_implemento", "")
             # Visibilidad/autor (para UI)
@@ -152,12 +139,14 @@ def _cargar_ejercicios():
     return data
 
 def _guardar_video(doc_id: str, url: str):
-    db = firestore.client()
+    db = get_db()
     db.collection("ejercicios").document(doc_id).update({"video": url})
+    catalogo_service.registrar_escritura(doc_id, {"video": url})
 
 def _quitar_video(doc_id: str):
-    db = firestore.client()
+    db = get_db()
     db.collection("ejercicios").document(doc_id).update({"video": ""})
+    catalogo_service.registrar_escritura(doc_id, {"video": ""})
 
 # ======================
 # UI
@@ -196,12 +185,13 @@ def base_ejercicios():
         placeholder="Ej: sentadilla, polea, db-20…",
         key="search_ej",
     )
-    if q:
-        qn = q.strip().lower()
-        ejercicios = [
-            e for e in ejercicios
-            if qn in e["nombre"].lower() or qn in str(e["id_implemento"]).lower()
-        ]
+    if q.strip():
+        por_id = {e["_id"]: e for e in ejercicios}
+        indice = busqueda_ejercicios.indice_para(
+            ("base", _correo_user(), es_admin, len(ejercicios)),
+            lambda: ((e["_id"], e["nombre"], str(e["id_implemento"])) for e in ejercicios),
+        )
+        ejercicios = [por_id[doc_id] for doc_id in indice.buscar(q)]
 
     modo_privacidad = st.session_state.get("privacidad_modo", False)
     if not modo_privacidad:
@@ -1,15 +1,26 @@
 # seguimiento_entrenamiento.py
 from __future__ import annotations
-import json, re
+import json
 from datetime import datetime, timedelta, date
 
+import numpy as np
 import pandas as pd
 import streamlit as st
 
 from firebase_admin import firestore
+from app_core import users_service
 from app_core.firebase_client import get_db
+from app_core.metricas_semanales import (
+    CATEGORIAS,
+    dia_finalizado,
+    fecha_semana as _fecha_semana,
+    iter_dias_rutina as _iter_dias_rutina,
+    metricas_en_rango,
+    obtener_lista_ejercicios,
+    parse_reps_min,
+)
 from app_core.theme import inject_theme
-from app_core.utils import correo_a_doc_id, usuario_activo
+from app_core.utils import usuario_activo
 
 # =============================
 #  Estilos / Constantes
@@ -32,28 +43,6 @@ def safe_float(x, default=0.0):
     try: return float(x)
     except Exception: return default
 
-def parse_reps_min(value) -> int | None:
-    """Extrae el mínimo de repeticiones desde formatos típicos."""
-    if value is None: return None
-    if isinstance(value, (int, float)):
-        try: return int(value)
-        except Exception: return None
-    if isinstance(value, dict):
-        for k in ("min","reps_min","rep_min","rmin"):
-            if k in value:
-                try: return int(value[k])
-                except Exception: pass
-        if "reps" in value:
-            return parse_reps_min(value["reps"])
-    s = str(value).strip().lower()
-    m = re.match(r"^\s*(\d+)\s*[x×]\s*\d+", s)
-    if m: return int(m.group(1))
-    m = re.match(r"^\s*(\d+)\s*[-–—]\s*(\d+)", s)
-    if m: return int(m.group(1))
-    m = re.match(r"^\s*(\d+)\s*$", s)
-    if m: return int(m.group(1))
-    return None
-
 def clasificar_categoria(reps_min: int | None) -> str:
     """
     Regla:
@@ -70,26 +59,9 @@ def clasificar_categoria(reps_min: int | None) -> str:
 # =============================
 #  Lectura de datos (según tu esquema real)
 # =============================
-def _usuarios_por_correo(db) -> dict[str, dict]:
-    mapping: dict[str, dict] = {}
-    try:
-        for snap in db.collection("usuarios").stream():
-            if not snap.exists:
-                continue
-            data = snap.to_dict() or {}
-            correo_u = normalizar_id(data.get("correo") or "")
-            if not correo_u:
-                continue
-            mapping[correo_u] = data
-            mapping[correo_a_doc_id(correo_u)] = data
-    except Exception:
-        return mapping
-    return mapping
-
-
 def listar_clientes_con_rutinas(db) -> list[str]:
     """Correos únicos desde 'rutinas_semanales' (campo 'correo')."""
-    usuarios_map = _usuarios_por_correo(db)
+    usuarios_map = users_service.get_users_map()
     correos = set()
     for doc in db.collection("rutinas_semanales").limit(1000).stream():
         data = doc.to_dict() or {}
@@ -122,89 +94,24 @@ def listar_evaluaciones_cliente(db, correo: str) -> list[dict]:
     out.sort(key=lambda x: x.get("_fecha_dt") or datetime.min)
     return out
 
-def dia_finalizado(doc_dict: dict, dia_key: str) -> bool:
-    """
-    Día finalizado según tu app:
-      - doc["rutina"][f"{dia}_finalizado"] == True
-    (Se mantiene compatibilidad con mapas alternativos si existieran).
-    """
-    dia_key = str(dia_key)
-    rutina = doc_dict.get("rutina") or {}
-    flag_key = f"{dia_key}_finalizado"
-    if isinstance(rutina, dict) and flag_key in rutina:
-        return bool(rutina.get(flag_key) is True)
-
-    fin_map = doc_dict.get("finalizados")
-    if isinstance(fin_map, dict):
-        val = fin_map.get(dia_key)
-        if isinstance(val, bool):
-            return val
-
-    estado_map = doc_dict.get("estado_por_dia")
-    if isinstance(estado_map, dict):
-        val = str(estado_map.get(dia_key, "")).strip().lower()
-        if val in ("fin","final","finalizado","completado","done"):
-            return True
-
-    alt = doc_dict.get(f"dia_{dia_key}")
-    if isinstance(alt, dict) and "finalizado" in alt:
-        return bool(alt.get("finalizado"))
-
-    return False
-
-def obtener_lista_ejercicios(data_dia):
-    """
-    Normaliza el contenido del día a lista de ejercicios (dicts):
-      - lista directa de dicts
-      - dict con subclave 'ejercicios' (list/dict)
-      - dict con claves numéricas "1","2",...
-    """
-    if data_dia is None: return []
-    # Lista
-    if isinstance(data_dia, list):
-        if len(data_dia) == 1 and isinstance(data_dia[0], dict) and "ejercicios" in data_dia[0]:
-            return obtener_lista_ejercicios(data_dia[0]["ejercicios"])
-        return [e for e in data_dia if isinstance(e, dict)]
-    # Dict
-    if isinstance(data_dia, dict):
-        if "ejercicios" in data_dia:
-            ej = data_dia["ejercicios"]
-            if isinstance(ej, list):
-                return [e for e in ej if isinstance(e, dict)]
-            if isinstance(ej, dict):
-                try:
-                    pares = sorted(ej.items(), key=lambda kv: int(kv[0]))
-                    return [v for _, v in pares if isinstance(v, dict)]
-                except Exception:
-                    return [v for v in ej.values() if isinstance(v, dict)]
-            return []
-        claves_numericas = [k for k in data_dia.keys() if str(k).isdigit()]
-        if claves_numericas:
-            try:
-                pares = sorted(((k, data_dia[k]) for k in claves_numericas), key=lambda kv: int(kv[0]))
-                return [v for _, v in pares if isinstance(v, dict)]
-            except Exception:
-                return [data_dia[k] for k in data_dia if isinstance(data_dia[k], dict)]
-        return [v for v in data_dia.values() if isinstance(v, dict)]
-    return []
+COLUMNAS_EJERCICIOS = ["fecha", "ejercicio", "series", "reps_min", "peso", "peso_alcanzado"]
 
-def _iter_dias_rutina(doc_dict: dict):
-    """
-    Itera días desde doc['rutina'] (dict) y devuelve (dia_key, lista_ejercicios_del_dia).
-    Detecta días por claves numéricas "1","2",... y normaliza el día con obtener_lista_ejercicios().
-    """
-    r = doc_dict.get("rutina")
-    if not isinstance(r, dict):
-        return
-    dia_keys = [k for k in r.keys() if str(k).isdigit()]
-    dia_keys.sort(key=lambda x: int(x))
-    for dia_key in dia_keys:
-        ejercicios_raw = r.get(dia_key)
-        lista = obtener_lista_ejercicios(ejercicios_raw)
-        yield str(dia_key), lista
-
-def iter_ejercicios_en_rango(db, correo: str, desde: date, hasta: date,
-                             usar_real: bool, excluir_warmup: bool):
+
+def _docs_en_rango(db, correo_norm: str, desde: date, hasta: date) -> list:
+    """Semanas del cliente cuyo `fecha_lunes` puede tener días dentro de [desde, hasta]."""
+    base = db.collection("rutinas_semanales").where("correo", "==", correo_norm)
+    # Un lunes hasta 6 días antes de `desde` todavía aporta días al rango.
+    try:
+        q = (base.where("fecha_lunes", ">=", (desde - timedelta(days=6)).isoformat())
+                 .where("fecha_lunes", "<=", hasta.isoformat()))
+        return list(q.stream())
+    except Exception:
+        # Sin índice compuesto (correo + fecha_lunes): se filtra en memoria.
+        return list(base.stream())
+
+
+def ejercicios_en_rango(db, correo: str, desde: date, hasta: date,
+                        usar_real: bool, excluir_warmup: bool) -> pd.DataFrame:
     """
     Estructura:
       - 'correo' (string)
@@ -215,34 +122,26 @@ def iter_ejercicios_en_rango(db, correo: str, desde: date, hasta: date,
       - Real    (usar_real=True):  SOLO días finalizados.
     Switch:
       - excluir_warmup: omite ejercicios cuyo bloque sea "Warm Up" (o seccion equivalente).
+    Devuelve un DataFrame con COLUMNAS_EJERCICIOS (una fila por ejercicio), armado
+    por columnas sin pasar por un dict por fila.
     """
     correo_norm = normalizar_id(correo)
-
-    docs = list(
-        db.collection("rutinas_semanales")
-          .where("correo", "==", correo_norm)
-          .stream()
-    )
-
-    for doc in docs:
+    fechas: list[date] = []
+    nombres: list = []
+    series: list[int] = []
+    reps: list[int] = []
+    pesos: list[float] = []
+    pesos_alc: list[float] = []
+    # Los textos de reps se repiten mucho ("8-10", "12"): se parsean una vez.
+    reps_memo: dict[str, int] = {}
+
+    for doc in _docs_en_rango(db, correo_norm, desde, hasta):
         data = doc.to_dict() or {}
-
-        # Fecha base de semana
-        fecha_semana = None
-        v = data.get("fecha_lunes") or data.get("semana_inicio") or data.get("fecha")
-        if isinstance(v, str):
-            try: fecha_semana = datetime.fromisoformat(v).date()
-            except Exception: fecha_semana = None
+        fecha_semana = _fecha_semana(doc.id, data)
         if not fecha_semana:
-            # Fallback por ID *_YYYY_MM_DD
-            try:
-                tail = "_".join(doc.id.split("_")[-3:])
-                fecha_semana = datetime.strptime(tail, "%Y_%m_%d").date()
-            except Exception:
-                continue
+            continue
 
-        # Recorremos días
-        for dia_key, ejercicios in _iter_dias_rutina(data):
+        for dia_key, lista in _iter_dias_rutina(data):
             try: idx = int(dia_key) - 1
             except Exception: idx = 0
             fecha_dia = fecha_semana + timedelta(days=idx)
@@ -255,73 +154,98 @@ def iter_ejercicios_en_rango(db, correo: str, desde: date, hasta: date,
             if usar_real and (not dia_finalizado(data, dia_key)):
                 continue
 
-            if not isinstance(ejercicios, list):
-                continue
-
-            for ej in ejercicios:
-                if not isinstance(ej, dict):
-                    continue
-
+            for ej in lista:
                 # Excluir Warm Up (bloque/seccion)
                 if excluir_warmup:
                     bloque = str(ej.get("bloque", ej.get("seccion", ""))).strip().lower()
-                    bloque_norm = bloque.replace("-", " ").replace("_", " ")
-                    if bloque_norm == "warm up":
+                    if bloque.replace("-", " ").replace("_", " ") == "warm up":
                         continue
 
-                series   = safe_int(ej.get("series", 0), 0)
-                reps_min = parse_reps_min(ej.get("reps_min", ej.get("reps")))
-                reps_min = safe_int(reps_min or 0, 0)
-                peso_plan = safe_float(ej.get("peso", 0), 0.0)
-                peso_alc  = safe_float(
+                raw_reps = ej.get("reps_min", ej.get("reps"))
+                if isinstance(raw_reps, str):
+                    reps_min = reps_memo.get(raw_reps)
+                    if reps_min is None:
+                        reps_min = reps_memo[raw_reps] = safe_int(parse_reps_min(raw_reps) or 0, 0)
+                else:
+                    reps_min = safe_int(parse_reps_min(raw_reps) or 0, 0)
+
+                fechas.append(fecha_dia)
+                nombres.append(ej.get("ejercicio"))
+                series.append(safe_int(ej.get("series", 0), 0))
+                reps.append(reps_min)
+                pesos.append(safe_float(ej.get("peso", 0), 0.0))
+                pesos_alc.append(safe_float(
                     ej.get("peso_alcanzado")
                     or ej.get("Peso_alcanzado")
                     or ej.get("PesoAlcanzado"),
                     0.0,
-                )
+                ))
 
-                yield {
-                    "fecha": fecha_dia,
-                    "ejercicio": ej.get("ejercicio"),
-                    "series": series,
-                    "reps_min": reps_min,
-                    "peso": peso_plan,
-                    "peso_alcanzado": peso_alc,
-                }
+    return pd.DataFrame({
+        "fecha": pd.Series(fechas, dtype=object),
+        "ejercicio": pd.Series(nombres, dtype=object),
+        "series": np.asarray(series, dtype=np.int64),
+        "reps_min": np.asarray(reps, dtype=np.int64),
+        "peso": np.asarray(pesos, dtype=np.float64),
+        "peso_alcanzado": np.asarray(pesos_alc, dtype=np.float64),
+    }, columns=COLUMNAS_EJERCICIOS)
 
 
 # =============================
 #  Agregaciones (tablas)
 # =============================
-def agrupar_por_semana(ej_list: list[dict]) -> pd.DataFrame:
+def agrupar_por_semana(df_ej: pd.DataFrame) -> pd.DataFrame:
     """Devuelve DF con columnas: semana, categoria, series, volumen, tonelaje."""
-    rows = []
-    for ej in ej_list:
-        reps_min = ej.get("reps_min") or 0
-        categoria = clasificar_categoria(reps_min)
-        series = safe_int(ej.get("series"), 0)
-        peso = safe_float(ej.get("peso"), 0.0)
-        volumen = series * reps_min
-        tonelaje = volumen * peso
-
-        f: date = ej["fecha"]
-        lunes = f - timedelta(days=f.weekday())
-
-        rows.append({
-            "semana": lunes,
-            "categoria": categoria,
-            "series": series,
-            "volumen": volumen,
-            "tonelaje": tonelaje
-        })
-
-    if not rows:
-        return pd.DataFrame(columns=["semana", "categoria", "series", "volumen", "tonelaje"])
-
-    df = pd.DataFrame(rows)
-    df = df.groupby(["semana", "categoria"], as_index=False).sum(numeric_only=True)
-    df = df.sort_values(["semana", "categoria"])
-    return df
+    columnas = ["semana", "categoria", "series", "volumen", "tonelaje"]
+    if df_ej.empty:
+        return pd.DataFrame(columns=columnas)
+
+    reps_min = df_ej["reps_min"].to_numpy()
+    series = df_ej["series"].to_numpy()
+    volumen = series * reps_min
+    fechas = pd.to_datetime(df_ej["fecha"])
+    lunes = (fechas - pd.to_timedelta(fechas.dt.weekday, unit="D")).dt.date
+
+    df = pd.DataFrame({
+        "semana": lunes,
+        # Misma regla que `clasificar_categoria` (reps 0 cuenta como Fuerza).
+        "categoria": np.select([reps_min < 6, reps_min < 12], ["Fuerza", "Hipertrofia"], "Accesorio"),
+        "series": series,
+        "volumen": volumen,
+        "tonelaje": volumen * df_ej["peso"].to_numpy(),
+    })
+    df = df.groupby(["semana", "categoria"], as_index=False, sort=True).sum(numeric_only=True)
+    return df[columnas]
+
+def agrupar_desde_metricas(metricas: list[dict], desde: date, hasta: date,
+                           usar_real: bool, excluir_warmup: bool) -> pd.DataFrame:
+    """Mismo resultado que `agrupar_por_semana(ejercicios_en_rango(...))`, desde `metricas_semanales`."""
+    columnas = ["semana", "categoria", "series", "volumen", "tonelaje"]
+    acumulado: dict[tuple, list] = {}
+    for m in metricas:
+        try: lunes = date.fromisoformat(str(m.get("fecha_lunes")))
+        except Exception: continue
+        for dia_key, dia in (m.get("dias") or {}).items():
+            try: fecha_dia = lunes + timedelta(days=int(dia_key) - 1)
+            except Exception: continue
+            if not (desde <= fecha_dia <= hasta):
+                continue
+            if usar_real and not dia.get("finalizado"):
+                continue
+            semana = fecha_dia - timedelta(days=fecha_dia.weekday())
+            for cat in CATEGORIAS:
+                total = (dia.get("total") or {}).get(cat) or {}
+                warmup = ((dia.get("warmup") or {}).get(cat) or {}) if excluir_warmup else {}
+                if safe_int(total.get("ejercicios")) - safe_int(warmup.get("ejercicios")) <= 0:
+                    continue
+                fila = acumulado.setdefault((semana, cat), [0, 0, 0.0])
+                fila[0] += safe_int(total.get("series")) - safe_int(warmup.get("series"))
+                fila[1] += safe_int(total.get("volumen")) - safe_int(warmup.get("volumen"))
+                fila[2] += safe_float(total.get("tonelaje")) - safe_float(warmup.get("tonelaje"))
+    if not acumulado:
+        return pd.DataFrame(columns=columnas)
+    filas = [(semana, cat, *valores) for (semana, cat), valores in sorted(acumulado.items())]
+    return pd.DataFrame(filas, columns=columnas)
 
 def resumen_semanal(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
     """Retorna (df_totales, df_promedio_por_categoria)."""
@@ -490,19 +414,19 @@ def app():
     disabled = (not correo_sel) or (fecha_ini is None) or (fecha_fin is None) or (fecha_ini > fecha_fin)
     if st.button("Calcular seguimiento", type="primary", disabled=disabled, use_container_width=True):
         with st.spinner("Calculando…"):
-            ejercicios = list(iter_ejercicios_en_rango(
-                db, correo_sel, fecha_ini, fecha_fin,
-                usar_real=usar_real, excluir_warmup=excluir_warmup
-            ))
-            df_raw = pd.DataFrame(ejercicios)
-            if not df_raw.empty:
-                df_raw["peso"] = df_raw["peso"].apply(lambda x: safe_float(x, 0.0))
-                if "peso_alcanzado" in df_raw.columns:
-                    df_raw["peso_alcanzado"] = df_raw["peso_alcanzado"].apply(lambda x: safe_float(x, 0.0))
-                else:
-                    df_raw["peso_alcanzado"] = 0.0
-                df_raw["fecha"] = pd.to_datetime(df_raw["fecha"]).dt.date
-            df = agrupar_por_semana(ejercicios)
+            if modo_vista == "Resumen general":
+                # Totales desde `metricas_semanales`; el detalle por ejercicio no hace falta.
+                df_raw = pd.DataFrame(columns=COLUMNAS_EJERCICIOS)
+                df = agrupar_desde_metricas(
+                    metricas_en_rango(correo_sel, fecha_ini, fecha_fin),
+                    fecha_ini, fecha_fin, usar_real=usar_real, excluir_warmup=excluir_warmup
+                )
+            else:
+                df_raw = ejercicios_en_rango(
+                    db, correo_sel, fecha_ini, fecha_fin,
+                    usar_real=usar_real, excluir_warmup=excluir_warmup
+                )
+                df = agrupar_por_semana(df_raw)
             df_totales, df_prom = resumen_semanal(df)
 
         st.session_state["_seg_df_raw"] = df_raw
@@ -515,7 +439,7 @@ def app():
     df_prom = st.session_state.get("_seg_df_prom", pd.DataFrame())
     modo_vista_last = st.session_state.get("_seg_modo_vista_last", modo_vista)
 
-    if df_raw.empty:
+    if df_raw.empty and df_totales.empty:
         st.info("Carga un cálculo para ver resultados.")
         return
 
@@ -779,6 +703,9 @@ def app():
                 st.caption("👉 Los valores están normalizados para comparar tendencias; no representan cantidades absolutas.")
 
     if modo_vista == "Ejercicio específico":
+        if df_raw.empty:
+            st.info("Vuelve a calcular en este modo para ver el detalle por ejercicio.")
+            return
         opciones_ej = sorted(set(str(e).strip() for e in df_raw["ejercicio"].dropna()))
         if not opciones_ej:
             st.warning("No se encontraron nombres de ejercicio para este rango.")
@@ -791,17 +718,15 @@ def app():
             key="_seg_select_ejercicio"
         )
         df_ej = df_raw[df_raw["ejercicio"] == ejercicio_sel].copy()
-        df_ej["peso_util"] = df_ej.apply(
-            lambda row: row["peso_alcanzado"] if safe_float(row.get("peso_alcanzado"), 0.0) > 0 else row["peso"],
-            axis=1,
-        )
-        df_ej = df_ej[df_ej["peso_util"].apply(lambda x: safe_float(x, 0.0) > 0)]
+        df_ej["peso_util"] = np.where(df_ej["peso_alcanzado"] > 0, df_ej["peso_alcanzado"], df_ej["peso"])
+        df_ej = df_ej[df_ej["peso_util"] > 0]
 
         if df_ej.empty:
             st.info("Ese ejercicio no tiene registros de peso en el rango seleccionado.")
             return
 
-        df_ej["semana"] = df_ej["fecha"].apply(lambda f: f - timedelta(days=f.weekday()))
+        fechas_ej = pd.to_datetime(df_ej["fecha"])
+        df_ej["semana"] = (fechas_ej - pd.to_timedelta(fechas_ej.dt.weekday, unit="D")).dt.date
         df_sem = df_ej.groupby("semana", as_index=False)["peso_util"].max().sort_values("semana")
 
         st.markdown(f"### 📈 Progresión de peso — {ejercicio_sel}")
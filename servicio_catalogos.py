@@ -3,6 +3,8 @@ import json
 import firebase_admin
 from firebase_admin import credentials, firestore
 
+from app_core.firebase_client import get_db
+
 # --- Opcional: usar Streamlit si existe, para cachear y leer secrets ---
 _USE_ST = False
 try:
@@ -23,7 +25,7 @@ def _init_db():
             raise RuntimeError("Ejecuta dentro de Streamlit o agrega lectura local de credenciales.")
         cred = credentials.Certificate(cred_dict)
         firebase_admin.initialize_app(cred)
-    return firestore.client()
+    return get_db()
 
 COLL = "configuracion_app"
 DOC  = "catalogos_ejercicios"
@@ -480,12 +480,13 @@ def _signer():
 def _db():
     try:
         import firebase_admin
-        from firebase_admin import credentials, firestore
+        from firebase_admin import credentials
+        from app_core.firebase_client import get_db
         if not firebase_admin._apps:
             cred_dict = json.loads(st.secrets["FIREBASE_CREDENTIALS"])
             cred = credentials.Certificate(cred_dict)
             firebase_admin.initialize_app(cred)
-        return firestore.client()
+        return get_db()
     except Exception:
         return None
 
@@ -496,8 +497,12 @@ def _cached_user_lookup(correo: str):
         return None
     correo = (correo or "").strip().lower()
     try:
-        q = db.collection(COL_USUARIOS).where("correo", "==", correo).limit(1).stream()
-        doc = next(q, None)
+        # Primero por ID (comparte el snapshot del run con el resto de la app); si el
+        # doc no sigue la convención de ID, se busca por el campo `correo`.
+        doc = db.collection(COL_USUARIOS).document(correo.replace("@", "_").replace(".", "_")).get()
+        if not doc.exists:
+            q = db.collection(COL_USUARIOS).where("correo", "==", correo).limit(1).stream()
+            doc = next(q, None)
         if not doc:
             return None
         d = doc.to_dict() or {}
@@ -0,0 +1,183 @@
+"""Arnés de benchmarks: Firestore (emulador o en memoria) sembrado a volumen real.
+
+- Con `FIRESTORE_EMULATOR_HOST` definido se usa un cliente real contra el
+  emulador (proyecto `BENCH_PROYECTO`, por defecto `demo-momentum-bench`); el
+  emulador debe arrancar vacío. Sin esa variable se usa `FakeFirestore`.
+- `app_core.firebase_client.get_db` y `firebase_admin.firestore.client`
+  devuelven el mismo cliente envuelto por `metricas_firestore.instrumentar`
+  con un `Contador` como destino, así que toda la app pasa por el contador.
+- Al final de la corrida se imprime una tabla con tiempo, lecturas, escrituras y
+  consultas por medición; con `BENCH_JSON=<ruta>` además se vuelca a JSON.
+"""
+from __future__ import annotations
+
+import importlib
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("firebase_admin")
+pytest.importorskip("google.cloud.firestore_v1")
+
+RAIZ = Path(__file__).resolve().parents[2]
+if str(RAIZ) not in sys.path:
+    sys.path.insert(0, str(RAIZ))
+
+import streamlit as st  # noqa: E402
+
+from app_core.metricas_firestore import instrumentar  # noqa: E402
+
+import seed  # noqa: E402
+from contador import Contador  # noqa: E402
+from fake_firestore import FakeFirestore  # noqa: E402
+
+_REGISTROS: List[Dict[str, Any]] = []
+
+
+class _SessionState(dict):
+    """`st.session_state` no persiste fuera de `streamlit run`; en los benchmarks basta un dict."""
+
+    def __getattr__(self, clave: str) -> Any:
+        try:
+            return self[clave]
+        except KeyError as exc:
+            raise AttributeError(clave) from exc
+
+    def __setattr__(self, clave: str, valor: Any) -> None:
+        self[clave] = valor
+
+    def __delattr__(self, clave: str) -> None:
+        self.pop(clave, None)
+
+
+@dataclass
+class Entorno:
+    db: Any
+    crudo: Any
+    contador: Contador
+    datos: seed.DatosSembrados
+    modo: str
+    segundos_siembra: float
+
+    def importar(self, nombre: str):
+        """Importa un módulo de la app; si su import falla (efectos de UI), se salta el benchmark."""
+        try:
+            return importlib.import_module(nombre)
+        except Exception as exc:  # pragma: no cover - depende del entorno
+            pytest.skip(f"no se pudo importar {nombre}: {exc}")
+
+
+def _crear_cliente():
+    if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        from google.cloud import firestore as gcf
+
+        return gcf.Client(project=os.environ.get("BENCH_PROYECTO", "demo-momentum-bench")), "emulador"
+    return FakeFirestore(), "memoria"
+
+
+def _sembrar(crudo: Any, colecciones: Dict[str, Dict[str, Dict[str, Any]]]) -> None:
+    if isinstance(crudo, FakeFirestore):
+        for nombre, docs in colecciones.items():
+            crudo.cargar(nombre, docs)
+        return
+    batch, pendientes = crudo.batch(), 0
+    for nombre, docs in colecciones.items():
+        col = crudo.collection(nombre)
+        for doc_id, data in docs.items():
+            batch.set(col.document(doc_id), data)
+            pendientes += 1
+            if pendientes == 500:
+                batch.commit()
+                batch, pendientes = crudo.batch(), 0
+    if pendientes:
+        batch.commit()
+
+
+@pytest.fixture(scope="session")
+def entorno():
+    import firebase_admin
+    import app_core.firebase_client as firebase_client
+    from firebase_admin import firestore as fa_firestore
+
+    crudo, modo = _crear_cliente()
+    datos, colecciones = seed.generar()
+    inicio = time.perf_counter()
+    _sembrar(crudo, colecciones)
+    segundos = time.perf_counter() - inicio
+
+    contador = Contador()
+    db = instrumentar(crudo, contador)
+    mp = pytest.MonkeyPatch()
+    mp.setitem(firebase_admin._apps, "[DEFAULT]", object())
+    mp.setattr(fa_firestore, "client", lambda *args, **kwargs: db)
+    mp.setattr(firebase_client, "_get_db_cached", lambda: db)
+    mp.setattr(st, "session_state", _SessionState())
+    try:
+        yield Entorno(db, crudo, contador, datos, modo, segundos)
+    finally:
+        mp.undo()
+
+
+@pytest.fixture(autouse=True)
+def _estado_limpio(entorno, monkeypatch):
+    """Cada benchmark arranca en frío: sin `st.cache_data`, sin sesión y sin snapshots de proceso."""
+    from app_core import catalogo_service, users_service
+
+    st.cache_data.clear()
+    st.session_state.clear()
+    catalogo_service._SNAPSHOT._detener()
+    monkeypatch.setattr(catalogo_service, "_SNAPSHOT", catalogo_service._CatalogoSnapshot())
+    users_service._DIRECTORIO._detener()
+    monkeypatch.setattr(users_service, "_DIRECTORIO", users_service._DirectorioUsuarios())
+    entorno.contador.reiniciar()
+    yield
+
+
+@pytest.fixture
+def medir(entorno, request):
+    """`with medir("etiqueta") as c:` cronometra el bloque y deja los conteos en `c`."""
+
+    @contextmanager
+    def _medir(etiqueta: str):
+        contador = entorno.contador
+        contador.reiniciar()
+        inicio = time.perf_counter()
+        try:
+            yield contador
+        finally:
+            _REGISTROS.append(
+                {
+                    "medicion": f"{request.node.name}::{etiqueta}",
+                    "ms": round((time.perf_counter() - inicio) * 1000, 1),
+                    "modo": entorno.modo,
+                    **contador.resumen(),
+                }
+            )
+
+    return _medir
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _REGISTROS:
+        return
+    terminalreporter.section("benchmarks Firestore")
+    ancho = max(len(r["medicion"]) for r in _REGISTROS)
+    terminalreporter.write_line(
+        f"{'medición'.ljust(ancho)}  {'ms':>9}  {'lecturas':>9}  {'escrituras':>10}  {'consultas':>9}"
+    )
+    for r in _REGISTROS:
+        terminalreporter.write_line(
+            f"{r['medicion'].ljust(ancho)}  {r['ms']:>9.1f}  {r['lecturas']:>9}  {r['escrituras']:>10}  {r['consultas']:>9}"
+        )
+    destino = os.environ.get("BENCH_JSON")
+    if destino:
+        Path(destino).write_text(json.dumps(_REGISTROS, indent=2, ensure_ascii=False), encoding="utf-8")
+        terminalreporter.write_line(f"resultados guardados en {destino}")
@@ -0,0 +1,53 @@
+"""Destino de eventos de `app_core.metricas_firestore` para los benchmarks.
+
+El cliente sembrado se envuelve con `instrumentar(cliente, Contador())`, el mismo
+proxy que usa la app en producción, así los benchmarks miden con el criterio de
+conteo del panel de admin (ver el docstring de `metricas_firestore`).
+"""
+from __future__ import annotations
+
+import threading
+from collections import Counter
+from typing import Any, Dict
+
+from app_core.metricas_firestore import Evento
+
+
+class Contador:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self) -> None:
+        with self._lock:
+            self.lecturas = 0
+            self.escrituras = 0
+            self.consultas = 0
+            self.commits = 0
+            self.lecturas_por_coleccion: Counter = Counter()
+            self.escrituras_por_coleccion: Counter = Counter()
+            self.por_sitio: Counter = Counter()
+
+    def registrar(self, evento: Evento) -> None:
+        with self._lock:
+            self.lecturas += evento.lecturas
+            self.escrituras += evento.escrituras
+            self.consultas += evento.consultas
+            if evento.operacion == "commit":
+                self.commits += 1
+            if evento.lecturas:
+                self.lecturas_por_coleccion[evento.coleccion] += evento.lecturas
+                self.por_sitio[evento.sitio] += evento.lecturas
+            if evento.escrituras:
+                self.escrituras_por_coleccion[evento.coleccion] += evento.escrituras
+
+    def resumen(self) -> Dict[str, Any]:
+        return {
+            "lecturas": self.lecturas,
+            "escrituras": self.escrituras,
+            "consultas": self.consultas,
+            "commits": self.commits,
+            "lecturas_por_coleccion": dict(self.lecturas_por_coleccion),
+            "escrituras_por_coleccion": dict(self.escrituras_por_coleccion),
+            "lecturas_por_sitio": dict(self.por_sitio.most_common(5)),
+        }
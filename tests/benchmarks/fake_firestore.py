@@ -0,0 +1,513 @@
+"""Cliente Firestore en memoria para los benchmarks.
+
+Cubre la superficie que usa la app: `collection/document/where/order_by/limit/
+limit_to_last/start_at/end_at/select/stream/get/get_all/batch/write_option/
+on_snapshot`, más los transforms (`SERVER_TIMESTAMP`, `DELETE_FIELD`,
+`Increment`, `ArrayUnion`, `ArrayRemove`). No pretende reproducir la semántica
+completa (índices, orden entre tipos, transacciones): solo lo suficiente para
+que las rutas calientes corran igual que contra Firestore y se puedan contar
+lecturas y escrituras.
+"""
+from __future__ import annotations
+
+import itertools
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from google.api_core import exceptions as gexc
+from google.cloud.firestore_v1 import transforms
+
+_DOC_ID = "__name__"
+_RELOJ = itertools.count(1)
+_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _marca_tiempo() -> datetime:
+    # Monótono y único por escritura, como `update_time` en Firestore.
+    return _EPOCH + timedelta(microseconds=next(_RELOJ))
+
+
+def _copiar(valor: Any) -> Any:
+    if isinstance(valor, dict):
+        return {k: _copiar(v) for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [_copiar(v) for v in valor]
+    return valor
+
+
+def _ruta(campo: Any) -> List[str]:
+    if isinstance(campo, (list, tuple)):
+        return [str(p) for p in campo]
+    campo = str(campo)
+    if campo.startswith("`"):
+        return [campo.strip("`")]
+    return campo.split(".")
+
+
+def _leer(data: Dict[str, Any], campo: str) -> Any:
+    actual: Any = data
+    for parte in _ruta(campo):
+        if not isinstance(actual, dict) or parte not in actual:
+            return _FALTA
+        actual = actual[parte]
+    return actual
+
+
+_FALTA = object()
+
+
+def _aplicar_valor(destino: Dict[str, Any], ruta: List[str], valor: Any) -> None:
+    for parte in ruta[:-1]:
+        siguiente = destino.get(parte)
+        if not isinstance(siguiente, dict):
+            siguiente = {}
+            destino[parte] = siguiente
+        destino = siguiente
+    hoja = ruta[-1]
+    if valor is transforms.DELETE_FIELD:
+        destino.pop(hoja, None)
+    elif valor is transforms.SERVER_TIMESTAMP:
+        destino[hoja] = datetime.now(timezone.utc)
+    elif isinstance(valor, transforms.Increment):
+        actual = destino.get(hoja)
+        destino[hoja] = (actual if isinstance(actual, (int, float)) else 0) + valor.value
+    elif isinstance(valor, transforms.ArrayUnion):
+        actual = list(destino.get(hoja) or [])
+        actual.extend(v for v in valor.values if v not in actual)
+        destino[hoja] = actual
+    elif isinstance(valor, transforms.ArrayRemove):
+        destino[hoja] = [v for v in (destino.get(hoja) or []) if v not in valor.values]
+    else:
+        destino[hoja] = _copiar(valor)
+
+
+def _fusionar(destino: Dict[str, Any], datos: Dict[str, Any], prefijo: List[str]) -> None:
+    for clave, valor in datos.items():
+        ruta = prefijo + [clave]
+        if isinstance(valor, dict) and valor:
+            _fusionar(destino, valor, ruta)
+        else:
+            _aplicar_valor(destino, ruta, valor)
+
+
+def _comparable(a: Any, b: Any) -> bool:
+    if isinstance(a, bool) or isinstance(b, bool):
+        return isinstance(a, bool) and isinstance(b, bool)
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return True
+    return type(a) is type(b) or (isinstance(a, datetime) and isinstance(b, datetime))
+
+
+def _cumple(valor: Any, op: str, esperado: Any) -> bool:
+    if valor is _FALTA:
+        return False
+    if op == "==":
+        return valor == esperado
+    if op == "!=":
+        return valor != esperado
+    if op == "in":
+        return valor in esperado
+    if op == "not-in":
+        return valor not in esperado
+    if op == "array_contains":
+        return isinstance(valor, list) and esperado in valor
+    if op == "array_contains_any":
+        return isinstance(valor, list) and any(v in valor for v in esperado)
+    if not _comparable(valor, esperado):
+        return False
+    return {
+        "<": valor < esperado,
+        "<=": valor <= esperado,
+        ">": valor > esperado,
+        ">=": valor >= esperado,
+    }[op]
+
+
+class FakeSnapshot:
+    def __init__(self, reference: "FakeDocumentReference", data: Optional[Dict[str, Any]], campos=None) -> None:
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+        self._campos = campos
+        registro = reference._coleccion._tiempos.get(reference.id) if self.exists else None
+        self.create_time = registro[0] if registro else None
+        self.update_time = registro[1] if registro else None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        if self._data is None:
+            return None
+        if self._campos is None:
+            return _copiar(self._data)
+        salida: Dict[str, Any] = {}
+        for campo in self._campos:
+            valor = _leer(self._data, campo)
+            if valor is not _FALTA:
+                _aplicar_valor(salida, _ruta(campo), valor)
+        return salida
+
+    def get(self, campo: str) -> Any:
+        valor = _leer(self._data or {}, campo)
+        if valor is _FALTA:
+            raise KeyError(campo)
+        return _copiar(valor)
+
+
+class FakeDocumentReference:
+    def __init__(self, coleccion: "FakeCollectionReference", doc_id: str) -> None:
+        self._coleccion = coleccion
+        self._client = coleccion._client
+        self.id = doc_id
+        self.path = f"{coleccion._path}/{doc_id}"
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, FakeDocumentReference) and other.path == self.path
+
+    def __hash__(self) -> int:
+        return hash(self.path)
+
+    @property
+    def parent(self) -> "FakeCollectionReference":
+        return self._coleccion
+
+    def collection(self, nombre: str) -> "FakeCollectionReference":
+        return self._client.collection(f"{self.path}/{nombre}")
+
+    # ---------- lectura ----------
+    def get(self, field_paths: Optional[Iterable[str]] = None, transaction=None) -> FakeSnapshot:
+        with self._client._lock:
+            data = self._coleccion._docs.get(self.id)
+            return FakeSnapshot(self, data, list(field_paths) if field_paths else None)
+
+    # ---------- escritura ----------
+    def _verificar(self, option) -> None:
+        if option is None:
+            return
+        registro = self._coleccion._tiempos.get(self.id)
+        if option.exists is not None and option.exists != (registro is not None):
+            raise gexc.FailedPrecondition(f"precondición exists fallida en {self.path}")
+        if option.last_update_time is not None and (registro is None or registro[1] != option.last_update_time):
+            raise gexc.FailedPrecondition(f"update_time cambió en {self.path}")
+
+    def _guardar(self, data: Optional[Dict[str, Any]]) -> None:
+        col = self._coleccion
+        ahora = _marca_tiempo()
+        previo = col._docs.get(self.id)
+        if data is None:
+            col._docs.pop(self.id, None)
+            col._tiempos.pop(self.id, None)
+            tipo = "REMOVED"
+        else:
+            col._docs[self.id] = data
+            creado = col._tiempos.get(self.id, (ahora, ahora))[0]
+            col._tiempos[self.id] = (creado, ahora)
+            tipo = "ADDED" if previo is None else "MODIFIED"
+        if previo is not None or data is not None:
+            self._client._notificar(col, self, tipo)
+
+    def set(self, document_data: Dict[str, Any], merge: bool = False) -> None:
+        with self._client._lock:
+            if merge:
+                base = _copiar(self._coleccion._docs.get(self.id) or {})
+                _fusionar(base, document_data, [])
+            else:
+                base = {}
+                _fusionar(base, document_data, [])
+            self._guardar(base)
+
+    def create(self, document_data: Dict[str, Any]) -> None:
+        with self._client._lock:
+            if self.id in self._coleccion._docs:
+                raise gexc.AlreadyExists(f"{self.path} ya existe")
+            base: Dict[str, Any] = {}
+            _fusionar(base, document_data, [])
+            self._guardar(base)
+
+    def update(self, field_updates: Dict[str, Any], option=None) -> None:
+        with self._client._lock:
+            self._verificar(option)
+            if self.id not in self._coleccion._docs:
+                raise gexc.NotFound(f"{self.path} no existe")
+            base = _copiar(self._coleccion._docs[self.id])
+            for campo, valor in field_updates.items():
+                _aplicar_valor(base, _ruta(campo), valor)
+            self._guardar(base)
+
+    def delete(self, option=None) -> None:
+        with self._client._lock:
+            self._verificar(option)
+            self._guardar(None)
+
+
+class FakeQuery:
+    def __init__(self, coleccion: "FakeCollectionReference", **estado: Any) -> None:
+        self._parent = coleccion
+        self._filtros: List[tuple] = estado.get("filtros", [])
+        self._orden: List[tuple] = estado.get("orden", [])
+        self._limite: Optional[int] = estado.get("limite")
+        self._desde_final: bool = estado.get("desde_final", False)
+        self._inicio: Optional[tuple] = estado.get("inicio")
+        self._fin: Optional[tuple] = estado.get("fin")
+        self._campos: Optional[List[str]] = estado.get("campos")
+
+    def _con(self, **cambios: Any) -> "FakeQuery":
+        estado = {
+            "filtros": list(self._filtros),
+            "orden": list(self._orden),
+            "limite": self._limite,
+            "desde_final": self._desde_final,
+            "inicio": self._inicio,
+            "fin": self._fin,
+            "campos": self._campos,
+        }
+        estado.update(cambios)
+        return FakeQuery(self._parent, **estado)
+
+    # ---------- construcción ----------
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None) -> "FakeQuery":
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._con(filtros=self._filtros + [(str(field_path), op_string, value)])
+
+    def order_by(self, field_path, direction: str = "ASCENDING") -> "FakeQuery":
+        return self._con(orden=self._orden + [(str(field_path), direction == "DESCENDING")])
+
+    def limit(self, count: int) -> "FakeQuery":
+        return self._con(limite=count, desde_final=False)
+
+    def limit_to_last(self, count: int) -> "FakeQuery":
+        return self._con(limite=count, desde_final=True)
+
+    def select(self, field_paths: Iterable[str]) -> "FakeQuery":
+        return self._con(campos=list(field_paths))
+
+    def _cursor(self, valores: Any, incluye: bool) -> tuple:
+        if isinstance(valores, FakeSnapshot):
+            valores = [valores.id if c == _DOC_ID else _leer(valores._data or {}, c) for c, _ in self._orden]
+        elif isinstance(valores, dict):
+            valores = [valores.get(c) for c, _ in self._orden]
+        elif not isinstance(valores, (list, tuple)):
+            valores = [valores]
+        return (list(valores), incluye)
+
+    def start_at(self, valores) -> "FakeQuery":
+        return self._con(inicio=self._cursor(valores, True))
+
+    def start_after(self, valores) -> "FakeQuery":
+        return self._con(inicio=self._cursor(valores, False))
+
+    def end_at(self, valores) -> "FakeQuery":
+        return self._con(fin=self._cursor(valores, True))
+
+    def end_before(self, valores) -> "FakeQuery":
+        return self._con(fin=self._cursor(valores, False))
+
+    # ---------- ejecución ----------
+    def _valor_orden(self, doc_id: str, data: Dict[str, Any], campo: str) -> Any:
+        return doc_id if campo == _DOC_ID else _leer(data, campo)
+
+    def _coincide(self, doc_id: str, data: Dict[str, Any]) -> bool:
+        for campo, op, esperado in self._filtros:
+            if not _cumple(self._valor_orden(doc_id, data, campo), op, esperado):
+                return False
+        for campo, _desc in self._orden:
+            if campo != _DOC_ID and _leer(data, campo) is _FALTA:
+                return False
+        return True
+
+    def _dentro_de_cursor(self, clave: List[Any]) -> bool:
+        for cursor, es_inicio in ((self._inicio, True), (self._fin, False)):
+            if cursor is None:
+                continue
+            valores, incluye = cursor
+            parcial = clave[: len(valores)]
+            try:
+                if parcial == valores:
+                    if not incluye:
+                        return False
+                    continue
+                if es_inicio and parcial < valores:
+                    return False
+                if not es_inicio and parcial > valores:
+                    return False
+            except TypeError:
+                return False
+        return True
+
+    def _resultados(self) -> List[FakeSnapshot]:
+        col = self._parent
+        with col._client._lock:
+            items = [(i, d) for i, d in col._docs.items() if self._coincide(i, d)]
+        orden = self._orden or [(_DOC_ID, False)]
+        for campo, desc in reversed(orden):
+            items.sort(key=lambda it, c=campo: self._valor_orden(it[0], it[1], c), reverse=desc)
+        if self._inicio is not None or self._fin is not None:
+            items = [
+                it for it in items
+                if self._dentro_de_cursor([self._valor_orden(it[0], it[1], c) for c, _ in orden])
+            ]
+        if self._limite is not None:
+            items = items[-self._limite:] if self._desde_final else items[: self._limite]
+        return [FakeSnapshot(col.document(i), d, self._campos) for i, d in items]
+
+    def stream(self, transaction=None):
+        yield from self._resultados()
+
+    def get(self, transaction=None) -> List[FakeSnapshot]:
+        return self._resultados()
+
+    def on_snapshot(self, callback: Callable) -> "FakeWatch":
+        return self._parent._client._suscribir(self, callback)
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client: "FakeFirestore", path: str) -> None:
+        self._client = client
+        self._path = path
+        self.id = path.rsplit("/", 1)[-1]
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._tiempos: Dict[str, tuple] = {}
+        super().__init__(self)
+
+    def document(self, document_id: Optional[str] = None) -> FakeDocumentReference:
+        return FakeDocumentReference(self, document_id or uuid.uuid4().hex[:20])
+
+    def add(self, document_data: Dict[str, Any], document_id: Optional[str] = None):
+        ref = self.document(document_id)
+        ref.set(document_data)
+        return ref.get().update_time, ref
+
+    def list_documents(self) -> List[FakeDocumentReference]:
+        return [self.document(i) for i in list(self._docs)]
+
+
+class FakeWriteBatch:
+    def __init__(self, client: "FakeFirestore") -> None:
+        self._client = client
+        self._ops: List[Callable[[], None]] = []
+
+    def __len__(self) -> int:
+        return len(self._ops)
+
+    def set(self, reference, document_data, merge: bool = False) -> "FakeWriteBatch":
+        self._ops.append(lambda: reference.set(document_data, merge=merge))
+        return self
+
+    def create(self, reference, document_data) -> "FakeWriteBatch":
+        self._ops.append(lambda: reference.create(document_data))
+        return self
+
+    def update(self, reference, field_updates, option=None) -> "FakeWriteBatch":
+        self._ops.append(lambda: reference.update(field_updates, option=option))
+        return self
+
+    def delete(self, reference, option=None) -> "FakeWriteBatch":
+        self._ops.append(lambda: reference.delete(option=option))
+        return self
+
+    def commit(self, retry=None, timeout=None) -> List[Any]:
+        if len(self._ops) > 500:
+            raise gexc.InvalidArgument("maximum 500 writes allowed per request")
+        with self._client._lock:
+            # Atómico: si una operación falla, se restaura el estado previo.
+            respaldo = self._client._respaldo()
+            try:
+                for op in self._ops:
+                    op()
+            except Exception:
+                self._client._restaurar(respaldo)
+                raise
+        self._ops = []
+        return []
+
+
+class FakeWatch:
+    def __init__(self, client: "FakeFirestore", consulta: FakeQuery, callback: Callable) -> None:
+        self._client = client
+        self._consulta = consulta
+        self._callback = callback
+        self.is_active = True
+
+    def unsubscribe(self) -> None:
+        self.is_active = False
+        self._client._watches = [w for w in self._client._watches if w is not self]
+
+
+class FakeFirestore:
+    """Raíz del cliente en memoria. Los listeners se notifican de forma síncrona."""
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._colecciones: Dict[str, FakeCollectionReference] = {}
+        self._watches: List[FakeWatch] = []
+
+    def collection(self, path: str) -> FakeCollectionReference:
+        with self._lock:
+            col = self._colecciones.get(path)
+            if col is None:
+                col = FakeCollectionReference(self, path)
+                self._colecciones[path] = col
+            return col
+
+    def document(self, path: str) -> FakeDocumentReference:
+        col_path, doc_id = path.rsplit("/", 1)
+        return self.collection(col_path).document(doc_id)
+
+    def collections(self) -> List[FakeCollectionReference]:
+        return [c for p, c in self._colecciones.items() if "/" not in p]
+
+    def get_all(self, references: Iterable[FakeDocumentReference], field_paths=None, transaction=None):
+        campos = list(field_paths) if field_paths else None
+        for ref in list(references):
+            yield ref.get(field_paths=campos)
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def write_option(self, **kwargs: Any) -> SimpleNamespace:
+        return SimpleNamespace(
+            last_update_time=kwargs.get("last_update_time"),
+            exists=kwargs.get("exists"),
+        )
+
+    def close(self) -> None:
+        self._watches = []
+
+    # ---------- carga masiva (sin copiar ni notificar) ----------
+    def cargar(self, coleccion: str, docs: Dict[str, Dict[str, Any]]) -> None:
+        col = self.collection(coleccion)
+        with self._lock:
+            for doc_id, data in docs.items():
+                ahora = _marca_tiempo()
+                col._docs[doc_id] = data
+                col._tiempos[doc_id] = (ahora, ahora)
+
+    # ---------- internos ----------
+    def _respaldo(self) -> Dict[str, tuple]:
+        return {p: (dict(c._docs), dict(c._tiempos)) for p, c in self._colecciones.items()}
+
+    def _restaurar(self, respaldo: Dict[str, tuple]) -> None:
+        for path, (docs, tiempos) in respaldo.items():
+            col = self._colecciones[path]
+            col._docs, col._tiempos = docs, tiempos
+
+    def _suscribir(self, consulta: FakeQuery, callback: Callable) -> FakeWatch:
+        watch = FakeWatch(self, consulta, callback)
+        self._watches.append(watch)
+        snaps = consulta.get()
+        cambios = [SimpleNamespace(type=SimpleNamespace(name="ADDED"), document=s) for s in snaps]
+        callback(snaps, cambios, datetime.now(timezone.utc))
+        return watch
+
+    def _notificar(self, col: FakeCollectionReference, ref: FakeDocumentReference, tipo: str) -> None:
+        for watch in list(self._watches):
+            if not watch.is_active or watch._consulta._parent is not col:
+                continue
+            snap = ref.get()
+            if tipo != "REMOVED" and not watch._consulta._coincide(ref.id, snap._data or {}):
+                continue
+            cambio = SimpleNamespace(type=SimpleNamespace(name=tipo), document=snap)
+            watch._callback([snap], [cambio], datetime.now(timezone.utc))
@@ -0,0 +1,194 @@
+"""Datos sintéticos con volúmenes de producción para los benchmarks.
+
+Genera usuarios (deportistas, entrenadores y admins), el catálogo de
+`ejercicios`, `implementos`, varios bloques de `rutinas_semanales` por
+deportista y el resumen `ultima_rutina`. Todo es determinista (semilla fija) y
+escalable con `BENCH_ESCALA` (1.0 ≈ 1 500 deportistas y 18 000 semanas).
+"""
+from __future__ import annotations
+
+import os
+import random
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+from app_core.data_access import COLECCION_ULTIMA_RUTINA, CAMPOS_ULTIMA_RUTINA
+
+DOMINIO = "bench.momentum.test"
+EMPRESAS = ("motion", "asesoria")
+GRUPOS = ("Pecho", "Espalda", "Piernas", "Hombros", "Brazos", "Core", "Glúteos")
+PATRONES = ("Empuje", "Tracción", "Rodilla dominante", "Cadera dominante", "Core", "Carry")
+
+
+def _escala() -> float:
+    try:
+        return max(0.01, float(os.environ.get("BENCH_ESCALA", "1")))
+    except ValueError:
+        return 1.0
+
+
+def correo_a_doc_id(correo: str) -> str:
+    return correo.strip().lower().replace("@", "_").replace(".", "_")
+
+
+def lunes(d: date) -> date:
+    return d - timedelta(days=d.weekday())
+
+
+@dataclass
+class DatosSembrados:
+    """Lo sembrado, para que cada benchmark fije sus presupuestos sobre volúmenes reales."""
+
+    atletas: List[str] = field(default_factory=list)
+    entrenadores: List[str] = field(default_factory=list)
+    admins: List[str] = field(default_factory=list)
+    coach_de: Dict[str, str] = field(default_factory=dict)
+    empresa_de: Dict[str, str] = field(default_factory=dict)
+    ejercicios: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    semanas_por_atleta: Dict[str, List[str]] = field(default_factory=dict)
+    semanas_por_entrenador: Dict[str, int] = field(default_factory=dict)
+    total_semanas: int = 0
+    lunes_actual: date = field(default_factory=lambda: lunes(date.today()))
+
+
+def _ejercicio_rutina(rng: random.Random, nombre: str, seccion: str, circuito: str) -> Dict[str, Any]:
+    reps = rng.choice((6, 8, 10, 12))
+    return {
+        "bloque": seccion,
+        "circuito": circuito,
+        "ejercicio": nombre,
+        "detalle": "",
+        "series": rng.choice((2, 3, 4)),
+        "reps_min": reps,
+        "reps_max": reps + 2,
+        "peso": rng.choice((None, 10.0, 20.0, 40.0, 60.0)),
+        "rir_min": 1,
+        "rir_max": 3,
+        "tipo": "",
+        "video": "",
+    }
+
+
+def _plantillas_rutina(rng: random.Random, nombres: List[str], n: int = 24) -> List[Dict[str, List[Dict[str, Any]]]]:
+    """Pocas rutinas distintas compartidas entre docs: el volumen está en la cantidad de docs."""
+    plantillas = []
+    for _ in range(n):
+        rutina = {}
+        for dia in ("1", "2", "3"):
+            ejercicios = [_ejercicio_rutina(rng, rng.choice(nombres), "Warm Up", "A") for _ in range(2)]
+            ejercicios += [
+                _ejercicio_rutina(rng, rng.choice(nombres), "Work Out", c) for c in ("D", "D", "E", "F")
+            ]
+            rutina[dia] = ejercicios
+        plantillas.append(rutina)
+    return plantillas
+
+
+def generar(semilla: int = 2024) -> tuple[DatosSembrados, Dict[str, Dict[str, Dict[str, Any]]]]:
+    """Devuelve `(resumen, {coleccion: {doc_id: datos}})`."""
+    rng = random.Random(semilla)
+    escala = _escala()
+    n_atletas = max(20, int(1500 * escala))
+    n_entrenadores = max(2, int(40 * escala))
+    n_ejercicios = max(50, int(1200 * escala))
+    bloques_por_atleta = 3
+    semanas_por_bloque = 4
+
+    datos = DatosSembrados()
+    colecciones: Dict[str, Dict[str, Dict[str, Any]]] = {
+        "usuarios": {},
+        "ejercicios": {},
+        "implementos": {},
+        "rutinas_semanales": {},
+        COLECCION_ULTIMA_RUTINA: {},
+    }
+
+    for i in range(2):
+        correo = f"admin{i}@{DOMINIO}"
+        datos.admins.append(correo)
+        colecciones["usuarios"][correo_a_doc_id(correo)] = {
+            "correo": correo, "nombre": f"Admin {i}", "rol": "admin", "empresa": "motion", "activo": True,
+        }
+
+    for i in range(n_entrenadores):
+        correo = f"coach{i:03d}@{DOMINIO}"
+        empresa = EMPRESAS[i % len(EMPRESAS)]
+        datos.entrenadores.append(correo)
+        datos.empresa_de[correo] = empresa
+        datos.semanas_por_entrenador[correo] = 0
+        colecciones["usuarios"][correo_a_doc_id(correo)] = {
+            "correo": correo, "nombre": f"Coach {i:03d}", "rol": "entrenador", "empresa": empresa, "activo": True,
+        }
+
+    for i in range(n_ejercicios):
+        nombre = f"Ejercicio {i:04d}"
+        publico = i % 3 == 0
+        coach = rng.choice(datos.entrenadores)
+        data = {
+            "nombre": nombre,
+            "publico": publico,
+            "entrenador": "" if publico else coach,
+            "empresa_propietaria": "" if publico else datos.empresa_de[coach],
+            "grupo_muscular_principal": rng.choice(GRUPOS),
+            "patron_de_movimiento": rng.choice(PATRONES),
+            "video": f"https://youtu.be/{uuid.UUID(int=rng.getrandbits(128)).hex[:11]}" if i % 4 else "",
+        }
+        doc_id = nombre.lower().replace(" ", "_")
+        datos.ejercicios[doc_id] = data
+        colecciones["ejercicios"][doc_id] = data
+
+    for i in range(60):
+        colecciones["implementos"][f"impl{i:03d}"] = {"marca": f"Marca {i % 7}", "maquina": f"Máquina {i}", "pesos": {}}
+
+    plantillas = _plantillas_rutina(rng, [d["nombre"] for d in datos.ejercicios.values()])
+    total_semanas = bloques_por_atleta * semanas_por_bloque
+    for i in range(n_atletas):
+        correo = f"atleta{i:05d}@{DOMINIO}"
+        coach = datos.entrenadores[i % n_entrenadores]
+        empresa = datos.empresa_de[coach]
+        nombre = f"Atleta {i:05d}"
+        correo_norm = correo_a_doc_id(correo)
+        datos.atletas.append(correo)
+        datos.coach_de[correo] = coach
+        datos.empresa_de[correo] = empresa
+        colecciones["usuarios"][correo_norm] = {
+            "correo": correo, "nombre": nombre, "rol": "deportista", "empresa": empresa,
+            "coach_responsable": coach, "activo": True,
+        }
+
+        # La última semana de cada deportista cae entre 3 semanas atrás y 2 adelante.
+        fin = datos.lunes_actual + timedelta(weeks=rng.randint(-3, 2))
+        inicio = fin - timedelta(weeks=total_semanas - 1)
+        ids: List[str] = []
+        ultima: Dict[str, Any] = {}
+        ultima_id = ""
+        for b in range(bloques_por_atleta):
+            bloque_id = str(uuid.UUID(int=rng.getrandbits(128)))
+            plantilla = rng.choice(plantillas)
+            for s in range(semanas_por_bloque):
+                fecha = inicio + timedelta(weeks=b * semanas_por_bloque + s)
+                doc_id = f"{correo_norm}_{fecha.strftime('%Y_%m_%d')}"
+                doc = {
+                    "cliente": nombre,
+                    "correo": correo,
+                    "fecha_lunes": fecha.strftime("%Y-%m-%d"),
+                    "entrenador": coach,
+                    "bloque_rutina": bloque_id,
+                    "objetivo": "Hipertrofia",
+                    "rutina": plantilla,
+                }
+                colecciones["rutinas_semanales"][doc_id] = doc
+                ids.append(doc_id)
+                ultima, ultima_id = doc, doc_id
+        datos.semanas_por_atleta[correo] = ids
+        datos.semanas_por_entrenador[coach] += len(ids)
+        datos.total_semanas += len(ids)
+        # Uno de cada diez deportistas queda sin resumen: ejercita el respaldo perezoso.
+        if i % 10:
+            resumen = {campo: ultima.get(campo) or "" for campo in CAMPOS_ULTIMA_RUTINA}
+            resumen["rutina_id"] = ultima_id
+            colecciones[COLECCION_ULTIMA_RUTINA][correo_norm] = resumen
+
+    return datos, colecciones
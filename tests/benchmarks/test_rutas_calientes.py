@@ -0,0 +1,345 @@
+"""Benchmarks de las rutas calientes con presupuesto de lecturas/escrituras.
+
+Los presupuestos se derivan de lo sembrado (ver `seed.py`), no de números
+fijos: si una ruta vuelve a recorrer una colección entera o a consultar por
+cliente dentro de un bucle, el conteo se dispara y el test falla.
+"""
+from __future__ import annotations
+
+import math
+import time
+from datetime import datetime, timedelta
+
+import streamlit as st
+
+
+def _total_usuarios(entorno) -> int:
+    datos = entorno.datos
+    return len(datos.admins) + len(datos.entrenadores) + len(datos.atletas)
+
+
+def _atleta_con_resumen(entorno) -> str:
+    # Los índices múltiplos de 10 quedaron sin `ultima_rutina` en la siembra.
+    return entorno.datos.atletas[1]
+
+
+def test_catalogo_ejercicios(entorno, medir):
+    crear_planificaciones = entorno.importar("crear_planificaciones")
+    from app_core import catalogo_service
+
+    datos = entorno.datos
+    n_ejercicios = len(datos.ejercicios)
+    coach_a, coach_b = datos.entrenadores[0], datos.entrenadores[1]
+
+    with medir("primera_sesion") as c:
+        ejercicios = crear_planificaciones._cargar_ejercicios_cached(
+            coach_a, "entrenador", catalogo_service.version()
+        )
+    assert ejercicios
+    # Una descarga del catálogo + la del directorio de usuarios (empresa del entrenador).
+    assert c.lecturas <= n_ejercicios + _total_usuarios(entorno) + 5
+    assert c.lecturas_por_coleccion.get("ejercicios", 0) <= n_ejercicios
+    assert c.lecturas_por_coleccion.get("usuarios", 0) <= _total_usuarios(entorno)
+
+    with medir("otra_sesion_mismo_proceso") as c:
+        crear_planificaciones._cargar_ejercicios_cached(coach_b, "entrenador", catalogo_service.version())
+    # Los snapshots del proceso ya están: otra sesión no vuelve a leer `ejercicios` ni `usuarios`.
+    assert c.lecturas_por_coleccion.get("ejercicios", 0) == 0
+    assert c.lecturas_por_coleccion.get("usuarios", 0) == 0
+    assert c.lecturas <= 5
+
+
+def test_autocompletado_ejercicios(entorno, medir):
+    from app_core import busqueda_ejercicios, catalogo_service
+
+    catalogo = catalogo_service.ejercicios_por_nombre()
+    indice = busqueda_ejercicios.indice_catalogo(catalogo, ("bench",))
+    nombre = next(iter(catalogo))
+    consultas = ["ejer", "ejercicio 01", "ejercicio 0042", "ejrcicio 42", "cicio 12", nombre]
+
+    with medir("consultas_x600") as c:
+        inicio = time.perf_counter()
+        for _ in range(100):
+            for consulta in consultas:
+                indice.buscar(consulta)
+        promedio_ms = (time.perf_counter() - inicio) * 1000 / (100 * len(consultas))
+    # El índice vive en memoria y se reutiliza mientras no cambie la versión del catálogo.
+    assert c.lecturas == 0
+    assert busqueda_ejercicios.indice_catalogo(catalogo, ("bench",)) is indice
+    assert indice.buscar(nombre)[0] == nombre
+    # Error de tipeo en la palabra (los números no admiten errores).
+    assert nombre in indice.buscar(nombre.replace("Ejercicio", "Ejrcicio"))
+    assert promedio_ms < 1.0
+
+    # Dos sesiones con ejercicios locales distintos en el mismo ámbito no comparten índice.
+    sesion_a = {**catalogo, "Zancada Local A": {}}
+    sesion_b = {**catalogo, "Remo Local B": {}}
+    assert busqueda_ejercicios.indice_catalogo(sesion_a, ("bench",)).buscar("zancada local")[0] == "Zancada Local A"
+    assert busqueda_ejercicios.indice_catalogo(sesion_b, ("bench",)).buscar("remo local")[0] == "Remo Local B"
+    # Los agregados se mezclan con el índice base en el mismo orden que un índice completo.
+    completo = busqueda_ejercicios.IndiceBusqueda(busqueda_ejercicios._entradas_catalogo(sesion_a))
+    combinado = busqueda_ejercicios.indice_catalogo(sesion_a, ("bench",))
+    for consulta in consultas + ["zancada", "local", "zncada"]:
+        assert combinado.buscar(consulta, limite=20) == completo.buscar(consulta, limite=20)
+
+    # Resolver el índice en cada rerun no recorre el catálogo.
+    inicio = time.perf_counter()
+    for _ in range(1000):
+        busqueda_ejercicios.indice_catalogo(catalogo, ("bench",))
+    assert (time.perf_counter() - inicio) * 1000 / 1000 < 0.05
+
+
+def test_ver_rutinas(entorno, medir):
+    vista_rutinas = entorno.importar("vista_rutinas")
+    datos = entorno.datos
+    correo = datos.atletas[7]
+
+    with medir("indice") as c:
+        indice = vista_rutinas._cargar_indice_rutinas()
+    assert len(indice) >= datos.total_semanas
+    assert c.consultas == 1
+    assert c.lecturas == len(indice)
+
+    ids = tuple(e["_id"] for e in indice if (e.get("correo") or "").lower() == correo)
+    assert len(ids) == len(datos.semanas_por_atleta[correo])
+
+    with medir("semanas_cliente") as c:
+        rutinas = vista_rutinas._cargar_rutinas_por_ids(ids)
+    assert len(rutinas) == len(ids)
+    assert c.lecturas == len(ids)
+    assert c.consultas == math.ceil(len(ids) / 100)
+
+    with medir("rerun_cacheado") as c:
+        vista_rutinas._cargar_indice_rutinas()
+        vista_rutinas._cargar_rutinas_por_ids(ids)
+    assert c.lecturas == 0
+
+
+def test_docs_de_cliente(entorno, medir):
+    from app_core import data_access
+
+    correo = entorno.datos.atletas[4]
+    ids = entorno.datos.semanas_por_atleta[correo]
+
+    with medir("semanas_de_un_cliente") as c:
+        docs = data_access.docs_de_cliente("rutinas_semanales", correo, campos=["correo", "fecha_lunes"])
+    assert sorted(docs) == sorted(ids)
+    # Rangos sobre el ID más `correo == ...`: nunca la colección entera.
+    assert c.consultas <= 3
+    assert c.lecturas <= 2 * len(ids)
+
+    # Docs sin el campo `correo`: solo el rango sobre el prefijo del ID los encuentra.
+    col = entorno.db.collection("docs_por_id")
+    col.document("otro_cliente_2024_01_01").set({"x": 1})
+    for doc_id in ids:
+        col.document(doc_id).set({"x": 1})
+    with medir("solo_prefijo_de_id") as c:
+        docs = data_access.docs_de_cliente("docs_por_id", correo)
+    assert sorted(docs) == sorted(ids)
+    assert c.lecturas == len(ids)
+
+
+def test_guardar_rutina(entorno, medir):
+    guardar_rutina_view = entorno.importar("guardar_rutina_view")
+    from app_core import catalogo_service
+
+    datos = entorno.datos
+    correo = _atleta_con_resumen(entorno)
+    coach = datos.coach_de[correo]
+    nombres = [d["nombre"] for d in list(datos.ejercicios.values())[:40]]
+    dias = ["Día 1", "Día 2", "Día 3"]
+    for i in range(len(dias)):
+        st.session_state[f"rutina_dia_{i + 1}_Warm_Up"] = [
+            {"Ejercicio": nombres[i * 8 + k], "Circuito": "A", "Series": 2, "RepsMin": 10, "RepsMax": 12}
+            for k in range(2)
+        ]
+        st.session_state[f"rutina_dia_{i + 1}_Work_Out"] = [
+            {
+                "Ejercicio": nombres[i * 8 + 2 + k],
+                "Circuito": "D",
+                "Series": 4,
+                "RepsMin": 6,
+                "RepsMax": 8,
+                "Peso": 40,
+                "Variable_1": "peso",
+                "Cantidad_1": 2.5,
+                "Operacion_1": "suma",
+                "Semanas_1": "2,3,4",
+            }
+            for k in range(6)
+        ]
+    ejercicios_meta = catalogo_service.ejercicios_por_nombre()
+    semanas = 4
+    fecha_inicio = datos.lunes_actual + timedelta(weeks=3)
+
+    with medir("bloque_4_semanas") as c:
+        guardar_rutina_view.guardar_rutina(
+            "Atleta Benchmark",
+            correo,
+            coach,
+            fecha_inicio,
+            semanas,
+            dias,
+            notificar_correo=False,
+            objetivo="Fuerza",
+            ejercicios_meta=ejercicios_meta,
+        )
+    # Un batch: las semanas, sus métricas y el resumen `ultima_rutina`; solo el get_all del resumen.
+    assert c.escrituras == 2 * semanas + 1
+    assert c.commits == 1
+    assert c.lecturas <= 1
+    assert c.consultas <= 1
+
+
+def test_resumen_bloques(entorno, medir):
+    email_notifications = entorno.importar("app_core.email_notifications")
+    datos = entorno.datos
+    muestra = datos.entrenadores[:5]
+    # Semanas actuales de la muestra: otros benchmarks pueden haberle guardado bloques.
+    col = entorno.db.collection("rutinas_semanales")
+    semanas_muestra = sum(len(list(col.where("entrenador", "==", coach).select([]).stream())) for coach in muestra)
+    assert semanas_muestra >= sum(datos.semanas_por_entrenador[coach] for coach in muestra)
+
+    with medir("por_entrenador_x5") as c:
+        for coach in muestra:
+            email_notifications.preparar_resumen_bloques_entrenador(coach)
+    # Sus semanas y un solo doc de `usuarios` por entrenador (rol y nombre).
+    assert c.lecturas <= semanas_muestra + len(muestra)
+
+    with medir("todos_los_entrenadores") as c:
+        resumenes = email_notifications.preparar_resumenes_bloques()
+    assert resumenes
+    # El camino masivo lee la ventana de la semana y el historial de los bloques
+    # que terminan, no la colección entera por cada entrenador.
+    assert c.lecturas <= datos.total_semanas // 2 + len(datos.entrenadores)
+    assert c.consultas <= 2 + math.ceil(len(datos.atletas) * 3 / 30)
+
+
+def test_reportes_semana_de_bloque(entorno, medir):
+    from app_core import data_access
+
+    lunes = entorno.datos.lunes_actual.strftime("%Y-%m-%d")
+    col = entorno.db.collection("rutinas_semanales")
+    semana = [s.to_dict() for s in col.where("fecha_lunes", "==", lunes).stream()]
+    pares = {(d["correo"], d["bloque_rutina"]) for d in semana}
+    assert pares
+
+    with medir("posiciones_de_la_semana") as c:
+        fechas = data_access.fechas_de_bloques(pares)
+    # Una consulta por cada 30 bloques, no una por cliente.
+    assert c.consultas == math.ceil(len(pares) / 30)
+    assert all(lunes in fechas[par] for par in pares)
+    for correo, bloque in sorted(pares)[:5]:
+        por_par = col.where("correo", "==", correo).where("bloque_rutina", "==", bloque).stream()
+        assert fechas[(correo, bloque)] == sorted(s.to_dict()["fecha_lunes"] for s in por_par)
+
+
+def test_seguimiento_rango(entorno, medir):
+    seguimiento = entorno.importar("seguimiento_entrenamiento")
+    correo = entorno.datos.atletas[3]
+    ids = sorted(entorno.datos.semanas_por_atleta[correo])
+    lunes = [datetime.strptime("_".join(i.split("_")[-3:]), "%Y_%m_%d").date() for i in ids]
+    desde, hasta = lunes[-4], lunes[-1] + timedelta(days=6)
+
+    with medir("ultimas_4_semanas") as c:
+        df_raw = seguimiento.ejercicios_en_rango(
+            entorno.db, correo, desde, hasta, usar_real=False, excluir_warmup=True
+        )
+        df = seguimiento.agrupar_por_semana(df_raw)
+    # El rango va en la consulta: solo se leen las semanas que lo tocan, no el historial.
+    assert c.consultas == 1
+    assert c.lecturas == 4
+    assert df["semana"].nunique() == 4
+    assert int(df["series"].sum()) == int(df_raw["series"].sum())
+
+
+def test_seguimiento_metricas(entorno, medir):
+    seguimiento = entorno.importar("seguimiento_entrenamiento")
+    from app_core import metricas_semanales
+
+    correo = entorno.datos.atletas[5]
+    ids = sorted(entorno.datos.semanas_por_atleta[correo])
+    lunes = [datetime.strptime("_".join(i.split("_")[-3:]), "%Y_%m_%d").date() for i in ids]
+    desde, hasta = lunes[-4], lunes[-1] + timedelta(days=6)
+    esperado = seguimiento.agrupar_por_semana(seguimiento.ejercicios_en_rango(
+        entorno.db, correo, desde, hasta, usar_real=False, excluir_warmup=True
+    ))
+
+    with medir("materializar_historial") as c:
+        metricas_semanales.metricas_en_rango(correo, desde, hasta)
+    # Una sola vez por cliente: una escritura por semana más la marca en `ultima_rutina`.
+    assert c.escrituras == len(ids) + 1
+
+    with medir("ultimas_4_semanas") as c:
+        metricas = metricas_semanales.metricas_en_rango(correo, desde, hasta)
+        df = seguimiento.agrupar_desde_metricas(metricas, desde, hasta, usar_real=False, excluir_warmup=True)
+    # La marca del cliente y las 4 métricas; ninguna rutina completa.
+    assert c.consultas == 1
+    assert c.lecturas == 1 + 4
+    assert df.round(6).values.tolist() == esperado.round(6).values.tolist()
+
+
+def test_historial_ejercicios(entorno, medir):
+    from app_core import historial_ejercicios
+
+    correo = entorno.datos.atletas[6]
+    nombres = ["Sentadilla Bench", "Press Banca Bench", "Remo Bench"]
+    lunes = [(datetime(2024, 1, 1) + timedelta(weeks=i)).strftime("%Y-%m-%d") for i in range(12)]
+
+    with medir("reportes_12_semanas") as c:
+        for i, fecha in enumerate(lunes):
+            ejercicios = [
+                {"ejercicio": n, "bloque": "Work Out", "circuito": "D", "peso": 60, "peso_alcanzado": 60 + i, "reps_alcanzadas": 5}
+                for n in nombres
+            ]
+            historial_ejercicios.registrar_reportes(correo, fecha, "1", ejercicios)
+    # Solo escrituras: cada reporte se suma al documento del ejercicio sin leerlo.
+    assert c.lecturas == 0
+    assert c.escrituras == len(lunes) * len(nombres)
+
+    with medir("series_del_dia") as c:
+        series = historial_ejercicios.historiales(correo, nombres)
+    # Un documento por ejercicio en un único `get_all`, sin importar cuántas semanas haya.
+    assert c.consultas == 1
+    assert c.lecturas == len(nombres)
+    assert [r["fecha"] for r in series[nombres[0]]] == lunes
+    assert historial_ejercicios.mejor_registro(series[nombres[0]])["fecha"] == lunes[-1]
+
+
+def test_admin_resumen(entorno, medir):
+    admin_resumen = entorno.importar("admin_resumen")
+    datos = entorno.datos
+
+    def _recorrer():
+        usuarios = admin_resumen._cargar_usuarios_deportistas()
+        ultimas = admin_resumen._cargar_ultimas_rutinas()
+        faltantes = [u["correo"] for u in usuarios if u["correo"] not in ultimas]
+        for usuario in usuarios:
+            admin_resumen._ultima_rutina_con_respaldo(usuario["correo"], ultimas)
+        return usuarios, ultimas, faltantes
+
+    with medir("primera_carga") as c:
+        usuarios, ultimas, faltantes = _recorrer()
+    assert len(usuarios) == len(datos.atletas)
+    semanas_por_cliente = max(len(v) for v in datos.semanas_por_atleta.values())
+    # El directorio de usuarios y los resúmenes; el respaldo solo paga por los clientes sin resumen.
+    assert c.lecturas <= _total_usuarios(entorno) + len(ultimas) + len(faltantes) * (semanas_por_cliente + 1)
+    assert c.escrituras == len(faltantes)
+
+    st.cache_data.clear()
+    with medir("con_resumen_completo") as c:
+        usuarios, ultimas, faltantes = _recorrer()
+    assert not faltantes
+    # Los resúmenes creados por el respaldo apuntan a su semana real.
+    col = entorno.crudo.collection("rutinas_semanales")
+    assert all(col.document(u["rutina_id"]).get().exists for u in ultimas.values())
+    # El directorio sobrevive a `st.cache_data.clear()`: solo se releen los resúmenes.
+    assert c.lecturas == len(ultimas)
+    assert c.consultas == 1
+
+    muestra = datos.atletas[:50]
+    with medir("busqueda_por_cliente_x50") as c:
+        for correo in muestra:
+            admin_resumen._buscar_ultima_rutina(correo)
+    # Referencia: lo que costaría el panel sin el resumen, cliente por cliente.
+    assert c.consultas >= len(muestra)
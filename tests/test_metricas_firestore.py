@@ -0,0 +1,48 @@
+"""Proxy de `app_core.metricas_firestore` y su mapa de identidad por run."""
+from __future__ import annotations
+
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("google.cloud.firestore_v1")
+
+RAIZ = Path(__file__).resolve().parents[1]
+for ruta in (RAIZ, RAIZ / "tests" / "benchmarks"):
+    if str(ruta) not in sys.path:
+        sys.path.insert(0, str(ruta))
+
+import streamlit as st  # noqa: E402
+
+from app_core import mapa_documentos  # noqa: E402
+from app_core.metricas_firestore import instrumentar  # noqa: E402
+
+from contador import Contador  # noqa: E402
+from fake_firestore import FakeFirestore  # noqa: E402
+
+
+def test_cliente_instrumentado_es_verdadero():
+    db = instrumentar(FakeFirestore(), Contador())
+    # `if _db:` / `db or get_db()` con el cliente ya creado.
+    assert db
+    assert (db or None) is db
+
+
+def test_truthiness_sigue_al_objeto_envuelto():
+    assert not instrumentar([], Contador())
+    assert len(instrumentar([1, 2], Contador())) == 2
+
+
+def test_mapa_documentos_se_vacia_al_cambiar_de_run(monkeypatch):
+    ctx = types.SimpleNamespace(widget_ids_this_run=set())
+    monkeypatch.setattr(mapa_documentos, "get_script_run_ctx", lambda: ctx)
+    monkeypatch.setattr(st, "session_state", {})
+
+    mapa_documentos.guardar("usuarios/a", "snap-1")
+    assert mapa_documentos.obtener("usuarios/a") == "snap-1"
+    # Nuevo run sin `iniciar_run()` (appasesoria.py, páginas sueltas).
+    ctx.widget_ids_this_run = set()
+    assert mapa_documentos.obtener("usuarios/a") is None
@@ -0,0 +1,207 @@
+"""Cola offline: plegado de mutaciones, conflictos por campo y reintentos con recibos.
+
+Corre contra `FakeFirestore` (el cliente en memoria de los benchmarks). El
+puente a localStorage necesita un navegador, así que se reemplaza por un
+módulo vacío y la cola vive en `st.session_state`.
+"""
+from __future__ import annotations
+
+import importlib
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("firebase_admin")
+pytest.importorskip("google.cloud.firestore_v1")
+
+RAIZ = Path(__file__).resolve().parents[1]
+for ruta in (RAIZ, RAIZ / "tests" / "benchmarks"):
+    if str(ruta) not in sys.path:
+        sys.path.insert(0, str(ruta))
+
+import streamlit as st  # noqa: E402
+
+from fake_firestore import FakeFirestore  # noqa: E402
+
+DOC = "contadores/a"
+
+
+class _SessionState(dict):
+    def __getattr__(self, clave):
+        try:
+            return self[clave]
+        except KeyError as exc:
+            raise AttributeError(clave) from exc
+
+
+@pytest.fixture
+def sync(monkeypatch):
+    sin_navegador = types.ModuleType("streamlit_local_storage")
+    sin_navegador.LocalStorage = lambda: types.SimpleNamespace()
+    monkeypatch.setitem(sys.modules, "streamlit_local_storage", sin_navegador)
+    monkeypatch.setattr(st, "session_state", _SessionState())
+    for nombre in ("offline_storage", "offline_sync"):
+        monkeypatch.delitem(sys.modules, nombre, raising=False)
+    storage = importlib.import_module("offline_storage")
+    modulo = importlib.import_module("offline_sync")
+
+    db = FakeFirestore()
+    monkeypatch.setattr(modulo, "get_db", lambda: db)
+    monkeypatch.setattr(modulo, "is_offline", lambda: False)
+    monkeypatch.setattr(storage, "_save_json", lambda clave, valor: None)
+    monkeypatch.setattr(storage, "_ls_set_raw", lambda clave, valor: None)
+    st.session_state[storage._SS_MUTATION_QUEUE] = []
+    return types.SimpleNamespace(db=db, storage=storage, sync=modulo)
+
+
+def _doc(db, path=DOC):
+    return db.document(path).get().to_dict()
+
+
+# ---------- coalesce_mutations ----------
+def test_coalesce_pliega_updates_con_merge(sync):
+    s = sync.storage
+    cola = s.coalesce_mutations([
+        {**s.build_update(DOC, {"n": s.increment(2), "tags": s.array_union("x")}), "id": "1"},
+        {**s.build_update(DOC, {"n": s.increment(3), "tags": s.array_union("y"), "nombre": "b"}), "id": "2"},
+    ])
+    assert len(cola) == 1
+    assert cola[0]["ids"] == ["1", "2"]
+    assert cola[0]["data"] == {"n": s.increment(5), "tags": s.array_union("x", "y"), "nombre": "b"}
+
+
+def test_coalesce_sobrescritura_conserva_la_base_del_primero(sync):
+    s = sync.storage
+    primero = {**s.build_update(DOC, {"a": 1}, base_doc={"a": 0}, base_update_time="t0"), "id": "1"}
+    segundo = {**s.build_update(DOC, {"b": 2}, merge=False), "id": "2"}
+    (plegada,) = s.coalesce_mutations([primero, segundo])
+    assert plegada["data"] == {"b": 2} and plegada["merge"] is False
+    assert plegada["base_update_time"] == "t0" and plegada["base"] == primero["base"]
+
+
+def test_coalesce_corta_con_otra_op_o_mutacion_enviada(sync):
+    s = sync.storage
+    cola = [
+        {**s.build_update(DOC, {"n": s.increment(1)}), "id": "1"},
+        {**s.build_delete(DOC), "id": "2"},
+        {**s.build_update(DOC, {"n": s.increment(1)}), "id": "3"},
+    ]
+    assert len(s.coalesce_mutations(cola)) == 3
+
+    enviada = {**s.build_update(DOC, {"n": s.increment(1)}), "id": "1", "enviada": True}
+    nueva = {**s.build_update(DOC, {"n": s.increment(1)}), "id": "2"}
+    assert [s.mutation_ids(m) for m in s.coalesce_mutations([enviada, nueva])] == [["1"], ["2"]]
+
+
+def test_coalesce_no_pliega_transformaciones_distintas_sobre_un_campo(sync):
+    s, db = sync.storage, sync.db
+    cola = [
+        {**s.build_update(DOC, {"tags": s.array_union("x", "y")}), "id": "1"},
+        {**s.build_update(DOC, {"tags": s.array_remove("y")}), "id": "2"},
+        {**s.build_update(DOC, {"tags": s.array_remove("z")}), "id": "3"},
+    ]
+    plegada = s.coalesce_mutations(cola)
+    assert [s.mutation_ids(m) for m in plegada] == [["1"], ["2", "3"]]
+    assert plegada[1]["data"] == {"tags": s.array_remove("y", "z")}
+
+    marca = [
+        {**s.build_update(DOC, {"t": s.server_timestamp()}), "id": "4"},
+        {**s.build_update(DOC, {"t": s.increment(1)}), "id": "5"},
+    ]
+    assert len(s.coalesce_mutations(marca)) == 2
+
+    s.replace_mutations(cola[:2])
+    assert sync.sync.try_sync_now() == (2, 0)
+    assert _doc(db)["tags"] == ["x"]
+
+
+# ---------- conflictos ----------
+def test_conflicto_por_campo_segun_politica(sync):
+    s, db = sync.storage, sync.db
+    db.document(DOC).set({"a": 1, "b": 1, "n": 10})
+    base = db.document(DOC).get()
+    base_time = s.update_time_str(base.update_time)
+    # Otro dispositivo cambia `b` mientras tanto.
+    db.document(DOC).set({"b": 99}, merge=True)
+
+    for politica, b_esperado in (("server", 99), ("local", 2)):
+        s.replace_mutations([{
+            **s.build_update(DOC, {"a": 2, "b": 2, "n": s.increment(1)}, base_doc=base.to_dict(),
+                             base_update_time=base_time, conflict=politica),
+            "id": f"m-{politica}",
+        }])
+        ok, fail = sync.sync.try_sync_now()
+        assert (ok, fail) == (1, 0)
+        doc = _doc(db)
+        assert doc["a"] == 2 and doc["b"] == b_esperado
+        (conflicto,) = sync.sync.last_sync_conflicts()
+        assert conflicto["campo"] == "b" and conflicto["gana"] == politica
+        db.document(DOC).set({"b": 99}, merge=True)
+    # El incremento conmuta: se aplicó en ambas pasadas.
+    assert _doc(db)["n"] == 12
+
+
+def test_create_sobre_doc_existente_no_lo_pisa(sync):
+    s, db = sync.storage, sync.db
+    db.document(DOC).set({"a": "servidor"})
+    s.replace_mutations([{**s.build_create(DOC, {"a": "local"}), "id": "1"}])
+    assert sync.sync.try_sync_now() == (1, 0)
+    assert _doc(db) == {"a": "servidor"}
+    assert sync.sync.last_sync_conflicts()[0]["servidor"] == "existe"
+
+
+# ---------- recibos ----------
+def test_reintento_con_recibos_no_duplica_incrementos(sync):
+    s, db = sync.storage, sync.db
+    cola = [{**s.build_update(DOC, {"n": s.increment(1)}), "id": "1"}]
+    s.replace_mutations(cola)
+    assert sync.sync.try_sync_now() == (1, 0)
+    # El commit llegó pero la cola no se vació (p. ej. se perdió la respuesta).
+    s.replace_mutations(cola)
+    assert sync.sync.try_sync_now() == (0, 0)
+    assert _doc(db)["n"] == 1
+    assert s.peek_mutations() == []
+
+
+def test_edicion_tras_envio_no_se_pliega_en_la_mutacion_enviada(sync, monkeypatch):
+    s, db = sync.storage, sync.db
+    guardadas = []
+    monkeypatch.setattr(sync.sync, "replace_mutations", lambda cola: guardadas.append([dict(m) for m in cola]))
+    s.enqueue_mutation(s.build_update(DOC, {"n": s.increment(1)}))
+    assert sync.sync.try_sync_now() == (1, 0)
+    # El commit llegó a Firestore, pero solo se persistió la cola marcada antes de enviarla.
+    s.replace_mutations(guardadas[0])
+
+    s.enqueue_mutation(s.build_update(DOC, {"n": s.increment(1), "nombre": "b"}))
+    assert len(s.peek_mutations()) == 2
+    monkeypatch.setattr(sync.sync, "replace_mutations", s.replace_mutations)
+    assert sync.sync.try_sync_now() == (1, 0)
+    assert _doc(db) == {"n": 2, "nombre": "b"}
+    assert s.peek_mutations() == []
+
+
+def test_mutacion_aplicada_en_parte_no_repite_incrementos(sync):
+    s, db = sync.storage, sync.db
+    s.replace_mutations([{**s.build_update(DOC, {"n": s.increment(1)}), "id": "1"}])
+    sync.sync.try_sync_now()
+    # Cola anterior a la marca `enviada`: "1" ya aplicada quedó plegada con "2".
+    s.replace_mutations([{
+        **s.build_update(DOC, {"n": s.increment(2), "nombre": "b"}),
+        "ids": ["1", "2"],
+    }])
+    assert sync.sync.try_sync_now() == (1, 0)
+    assert _doc(db) == {"n": 1, "nombre": "b"}
+    assert sync.sync.last_sync_conflicts()[0]["campo"] == "n"
+
+
+def test_mutacion_invalida_queda_en_la_cola_sin_frenar_las_demas(sync):
+    s, db = sync.storage, sync.db
+    invalida = {**s.build_update("otros/b", {"x": {s.TRANSFORM_KEY: "desconocida"}}), "id": "1"}
+    valida = {**s.build_update(DOC, {"a": 1}), "id": "2"}
+    s.replace_mutations([invalida, valida])
+    assert sync.sync.try_sync_now() == (1, 1)
+    assert _doc(db) == {"a": 1}
+    assert [s.mutation_ids(m) for m in s.peek_mutations()] == [["1"]]
@@ -6,9 +6,14 @@ from firebase_admin import firestore
 from datetime import datetime, timedelta, date
 import json, random, re, math, html
 from io import BytesIO
-import matplotlib.pyplot as plt
 import time
+from matplotlib.figure import Figure
+from app_core.batch_writer import BatchWriter
+from app_core.cache import cache_data
+from app_core.data_access import indice_rutinas_semanales, rutinas_semanales_por_ids
 from app_core.firebase_client import get_db
+from app_core import historial_ejercicios, tarjetas_resumen
+from app_core.metricas_semanales import recalcular_metricas_semana, registrar_metricas_semanas
 from app_core.theme import inject_theme
 from app_core.users_service import get_users_map
 from app_core.utils import empresa_de_usuario, EMPRESA_MOTION, EMPRESA_ASESORIA, EMPRESA_DESCONOCIDA
@@ -1122,11 +1127,14 @@ def _asignar_peso_si_vacio(dia_data, ejercicio_ref, nuevo_peso_str):
                     changed = True
     return changed
 
-def _propagar_peso_a_futuras_semanas(db, correo_original, bloque_rutina, semana_sel, dia_sel, ejercicio_editado, delta, peso_base_ref):
-    if not correo_original or not bloque_rutina:
-        return
-    if delta is None or abs(delta) < 1e-4:
-        return
+def _propagar_en_bloque(db, correo_original, bloque_rutina, semana_sel, dia_sel, aplicar_en_dia) -> dict:
+    """Aplica `aplicar_en_dia(dia_data) -> bool` a las semanas futuras del bloque.
+
+    Lee las semanas con una sola consulta y confirma todos los cambios en un
+    `WriteBatch` (lotes de hasta 500). Devuelve un reporte con las semanas
+    modificadas y el error, si lo hubo.
+    """
+    reporte = {"semanas_actualizadas": [], "escrituras": 0, "batches": 0, "error": None}
     dia_sel = str(dia_sel)
     try:
         snaps = list(
@@ -1135,8 +1143,9 @@ def _propagar_peso_a_futuras_semanas(db, correo_original, bloque_rutina, semana_
               .where("bloque_rutina", "==", bloque_rutina)
               .stream()
         )
-    except Exception:
-        return
+    except Exception as exc:
+        reporte["error"] = str(exc)
+        return reporte
 
     futuros = []
     for snap in snaps:
@@ -1145,66 +1154,64 @@ def _propagar_peso_a_futuras_semanas(db, correo_original, bloque_rutina, semana_
         if not fecha or fecha <= semana_sel:
             continue
         futuros.append((fecha, snap, data))
-
-    if not futuros:
-        return
-
     futuros.sort(key=lambda tup: tup[0])
-    for _, snap, data in futuros:
+
+    writer = BatchWriter(db)
+    fechas_cambiadas = []
+    semanas_cambiadas = {}
+    for fecha, snap, data in futuros:
         rutina = data.get("rutina", {}) or {}
         if dia_sel not in rutina:
             continue
         dia_data = rutina[dia_sel]
-        if _aplicar_delta_en_dia(dia_data, ejercicio_editado, delta, peso_base_ref):
-            try:
-                snap.reference.set({"rutina": {dia_sel: dia_data}}, merge=True)
-            except Exception:
-                continue
-
+        if aplicar_en_dia(dia_data):
+            writer.set(snap.reference, {"rutina": {dia_sel: dia_data}}, merge=True)
+            fechas_cambiadas.append(fecha)
+            semanas_cambiadas[snap.id] = data
 
-def _propagar_peso_a_futuras_semanas_sin_base(db, correo_original, bloque_rutina, semana_sel, dia_sel, ejercicio_editado, nuevo_peso_val):
-    if not correo_original or not bloque_rutina:
-        return
-    if nuevo_peso_val is None:
-        return
-    dia_sel = str(dia_sel)
-    nuevo_peso_str = _format_peso_value(float(nuevo_peso_val))
-    if not nuevo_peso_str:
-        return
+    if not fechas_cambiadas:
+        return reporte
     try:
-        snaps = list(
-            db.collection("rutinas_semanales")
-              .where("correo", "==", correo_original)
-              .where("bloque_rutina", "==", bloque_rutina)
-              .stream()
-        )
+        writer.commit()
+    except Exception as exc:
+        reporte["error"] = str(exc)
+    reporte["escrituras"] = writer.escrituras_confirmadas
+    reporte["batches"] = writer.batches_confirmados
+    reporte["semanas_actualizadas"] = fechas_cambiadas[: writer.escrituras_confirmadas]
+    # `aplicar_en_dia` modificó `data` en sitio: las métricas salen de lo ya escrito.
+    confirmadas = list(semanas_cambiadas.items())[: writer.escrituras_confirmadas]
+    try:
+        registrar_metricas_semanas(dict(confirmadas))
     except Exception:
-        return
+        pass
+    return reporte
 
-    futuros = []
-    for snap in snaps:
-        data = snap.to_dict() or {}
-        fecha = data.get("fecha_lunes")
-        if not fecha or fecha <= semana_sel:
-            continue
-        futuros.append((fecha, snap, data))
 
-    if not futuros:
-        return
+def _propagar_peso_a_futuras_semanas(db, correo_original, bloque_rutina, semana_sel, dia_sel, ejercicio_editado, delta, peso_base_ref) -> dict | None:
+    if not correo_original or not bloque_rutina:
+        return None
+    if delta is None or abs(delta) < 1e-4:
+        return None
+    return _propagar_en_bloque(
+        db, correo_original, bloque_rutina, semana_sel, dia_sel,
+        lambda dia_data: _aplicar_delta_en_dia(dia_data, ejercicio_editado, delta, peso_base_ref),
+    )
 
-    futuros.sort(key=lambda tup: tup[0])
-    for _, snap, data in futuros:
-        rutina = data.get("rutina", {}) or {}
-        if dia_sel not in rutina:
-            continue
-        dia_data = rutina[dia_sel]
-        if _asignar_peso_si_vacio(dia_data, ejercicio_editado, nuevo_peso_str):
-            try:
-                snap.reference.set({"rutina": {dia_sel: dia_data}}, merge=True)
-            except Exception:
-                continue
 
-def guardar_reporte_ejercicio(db, correo_cliente_norm, correo_original, semana_sel, dia_sel, ejercicio_editado, bloque_rutina=None):
+def _propagar_peso_a_futuras_semanas_sin_base(db, correo_original, bloque_rutina, semana_sel, dia_sel, ejercicio_editado, nuevo_peso_val) -> dict | None:
+    if not correo_original or not bloque_rutina:
+        return None
+    if nuevo_peso_val is None:
+        return None
+    nuevo_peso_str = _format_peso_value(float(nuevo_peso_val))
+    if not nuevo_peso_str:
+        return None
+    return _propagar_en_bloque(
+        db, correo_original, bloque_rutina, semana_sel, dia_sel,
+        lambda dia_data: _asignar_peso_si_vacio(dia_data, ejercicio_editado, nuevo_peso_str),
+    )
+
+def guardar_reporte_ejercicio(db, correo_cliente_norm, correo_original, semana_sel, dia_sel, ejercicio_editado, bloque_rutina=None, actualizar_derivados=True):
     ejercicio_editado["peso_unidad"] = _normalizar_unidad_peso(ejercicio_editado.get("peso_unidad") or ejercicio_editado.get("peso_unit"))
     fecha_norm = semana_sel.replace("-", "_")
     doc_id = f"{correo_cliente_norm}_{fecha_norm}"
@@ -1212,7 +1219,8 @@ def guardar_reporte_ejercicio(db, correo_cliente_norm, correo_original, semana_s
     doc = doc_ref.get()
     if not doc.exists:
         doc_ref.set({"rutina": {dia_sel: [ejercicio_editado]}}, merge=True); return True
-    rutina = doc.to_dict().get("rutina", {})
+    datos_semana = doc.to_dict() or {}
+    rutina = datos_semana.get("rutina", {})
     ejercicios_raw = rutina.get(dia_sel, [])
     ejercicios_lista = obtener_lista_ejercicios(ejercicios_raw)
     changed = False
@@ -1238,10 +1246,18 @@ def guardar_reporte_ejercicio(db, correo_cliente_norm, correo_original, semana_s
             ejercicio_editado["peso_unidad"] = "kg"
 
     doc_ref.set({"rutina": {dia_sel: ejercicios_lista}}, merge=True)
+    if actualizar_derivados:
+        datos_semana["rutina"] = {**rutina, dia_sel: ejercicios_lista}
+        try:
+            registrar_metricas_semanas({doc_id: datos_semana})
+            historial_ejercicios.registrar_reportes(correo_original, semana_sel, dia_sel, [ejercicio_editado])
+        except Exception:
+            pass
 
+    reporte_propagacion = None
     if peso_alcanzado_float is not None:
         if peso_base_ref is None:
-            _propagar_peso_a_futuras_semanas_sin_base(
+            reporte_propagacion = _propagar_peso_a_futuras_semanas_sin_base(
                 db=db,
                 correo_original=correo_original,
                 bloque_rutina=bloque_rutina,
@@ -1253,7 +1269,7 @@ def guardar_reporte_ejercicio(db, correo_cliente_norm, correo_original, semana_s
         else:
             delta = float(peso_alcanzado_float) - float(peso_base_ref)
             if abs(delta) >= 1e-4:
-                _propagar_peso_a_futuras_semanas(
+                reporte_propagacion = _propagar_peso_a_futuras_semanas(
                     db=db,
                     correo_original=correo_original,
                     bloque_rutina=bloque_rutina,
@@ -1263,6 +1279,8 @@ def guardar_reporte_ejercicio(db, correo_cliente_norm, correo_original, semana_s
                     delta=delta,
                     peso_base_ref=peso_base_ref,
                 )
+    if reporte_propagacion and reporte_propagacion.get("error"):
+        st.warning("⚠️ El reporte se guardó, pero no se pudo actualizar el peso en las semanas siguientes del bloque.")
 
     return True
 
@@ -1287,6 +1305,10 @@ def marcar_dia_como_finalizado(db, correo_cliente_norm, semana_sel, dia_sel, cor
         doc_ref.set(updates, merge=True)
     except Exception:
         return False
+    try:
+        recalcular_metricas_semana(doc_id)
+    except Exception:
+        pass
     return True
 
 
@@ -1306,6 +1328,7 @@ def guardar_reportes_del_dia(db, correo_cliente_norm, correo_original, semana_se
                 (e.get("circuito") or "").strip().upper(),
                 (e.get("ejercicio") or "").strip().lower())
     idx_guardados = {_key_ex(e): e for e in ejercicios_guardados if isinstance(e, dict)}
+    reportados = []
     for e in ejercicios:
         if not isinstance(e, dict): continue
         key = _key_ex(e)
@@ -1320,8 +1343,14 @@ def guardar_reportes_del_dia(db, correo_cliente_norm, correo_original, semana_se
             dia_sel=dia_sel,
             ejercicio_editado=e2,
             bloque_rutina=bloque_rutina,
+            actualizar_derivados=False,  # métricas e historial se escriben una vez al final
         )
         if not ok: return False
+        reportados.append(e2)
+    try:
+        historial_ejercicios.registrar_reportes(correo_original, semana_sel, dia_sel, reportados)
+    except Exception:
+        pass
     return marcar_dia_como_finalizado(
         db=db,
         correo_cliente_norm=correo_cliente_norm,
@@ -1332,13 +1361,12 @@ def guardar_reportes_del_dia(db, correo_cliente_norm, correo_original, semana_se
     )
 
 # ==========================
-#  PNG Resumen (no se toca)
+#  PNG Resumen
 # ==========================
-def generar_tarjeta_resumen_sesion(nombre, dia_indice, ejercicios_workout, focus_tuple, gym_name="Motion Performance") -> plt.Figure:
+def _dibujar_tarjeta_sesion(fig, ax, dia_indice, ejercicios_workout, focus_tuple, gym_name):
     total_series = sum(int(e.get("series",0) or 0) for e in ejercicios_workout)
     total_reps   = sum(int(e.get("series",0) or 0)*int(e.get("reps",0) or 0) for e in ejercicios_workout)
     total_peso   = sum(int(e.get("series",0) or 0)*int(e.get("reps",0) or 0)*float(e.get("peso",0) or 0) for e in ejercicios_workout)
-    fig, ax = plt.subplots(figsize=(6,8), dpi=200); ax.axis("off")
     ax.text(0.5,0.96,gym_name,ha="center",va="center",fontsize=18,fontweight="bold")
     ax.text(0.5,0.92,"Resumen de Entrenamiento",ha="center",va="center",fontsize=13)
     ax.text(0.5,0.87,f"Día {dia_indice}",ha="center",va="center",fontsize=11)
@@ -1364,11 +1392,25 @@ def generar_tarjeta_resumen_sesion(nombre, dia_indice, ejercicios_workout, focus
     ax.text(0.07,y,f"• Volumen estimado: {total_peso:g} kg",fontsize=11,ha="left"); y-=0.02
     ax.text(0.5,0.08,"¡Gran trabajo!",fontsize=10.5,ha="center",style="italic")
     ax.text(0.5,0.04,"Comparte tu progreso 📸",fontsize=9,ha="center")
-    fig.tight_layout(); return fig
+
+def generar_tarjeta_resumen_sesion(nombre, dia_indice, ejercicios_workout, focus_tuple, gym_name="Motion Performance") -> Figure:
+    fig, ax = tarjetas_resumen.nueva_figura()
+    _dibujar_tarjeta_sesion(fig, ax, dia_indice, ejercicios_workout, focus_tuple, gym_name)
+    return fig
 
 # ==========================
 #  VISTA
 # ==========================
+@cache_data("rutinas", show_spinner=False, ttl=600, max_entries=4)
+def _cargar_indice_rutinas() -> list[dict]:
+    return indice_rutinas_semanales()
+
+
+@cache_data("rutinas", show_spinner=False, ttl=120, max_entries=256)
+def _cargar_rutinas_por_ids(doc_ids: tuple[str, ...]) -> list[dict]:
+    return rutinas_semanales_por_ids(doc_ids)
+
+
 def ver_rutinas():
     # Firebase init
     db = get_db()
@@ -1378,11 +1420,6 @@ def ver_rutinas():
         hoy=datetime.now(); lunes=hoy-timedelta(days=hoy.weekday()); return lunes.strftime("%Y-%m-%d")
     def es_entrenador(rol): return rol.lower() in ["entrenador","admin","administrador"]
 
-    @st.cache_data(show_spinner=False, ttl=120, max_entries=64)
-    def cargar_todas_las_rutinas():
-        docs = db.collection("rutinas_semanales").stream()
-        return [doc.to_dict() for doc in docs]
-
     @st.cache_data(show_spinner=False, ttl=120, max_entries=512)
     def cargar_rutinas_por_correo(correo_objetivo: str) -> list[dict]:
         correo_objetivo = (correo_objetivo or "").strip().lower()
@@ -1420,9 +1457,10 @@ def ver_rutinas():
         unsafe_allow_html=True,
     )
 
-    # Cargar rutinas según alcance del usuario para evitar escanear toda la colección
+    # Cargar rutinas según alcance del usuario para evitar escanear toda la colección.
+    # Staff: índice liviano (proyección) para clientes/semanas; los cuerpos se leen al elegir cliente.
     if es_entrenador(rol):
-        rutinas_all = cargar_todas_las_rutinas()
+        rutinas_all = _cargar_indice_rutinas()
     else:
         rutinas_all = cargar_rutinas_por_correo(correo_raw)
         if not rutinas_all and correo_norm != correo_raw:
@@ -1704,15 +1742,16 @@ def ver_rutinas():
 
         cliente_sel_key = _nombre_cliente_llave(cliente_sel)
         correos_permitidos = clientes_empresa_info.get(cliente_sel, set())
-        rutinas_cliente = [
-            r for r in rutinas_all
+        ids_cliente = tuple(sorted(
+            r["_id"] for r in rutinas_all
             if _nombre_cliente_llave(r.get("cliente")) == cliente_sel_key
             and (
                 not correos_permitidos
                 or "__no_email__" in correos_permitidos
                 or (r.get("correo") or "").strip().lower() in correos_permitidos
             )
-        ]
+        ))
+        rutinas_cliente = _cargar_rutinas_por_ids(ids_cliente)
     else:
         rutinas_cliente = [r for r in rutinas_all if (r.get("correo","") or "").strip().lower()==correo_raw]
         cliente_sel = nombre
@@ -1933,6 +1972,14 @@ def ver_rutinas():
                             (ex.get("circuito") or "").strip().upper(),
                             (ex.get("ejercicio") or "").strip().lower())
                 ejercicios_prev_map[key_prev] = ex
+        # Serie de reportes de los ejercicios del día: una sola lectura en lote.
+        try:
+            series_ejercicios = historial_ejercicios.historiales(
+                rutina_doc.get("correo", ""),
+                [ex.get("ejercicio", "") for ex in obtener_lista_ejercicios(rutina_doc["rutina"][dia_sel])],
+            )
+        except Exception:
+            series_ejercicios = {}
 
     # Ejercicios del día
     st.markdown(f"<h3 class='h-accent center-text'>Ejercicios del día {dia_sel}</h3>", unsafe_allow_html=True)
@@ -2175,6 +2222,13 @@ def ver_rutinas():
                     st.markdown(f"<div class='routine-caption'>{html.escape(caption_text)}</div>", unsafe_allow_html=True)
                 else:
                     st.markdown("<div class='routine-caption'>Sin coincidencias para este ejercicio.</div>", unsafe_allow_html=True)
+                mejor = historial_ejercicios.mejor_registro(series_ejercicios.get(e.get("ejercicio", ""), []))
+                if mejor:
+                    st.markdown(
+                        f"<div class='routine-caption'>🏆 Mejor 1RM estimado: {mejor['rm_estimado']:.1f} kg "
+                        f"({html.escape(str(mejor.get('fecha', '')))})</div>",
+                        unsafe_allow_html=True,
+                    )
 
             # ⬅️ CERRAR el circuito **después** de terminar TODOS los ejercicios
             st.markdown("</div>", unsafe_allow_html=True)  # cierre routine-day__circuit ✅